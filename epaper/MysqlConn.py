@@ -1,9 +1,14 @@
 # -*- coding: UTF-8 -*-
 
 
+import threading
+import time
+
 import pymysql
 from DBUtils.PooledDB import PooledDB
 
+from .compress import codec
+
 
 # from . import DB_config as Config
 
@@ -31,6 +36,7 @@ class Config:
     DB_MAX_CONNECYIONS = 1000
 
     # blocking : 设置在连接池达到最大数量时的行为(缺省值 0 或 False 代表返回一个错误<toMany......>; 其他代表阻塞直到连接数减少,连接被分配)
+    # 注：Mysql 对象取连接时统一按 DB_POOL_TIMEOUT 阻塞等待，此项不再生效
     DB_BLOCKING = False
 
     # maxusage : 单个连接的最大允许复用次数(缺省值 0 或 False 代表不限制的复用).当达到最大数时,连接会自动重新连接(关闭和重新打开)
@@ -39,35 +45,243 @@ class Config:
     # setsession : 一个可选的SQL命令列表用于准备每个会话，如["set datestyle to german", ...]
     DB_SET_SESSION = None
 
+    # ping : 检查连接是否可用的时机(0 不检查; 1 从连接池取出时检查; 2 创建游标时; 4 执行查询时; 7 总是检查)，不可用时自动重连
+    DB_PING = 1
+
+    # pool_timeout : 连接数达到 DB_MAX_CONNECYIONS 时等待空闲连接的最长时间(秒)，超时抛出 PoolTimeoutError
+    DB_POOL_TIMEOUT = 30.0
+
+    # local_infile : 是否允许 LOAD DATA LOCAL INFILE(EPAPER_WRITE_MODE = 'load' 时需要开启)
+    DB_LOCAL_INFILE = False
+
+    # decompress : 查询结果中有 content_zstd 字段时是否自动解压到 content(见 compress.py)
+    DB_DECOMPRESS = True
+
+
+class PoolTimeoutError(Exception):
+    """
+    等待连接池中的空闲连接超时
+    """
+    pass
+
+
+class _CountingPooledDB(PooledDB):
+    """
+    记录新建连接数的连接池(用于区分新连接和 ping 失败后的重连)
+    """
+
+    def __init__(self, metrics, *args, **kwargs):
+        self._metrics = metrics
+        PooledDB.__init__(self, *args, **kwargs)
+
+    def steady_connection(self):
+        self._metrics.incr('created')
+        return PooledDB.steady_connection(self)
+
+
+class PoolMetrics(object):
+    """
+    连接池统计: 使用中/闲置的连接数、等待时间、重连次数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {'checkouts': 0, 'in_use': 0, 'in_use_max': 0, 'waits': 0, 'wait_time': 0.0,
+                       'wait_time_max': 0.0, 'timeouts': 0, 'connects': 0, 'created': 0}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.values[name] += value
+
+    def checkout(self, wait):
+        with self._lock:
+            self.values['checkouts'] += 1
+            self.values['in_use'] += 1
+            self.values['in_use_max'] = max(self.values['in_use_max'], self.values['in_use'])
+            if wait > 0.001:
+                self.values['waits'] += 1
+                self.values['wait_time'] += wait
+                self.values['wait_time_max'] = max(self.values['wait_time_max'], wait)
+
+    def checkin(self):
+        with self._lock:
+            self.values['in_use'] -= 1
+
+    def snapshot(self):
+        with self._lock:
+            result = dict(self.values)
+        # 每次调用 creator 都会建立一个物理连接，超出新建连接数的部分即为 ping 失败后的重连
+        result['reconnects'] = max(result['connects'] - result['created'], 0)
+        return result
+
 
 class Mysql(object):
     """
     MYSQL数据库对象，负责产生数据库连接 , 此类中的连接采用连接池实现获取连接对象：conn = Mysql.getConn()
     释放连接对象;conn.close()或del conn
+    连接池在进程内只创建一次(每个数据库一个)，所有 Mysql 对象共用
     """
-    # 连接池对象
-    __pool = None
+    # 连接池对象 {数据库名: PooledDB}
+    __pools = {}
+    # 限制同时取出的连接数 {数据库名: BoundedSemaphore}
+    __slots = {}
+    __lock = threading.Lock()
+    # 插入语句缓存 {(表名, 字段, 更新语句): sql}
+    __sqlCache = {}
+    # 数据库的 max_allowed_packet {数据库名: 字节数}，每个连接池只查询一次
+    __packets = {}
+    metrics = PoolMetrics()
 
     def __init__(self, db=None):
         self.db = db
+        self._slot = None
+        self._checked_out = False
         # 数据库构造函数，从连接池中取出连接，并生成操作游标
         self._conn = Mysql.__getConn(self)
-        self._cursor = self._conn.cursor()
+        try:
+            self._cursor = self._conn.cursor()
+        except BaseException:
+            # 调用方拿不到对象，不会调用 dispose，在这里归还连接和名额
+            try:
+                self._conn.close()
+            finally:
+                self.__release()
+            raise
+
+    @classmethod
+    def initPool(cls, db=None, settings=None):
+        """
+        @summary: 创建进程内共用的连接池(已存在时直接返回)
+        @param db: 数据库名，缺省为 Config.DB_TEST_DBNAME
+        @param settings: 可选参数，Scrapy settings，其中与 Config 同名的配置项在创建连接池时覆盖 Config 中的值；
+        连接池已存在时不再改变(常驻进程中各任务的设置不影响共用的连接池)
+        @return: PooledDB
+        """
+        if db is None:
+            db = Config.DB_TEST_DBNAME
+            if settings is not None and 'DB_TEST_DBNAME' in settings:
+                db = settings.get('DB_TEST_DBNAME')
+        with cls.__lock:
+            pool = cls.__pools.get(db)
+            if pool is not None:
+                return pool
+            if settings is not None:
+                for name in dir(Config):
+                    if name.startswith('DB_') and name in settings:
+                        setattr(Config, name, cls.getSetting(settings, name, getattr(Config, name)))
+            metrics = cls.metrics
+
+            def creator(*args, **kwargs):
+                metrics.incr('connects')
+                return pymysql.connect(*args, **kwargs)
+
+            creator.dbapi = pymysql
+            creator.threadsafety = pymysql.threadsafety
+            # 最大连接数由 __slots 控制，超过时按 DB_POOL_TIMEOUT 阻塞等待，连接池本身不再返回 TooManyConnections
+            max_connections = Config.DB_MAX_CONNECYIONS
+            pool = _CountingPooledDB(metrics, creator=creator, mincached=Config.DB_MIN_CACHED,
+                                     maxcached=Config.DB_MAX_CACHED, maxshared=Config.DB_MAX_SHARED,
+                                     maxconnections=max_connections, blocking=True,
+                                     maxusage=Config.DB_MAX_USAGE, setsession=Config.DB_SET_SESSION,
+                                     ping=Config.DB_PING,
+                                     failures=(pymysql.OperationalError, pymysql.InternalError),
+                                     host=Config.DB_TEST_HOST, port=Config.DB_TEST_PORT,
+                                     user=Config.DB_TEST_USER, passwd=Config.DB_TEST_PASSWORD,
+                                     db=db, use_unicode=True, charset=Config.DB_CHARSET,
+                                     local_infile=Config.DB_LOCAL_INFILE, binary_prefix=True,
+                                     cursorclass=pymysql.cursors.DictCursor)
+            if max_connections:
+                cls.__slots[db] = threading.BoundedSemaphore(max_connections)
+            cls.__pools[db] = pool
+            return pool
+
+    @staticmethod
+    def getSetting(settings, name, default):
+        """
+        @summary: 按 Config 中原有值的类型读取配置项(-s DB_TEST_PORT=3307 等命令行参数是字符串)
+        @return: 转换后的值
+        """
+        if isinstance(default, bool):
+            return settings.getbool(name)
+        if isinstance(default, int):
+            return settings.getint(name)
+        if isinstance(default, float):
+            return settings.getfloat(name)
+        return settings.get(name)
+
+    @classmethod
+    def closePool(cls):
+        """
+        @summary: 关闭所有连接池
+        """
+        with cls.__lock:
+            for pool in cls.__pools.values():
+                pool.close()
+            cls.__pools.clear()
+            cls.__slots.clear()
+            cls.__packets.clear()
+
+    @classmethod
+    def getMaxPacket(cls, db=None):
+        """
+        @summary: 数据库的 max_allowed_packet，第一次调用时查询，之后直接返回(连接池关闭后重新查询)
+        @param db: 数据库名，缺省为 Config.DB_TEST_DBNAME
+        @return: 字节数
+        """
+        if db is None:
+            db = Config.DB_TEST_DBNAME
+        packet = cls.__packets.get(db)
+        if packet is None:
+            mysql = cls(db)
+            try:
+                result = mysql.getOne("SELECT @@max_allowed_packet AS packet")
+            finally:
+                mysql.dispose()
+            packet = cls.__packets[db] = int(result['packet'])
+        return packet
+
+    @classmethod
+    def poolStats(cls):
+        """
+        @summary: 连接池统计信息
+        @return: dict {in_use, idle, waits, wait_time, wait_time_max, timeouts, reconnects, ...}
+        """
+        result = cls.metrics.snapshot()
+        idle = 0
+        with cls.__lock:
+            for pool in cls.__pools.values():
+                idle += len(getattr(pool, '_idle_cache', []))
+        result['idle'] = idle
+        return result
 
     # @staticmethod
     def __getConn(self):
-        if self.__pool is None:
-            if self.db is None:
-                self.db = Config.DB_TEST_DBNAME
-            self.__pool = PooledDB(creator=pymysql, mincached=Config.DB_MIN_CACHED, maxcached=Config.DB_MAX_CACHED,
-                                   maxshared=Config.DB_MAX_SHARED, maxconnections=Config.DB_MAX_CONNECYIONS,
-                                   blocking=Config.DB_BLOCKING, maxusage=Config.DB_MAX_USAGE,
-                                   setsession=Config.DB_SET_SESSION,
-                                   host=Config.DB_TEST_HOST, port=Config.DB_TEST_PORT,
-                                   user=Config.DB_TEST_USER, passwd=Config.DB_TEST_PASSWORD,
-                                   db=self.db, use_unicode=True, charset=Config.DB_CHARSET, cursorclass=pymysql.cursors.DictCursor)
-
-        return self.__pool.connection()
+        if self.db is None:
+            self.db = Config.DB_TEST_DBNAME
+        pool = Mysql.initPool(self.db)
+        slot = Mysql.__slots.get(self.db)
+        start = time.time()
+        if slot is not None:
+            if not slot.acquire(timeout=Config.DB_POOL_TIMEOUT):
+                Mysql.metrics.incr('timeouts')
+                raise PoolTimeoutError('等待数据库连接超时(%s 秒)' % Config.DB_POOL_TIMEOUT)
+            self._slot = slot
+        try:
+            conn = pool.connection()
+        except BaseException:
+            self.__release()
+            raise
+        Mysql.metrics.checkout(time.time() - start)
+        self._checked_out = True
+        return conn
+
+    def __release(self):
+        if self._checked_out:
+            Mysql.metrics.checkin()
+            self._checked_out = False
+        if self._slot is not None:
+            self._slot.release()
+            self._slot = None
 
     def getAll(self, sql, param=None):
         """
@@ -81,7 +295,7 @@ class Mysql(object):
         else:
             count = self._cursor.execute(sql, param)
         if count > 0:
-            result = self._cursor.fetchall()
+            result = self.__decode(self._cursor.fetchall())
         else:
             result = None
         return result
@@ -98,7 +312,7 @@ class Mysql(object):
         else:
             count = self._cursor.execute(sql, param)
         if count > 0:
-            result = self._cursor.fetchone()
+            result = self.__decode(self._cursor.fetchone())
         else:
             result = None
         return result
@@ -116,41 +330,96 @@ class Mysql(object):
         else:
             count = self._cursor.execute(sql, param)
         if count > 0:
-            result = self._cursor.fetchmany(num)
+            result = self.__decode(self._cursor.fetchmany(num))
         else:
             result = None
         return result
 
-    def insertOne(self, sql, param=None):
+    def insertOne(self, sql, param=None, returnId=True):
         """
         @summary: 向数据表插入一条记录
         @param sql:要插入的ＳＱＬ格式
         @param param:要插入的记录数据tuple/list
+        @param returnId: 是否返回自增id(直接取游标的 lastrowid，不再额外查询)
         @return: insertId 受影响的行数
         """
         # print sql
         # print param
-        self._cursor.execute(sql, param)
-
+        count = self._cursor.execute(sql, param)
+        if not returnId:
+            return count
         return self.__getInsertId()
 
-    def insertMany(self, sql, values=None):
+    def insertMany(self, sql, values=None, max_stmt_length=None):
         """
         @summary: 向数据表插入多条记录
         @param sql:要插入的ＳＱＬ格式
         @param values:要插入的记录数据tuple(tuple)/list[list]
+        @param max_stmt_length: 可选参数，合并后单条ＳＱＬ的最大字节数(不能超过 max_allowed_packet)
         @return: count 受影响的行数
         """
+        if max_stmt_length:
+            self._cursor.max_stmt_length = max_stmt_length
         count = self._cursor.executemany(sql, values)
         return count
 
+    @classmethod
+    def getInsertSql(cls, table, fields, update=None):
+        """
+        @summary: 生成参数化的插入语句，每个(表, 字段)只生成一次
+        @param table: 表名
+        @param fields: 字段元组
+        @param update: 可选参数，ON DUPLICATE KEY UPDATE 之后的内容
+        @return: sql INSERT INTO `table`(`a`,`b`) VALUES(%s,%s)
+        """
+        key = (table, tuple(fields), update)
+        sql = cls.__sqlCache.get(key)
+        if sql is None:
+            sql = "INSERT INTO `%s`(%s) VALUES(%s)" % (
+                table, ','.join('`%s`' % field for field in fields), ','.join(['%s'] * len(fields)))
+            if update:
+                sql += " ON DUPLICATE KEY UPDATE " + update
+            cls.__sqlCache[key] = sql
+        return sql
+
+    def insertRecord(self, table, fields, values, returnId=True):
+        """
+        @summary: 参数化插入一条记录(由数据库驱动转义，不需要拼接ＳＱＬ)
+        @param table: 表名
+        @param fields: 字段元组
+        @param values: 与字段对应的值 tuple/list
+        @param returnId: 是否返回自增id，批量导入时传 False
+        @return: insertId/受影响的行数
+        """
+        return self.insertOne(Mysql.getInsertSql(table, fields), values, returnId=returnId)
+
+    def loadFile(self, path, table, fields, ignore=False):
+        """
+        @summary: 使用 LOAD DATA LOCAL INFILE 导入制表符分隔的文件(转义规则见 utils.escape_tsv)
+        @param path: 文件路径
+        @param table: 表名
+        @param fields: 文件中各列对应的字段
+        @param ignore: 是否忽略唯一键重复的行
+        @return: count 受影响的行数
+        """
+        sql = "LOAD DATA LOCAL INFILE %%s %sINTO TABLE `%s` CHARACTER SET %s " \
+              "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (%s)" % (
+                  'IGNORE ' if ignore else '', table, Config.DB_CHARSET, ','.join('`%s`' % field for field in fields))
+        return self._cursor.execute(sql, (path,))
+
+    def __decode(self, result):
+        """
+        解压查询结果中压缩存储的 content
+        """
+        if Config.DB_DECOMPRESS:
+            return codec.decode_rows(self, result)
+        return result
+
     def __getInsertId(self):
         """
         获取当前连接最后一次插入操作生成的id,如果没有则为０
         """
-        self._cursor.execute("SELECT @@IDENTITY AS id")
-        result = self._cursor.fetchall()
-        return result[0]['id']
+        return self._cursor.lastrowid or 0
 
     def __query(self, sql, param=None):
         if param is None:
@@ -199,12 +468,17 @@ class Mysql(object):
         """
         @summary: 释放连接池资源
         """
-        if is_end == 1:
-            self.end('commit')
-        else:
-            self.end('rollback')
-        self._cursor.close()
-        self._conn.close()
+        try:
+            if is_end == 1:
+                self.end('commit')
+            else:
+                self.end('rollback')
+        finally:
+            try:
+                self._cursor.close()
+                self._conn.close()
+            finally:
+                self.__release()
 
     def executeSql(self, sql=''):
         self._cursor.execute(sql)
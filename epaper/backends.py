@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+# 存储后端：EpaperPipeline 负责缓存、写线程池和高/低水位，实际的写入交给后端
+# settings.py 中 EPAPER_BACKENDS 指定使用的后端，可以同时写入多个，例如 ['mysql', 'jsonl']
+#   'mysql'  : MysqlConn.Mysql(默认)
+#   'sqlite' : SQLite 文件(WAL 模式，每批数据一个事务)，不需要数据库服务，适合本机运行和 CI
+#   'jsonl'  : 按表写入 gzip/zstd 压缩的 JSON Lines 文件，达到行数/字节数后换新文件
+# 也可以填写后端类的完整路径，后端类需要实现 from_settings、open、write、close
+import abc
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pymysql
+
+from scrapy.utils.misc import load_object
+
+from .MysqlConn import Mysql
+from .compress import codec, import_zstd
+from .utils import format_date
+
+logger = logging.getLogger(__name__)
+
+# 文件序号，同一进程中的多个后端对象写入同一目录时文件名不重复
+_file_seq = itertools.count(1)
+
+
+class Backend(abc.ABC):
+    """
+    存储后端基类，write 在写线程池中执行，需要线程安全
+    """
+    name = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(upsert=settings.getbool('EPAPER_UPSERT', False))
+
+    def __init__(self, upsert=False):
+        self.upsert = upsert
+
+    def open(self, spider):
+        pass
+
+    def close(self):
+        pass
+
+    def get_max_bytes(self):
+        """
+        @return: 一批数据的最大字节数，无限制时为 None
+        """
+        return None
+
+    @abc.abstractmethod
+    def write(self, table, fields, rows, max_bytes=None):
+        """
+        @summary: 写入一批数据并提交
+        @return: dict {inserted: 新增行数, updated: 更新行数, unchanged: 未变化行数}
+        """
+        raise NotImplementedError
+
+
+class MysqlBackend(Backend):
+    """
+    写入 MySQL(进程内共用 Mysql 连接池)
+    """
+    name = 'mysql'
+
+    @classmethod
+    def from_settings(cls, settings):
+        Mysql.initPool(settings=settings)
+        return cls(upsert=settings.getbool('EPAPER_UPSERT', False),
+                   compress=settings.getbool('EPAPER_CONTENT_COMPRESS', False))
+
+    def __init__(self, upsert=False, compress=False):
+        super(MysqlBackend, self).__init__(upsert=upsert)
+        # content 使用 zstd 字典压缩后写入 content_zstd 字段(见 compress.py)
+        self.compress = compress
+        if compress:
+            import_zstd()
+
+    def get_max_bytes(self):
+        # 批量语句的大小不能超过数据库的 max_allowed_packet(每个连接池只查询一次)
+        try:
+            packet = Mysql.getMaxPacket()
+        except BaseException as e:
+            logger.warning('读取 max_allowed_packet 失败: %s', e.args)
+            return None
+        return int(packet * 0.9)
+
+    def write(self, table, fields, rows, max_bytes=None):
+        mysql = Mysql()
+        try:
+            if self.compress and 'content' in fields:
+                fields, rows = codec.compress_rows(mysql, table, fields, rows)
+            if self.upsert:
+                result = self.upsert_rows(mysql, table, fields, rows, max_bytes)
+            elif len(rows) == 1:
+                mysql.insertRecord(table, fields, rows[0], returnId=False)
+                result = {'inserted': 1, 'updated': 0, 'unchanged': 0}
+            else:
+                mysql.insertMany(Mysql.getInsertSql(table, fields), rows, max_stmt_length=max_bytes)
+                result = {'inserted': len(rows), 'updated': 0, 'unchanged': 0}
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        return result
+
+    def upsert_rows(self, mysql, table, fields, rows, max_bytes=None):
+        """
+        @summary: 以 href_hash 为唯一键去重入库
+        先查出已存在的 content_hash，内容未变化的行不再写入；其余行使用 INSERT ... ON DUPLICATE KEY UPDATE，
+        并在语句中再次比较 content_hash，避免并发写入时覆盖相同内容
+        分区表的唯一键是 (href_hash, send_time)(见 schema.py)，已存在于其他日期的链接按 href_hash 更新原有的行
+        """
+        latest, counts = dedupe_rows(fields, rows)
+        stored = {}
+        dates = {}
+        hashes = list(latest)
+        for i in range(0, len(hashes), 1000):
+            part = hashes[i:i + 1000]
+            result = mysql.getAll("SELECT `href_hash`, `content_hash`, `send_time` FROM `%s` "
+                                  "WHERE `href_hash` IN (%s)" % (table, ','.join(['%s'] * len(part))), part)
+            for record in result or []:
+                stored[record['href_hash']] = record['content_hash']
+                dates[record['href_hash']] = format_date(record['send_time'])
+        changed = classify_rows(fields, latest, stored, counts)
+        if changed and 'send_time' in fields:
+            href_index, send_index = fields.index('href_hash'), fields.index('send_time')
+            moved = [row for row in changed
+                     if row[href_index] in dates and dates[row[href_index]] != format_date(row[send_index])]
+            if moved:
+                updates = [field for field in fields if field != 'href_hash']
+                sql = "UPDATE `%s` SET %s WHERE `href_hash` = %%s" % (
+                    table, ','.join('`%s`=%%s' % field for field in updates))
+                for row in moved:
+                    values = dict(zip(fields, row))
+                    mysql.update(sql, [values[field] for field in updates] + [row[href_index]])
+                moved = set(row[href_index] for row in moved)
+                changed = [row for row in changed if row[href_index] not in moved]
+        if changed:
+            # content_hash 必须最后更新，前面的字段才能与旧值比较
+            updates = ['`{0}`=IF(`content_hash`<>VALUES(`content_hash`), VALUES(`{0}`), `{0}`)'.format(field)
+                       for field in fields if field not in ('href_hash', 'content_hash')]
+            updates.append('`content_hash`=VALUES(`content_hash`)')
+            sql = Mysql.getInsertSql(table, fields, update=','.join(updates))
+            mysql.insertMany(sql, changed, max_stmt_length=max_bytes)
+        return counts
+
+    def load_file(self, table, fields, path):
+        """
+        @summary: 使用 LOAD DATA LOCAL INFILE 导入 TSV 文件
+        @return: 导入的行数
+        """
+        mysql = Mysql()
+        try:
+            count = mysql.loadFile(os.path.abspath(path), table, fields, ignore=self.upsert)
+        except pymysql.err.MySQLError:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        return count
+
+
+class SqliteBackend(Backend):
+    """
+    写入 SQLite 文件，表不存在时自动创建(所有字段为 TEXT)
+    WAL 模式下读写互不阻塞；多个写线程共用一个连接，每批数据在一个事务中提交
+    """
+    name = 'sqlite'
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(path=settings.get('EPAPER_SQLITE_PATH', 'data/epaper.sqlite3'),
+                   upsert=settings.getbool('EPAPER_UPSERT', False))
+
+    def __init__(self, path='data/epaper.sqlite3', upsert=False):
+        super(SqliteBackend, self).__init__(upsert=upsert)
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+        # 已确认存在的表 {表名: set(字段)}
+        self.tables = {}
+        # 已创建 href_hash 唯一索引的表
+        self.indexed = set()
+
+    def open(self, spider):
+        if self.conn is not None:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # 事务由 write 显式控制
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+
+    def close(self):
+        if self.conn is None:
+            return
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+
+    def ensure_table(self, table, fields):
+        columns = self.tables.get(table)
+        if columns is None:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "%s" (id INTEGER PRIMARY KEY AUTOINCREMENT, %s)' % (
+                table, ', '.join('"%s" TEXT' % field for field in fields)))
+            columns = set(row[1] for row in self.conn.execute('PRAGMA table_info("%s")' % table))
+            self.tables[table] = columns
+        for field in fields:
+            if field not in columns:
+                self.conn.execute('ALTER TABLE "%s" ADD COLUMN "%s" TEXT' % (table, field))
+                columns.add(field)
+        if 'href_hash' in fields and table not in self.indexed:
+            self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS "uk_%s_href_hash" ON "%s" ("href_hash")' % (
+                table, table))
+            self.indexed.add(table)
+
+    def write(self, table, fields, rows, max_bytes=None):
+        with self.lock:
+            self.ensure_table(table, fields)
+            columns = ', '.join('"%s"' % field for field in fields)
+            marks = ', '.join(['?'] * len(fields))
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self.upsert:
+                    counts = self.upsert_rows(table, fields, rows, columns, marks)
+                else:
+                    self.conn.executemany('INSERT INTO "%s" (%s) VALUES (%s)' % (table, columns, marks), rows)
+                    counts = {'inserted': len(rows), 'updated': 0, 'unchanged': 0}
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        return counts
+
+    def upsert_rows(self, table, fields, rows, columns, marks):
+        latest, counts = dedupe_rows(fields, rows)
+        stored = {}
+        hashes = list(latest)
+        # SQLite 单条语句的参数个数有限制
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            cursor = self.conn.execute('SELECT "href_hash", "content_hash" FROM "%s" WHERE "href_hash" IN (%s)' % (
+                table, ', '.join(['?'] * len(part))), part)
+            for href_hash, content_hash in cursor:
+                stored[href_hash] = content_hash
+        changed = classify_rows(fields, latest, stored, counts)
+        if changed:
+            updates = ', '.join('"{0}"=excluded."{0}"'.format(field) for field in fields if field != 'href_hash')
+            self.conn.executemany('INSERT INTO "%s" (%s) VALUES (%s) ON CONFLICT("href_hash") DO UPDATE SET %s' % (
+                table, columns, marks, updates), changed)
+        return counts
+
+
+class JsonlBackend(Backend):
+    """
+    按表写入压缩的 JSON Lines 文件: <目录>/<表名>.<进程号>.<时间>.<序号>.jsonl.gz(.zst)
+    写入过程中使用 .part 后缀，达到行数/字节数或爬虫关闭时改名；只追加不去重，upsert 时所有行计为新增
+    """
+    name = 'jsonl'
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(path=settings.get('EPAPER_JSONL_DIR', 'data/jsonl'),
+                   compress=settings.get('EPAPER_JSONL_COMPRESS', 'gzip'),
+                   rotate_rows=settings.getint('EPAPER_JSONL_ROTATE_ROWS', 100000),
+                   rotate_bytes=settings.getint('EPAPER_JSONL_ROTATE_BYTES', 256 * 1024 * 1024),
+                   upsert=settings.getbool('EPAPER_UPSERT', False))
+
+    def __init__(self, path='data/jsonl', compress='gzip', rotate_rows=100000, rotate_bytes=256 * 1024 * 1024,
+                 upsert=False):
+        super(JsonlBackend, self).__init__(upsert=upsert)
+        if compress not in ('gzip', 'zstd', None, ''):
+            raise ValueError('EPAPER_JSONL_COMPRESS 只能是 gzip、zstd 或空: %r' % compress)
+        if compress == 'zstd':
+            get_zstd()
+        self.path = path
+        self.compress = compress
+        self.rotate_rows = rotate_rows
+        self.rotate_bytes = rotate_bytes
+        self.lock = threading.Lock()
+        # 正在写入的文件 {表名: {'file': 文件对象, 'path': 路径, 'rows': 行数, 'bytes': 未压缩字节数}}
+        self.files = {}
+
+    def open(self, spider):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def close(self):
+        with self.lock:
+            for table in list(self.files):
+                self.rotate(table)
+
+    def open_file(self, table):
+        suffix = {'gzip': '.gz', 'zstd': '.zst'}.get(self.compress, '')
+        path = os.path.join(self.path, '%s.%d.%d.%d.jsonl%s.part' % (
+            table, os.getpid(), int(time.time()), next(_file_seq), suffix))
+        if self.compress == 'gzip':
+            f = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        elif self.compress == 'zstd':
+            f = get_zstd()(path)
+        else:
+            f = open(path, 'w', encoding='utf-8', newline='\n')
+        out = {'file': f, 'path': path, 'rows': 0, 'bytes': 0}
+        self.files[table] = out
+        return out
+
+    def rotate(self, table):
+        out = self.files.pop(table, None)
+        if out is None:
+            return
+        out['file'].close()
+        os.rename(out['path'], out['path'][:-len('.part')])
+
+    def write(self, table, fields, rows, max_bytes=None):
+        lines = ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n' for row in rows)
+        with self.lock:
+            out = self.files.get(table) or self.open_file(table)
+            out['file'].write(lines)
+            out['file'].flush()
+            out['rows'] += len(rows)
+            out['bytes'] += len(lines)
+            if out['rows'] >= self.rotate_rows or out['bytes'] >= self.rotate_bytes:
+                self.rotate(table)
+        return {'inserted': len(rows), 'updated': 0, 'unchanged': 0}
+
+
+BACKENDS = {
+    'mysql': MysqlBackend,
+    'sqlite': SqliteBackend,
+    'jsonl': JsonlBackend,
+}
+
+
+def get_zstd():
+    """
+    @return: 以文本方式打开 zstd 压缩文件的函数 open(path)
+    """
+    impl, zstd = import_zstd()
+    if impl == 'zstandard':
+        def open_zstd(path):
+            return io.TextIOWrapper(zstd.ZstdCompressor().stream_writer(open(path, 'wb')), encoding='utf-8')
+        return open_zstd
+    return lambda path: zstd.open(path, 'wt', encoding='utf-8')
+
+
+def get_backends(settings):
+    """
+    根据 EPAPER_BACKENDS 创建后端
+    :return: [后端]
+    """
+    backends = []
+    for name in settings.getlist('EPAPER_BACKENDS', ['mysql']):
+        backendcls = BACKENDS.get(name) or load_object(name)
+        backends.append(backendcls.from_settings(settings))
+    if not backends:
+        raise ValueError('EPAPER_BACKENDS 不能为空')
+    return backends
+
+
+def dedupe_rows(fields, rows):
+    """
+    同一批次中重复的链接只保留最后一条
+    :return: ({href_hash: 行}, 计数)
+    """
+    href_index = fields.index('href_hash')
+    latest = {}
+    for row in rows:
+        latest[row[href_index]] = row
+    return latest, {'inserted': 0, 'updated': 0, 'unchanged': len(rows) - len(latest)}
+
+
+def classify_rows(fields, latest, stored, counts):
+    """
+    与已存在的 content_hash 比较，统计新增/更新/未变化的行数
+    :param stored: {href_hash: content_hash}
+    :return: 需要写入的行
+    """
+    content_index = fields.index('content_hash')
+    changed = []
+    for href_hash, row in latest.items():
+        if href_hash not in stored:
+            counts['inserted'] += 1
+            changed.append(row)
+        elif stored[href_hash] != row[content_index]:
+            counts['updated'] += 1
+            changed.append(row)
+        else:
+            counts['unchanged'] += 1
+    return changed
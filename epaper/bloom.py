@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# 保存在文件中的布隆过滤器(mmap 映射，进程退出后保留，下次运行继续使用)
+# 文件头记录位数、哈希函数个数、已加入的元素数和已读取到的数据库 id，之后为位数组
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+MAGIC = b'EPBLOOM1'
+# 文件头: 标识、位数、哈希函数个数、元素数、已读取到的 id
+HEADER = struct.Struct('<8sQIQQ')
+HEADER_SIZE = 64
+
+
+def get_bloom_size(capacity, error_rate):
+    """
+    :return: (位数, 哈希函数个数)
+    """
+    bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    # 位数组按 8 字节对齐
+    bits = (bits + 63) // 64 * 64
+    hashes = max(1, int(round(bits / float(capacity) * math.log(2))))
+    return bits, hashes
+
+
+class BloomFilter(object):
+    """
+    布隆过滤器，不存在误判为不存在，存在有 error_rate 的误判率
+    """
+
+    def __init__(self, path, capacity=2000000, error_rate=0.0001):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.file = None
+        self.map = None
+        self.bits = 0
+        self.hashes = 0
+        self.count = 0
+        self.last_id = 0
+        self.open()
+
+    def open(self):
+        bits, hashes = get_bloom_size(self.capacity, self.error_rate)
+        size = HEADER_SIZE + bits // 8
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER_SIZE:
+            self.file = open(self.path, 'r+b')
+            header = HEADER.unpack(self.file.read(HEADER.size))
+            if header[0] == MAGIC and os.path.getsize(self.path) == HEADER_SIZE + header[1] // 8:
+                _, bits, hashes, count, last_id = header
+            else:
+                # 文件损坏，按当前的容量重新创建
+                self.file.close()
+                self.file = None
+        if self.file is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self.file = open(self.path, 'w+b')
+            self.file.truncate(size)
+            count, last_id = 0, 0
+            self.file.write(HEADER.pack(MAGIC, bits, hashes, count, last_id))
+            self.file.flush()
+        self.bits, self.hashes, self.count, self.last_id = bits, hashes, count, last_id
+        # 已有的文件可能按更大的容量创建
+        self.capacity = max(self.capacity, int(bits * math.log(2) ** 2 / -math.log(self.error_rate)))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def close(self):
+        if self.map is None:
+            return
+        self.sync()
+        self.map.close()
+        self.file.close()
+        self.map = None
+        self.file = None
+
+    def sync(self):
+        """
+        @summary: 写入文件头并把修改刷新到磁盘
+        """
+        self.map[:HEADER.size] = HEADER.pack(MAGIC, self.bits, self.hashes, self.count, self.last_id)
+        self.map.flush()
+
+    def clear(self):
+        """
+        @summary: 删除文件，按当前的容量重新创建
+        """
+        self.close()
+        os.remove(self.path)
+        self.open()
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+    def get_positions(self, key):
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(key.encode('utf-8')).digest())
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def add(self, key):
+        """
+        @return: 加入前是否已存在
+        """
+        data = self.map
+        exists = True
+        for pos in self.get_positions(key):
+            index = HEADER_SIZE + (pos >> 3)
+            mask = 1 << (pos & 7)
+            value = data[index]
+            if not value & mask:
+                exists = False
+                data[index] = value | mask
+        if not exists:
+            self.count += 1
+        return exists
+
+    def __contains__(self, key):
+        data = self.map
+        for pos in self.get_positions(key):
+            if not data[HEADER_SIZE + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+# content 字段的 zstd 字典压缩
+# 同一报刊的文章有大量相同的版式文字和用词，按报刊(或报刊 + cType)训练 zstd 字典后压缩率远高于通用压缩
+# 压缩后的数据存放在 content_zstd 字段(MEDIUMBLOB)，content_dict 为所用字典的 id(0 为不使用字典)，content 置为空串
+# 字典保存在 epaper_zstd_dict 表中，Mysql.getAll/getOne/getMany 读出数据时自动解压到 content
+#
+# 使用：python -m epaper.compress train [爬虫名 ...] [--per-ctype]   从已有数据中抽样训练字典
+#       python -m epaper.compress compress [爬虫名 ...]              压缩已有的数据
+import argparse
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 字典表
+DICT_TABLE = 'epaper_zstd_dict'
+
+# 压缩后追加的字段
+COMPRESS_FIELDS = ('content_zstd', 'content_dict')
+
+
+def import_zstd():
+    """
+    @return: (实现名称, 模块)，优先使用 zstandard，其次 compression.zstd(Python 3.14+ / backports.zstd)
+    """
+    try:
+        import zstandard
+        return 'zstandard', zstandard
+    except ImportError:
+        pass
+    try:
+        from compression import zstd
+    except ImportError:
+        try:
+            from backports import zstd
+        except ImportError:
+            raise ValueError('使用 zstd 压缩需要安装 zstandard: pip install zstandard')
+    return 'stdlib', zstd
+
+
+def train_dict(samples, size=112640):
+    """
+    训练 zstd 字典
+    :param samples: 样本列表(bytes)
+    :param size: 字典大小(字节)
+    :return: 字典内容(bytes)
+    """
+    impl, zstd = import_zstd()
+    if impl == 'zstandard':
+        return zstd.train_dictionary(size, samples).as_bytes()
+    return zstd.train_dict(samples, size).dict_content
+
+
+class ContentCodec(object):
+    """
+    content 压缩/解压，进程内共用一个对象(codec)，字典从数据库读取后缓存
+    """
+
+    def __init__(self, level=3, min_size=256):
+        self.level = level
+        # 小于该字节数的内容不压缩
+        self.min_size = min_size
+        self.impl, self.zstd = None, None
+        # {字典 id: 字典内容}
+        self.dicts = {}
+        # 当前使用的字典 {字典名称: 字典 id}，字典名称为 表名 或 表名/cType
+        self.active = {}
+        self.loaded = set()
+        # compression.zstd 的 ZstdDict 对象 {字典 id: ZstdDict}
+        self.zstd_dicts = {}
+        self.lock = threading.Lock()
+        # zstandard 的压缩/解压对象不是线程安全的，每个线程各自创建
+        self.local = threading.local()
+
+    def get_zstd(self):
+        if self.zstd is None:
+            self.impl, self.zstd = import_zstd()
+        return self.zstd
+
+    def load_active(self, mysql, table):
+        """
+        @summary: 读取该表可用的字典(同名字典以 id 最大的为准)
+        """
+        if table in self.loaded:
+            return
+        rows = mysql.getAll("SELECT `id`, `name` FROM `%s` WHERE `name` = %%s OR `name` LIKE %%s ORDER BY `id`"
+                            % DICT_TABLE, (table, table + '/%')) or []
+        with self.lock:
+            for row in rows:
+                self.active[row['name']] = row['id']
+            self.loaded.add(table)
+
+    def reload(self):
+        """
+        @summary: 训练新字典后重新读取
+        """
+        with self.lock:
+            self.active = {}
+            self.loaded = set()
+
+    def get_dict(self, mysql, dict_id):
+        if not dict_id:
+            return None
+        data = self.dicts.get(dict_id)
+        if data is None:
+            row = mysql.getOne("SELECT `dict` FROM `%s` WHERE `id` = %%s" % DICT_TABLE, (dict_id,))
+            if not row:
+                raise ValueError('zstd 字典 %s 不存在' % dict_id)
+            data = bytes(row['dict'])
+            with self.lock:
+                self.dicts[dict_id] = data
+        return data
+
+    def get_dict_id(self, mysql, table, cType=None):
+        """
+        @return: 压缩该表数据使用的字典 id，没有字典时为 0
+        """
+        try:
+            self.load_active(mysql, table)
+        except BaseException as e:
+            # 没有字典表时不使用字典
+            logger.warning('读取 zstd 字典失败: %s', e.args)
+            self.loaded.add(table)
+        if cType:
+            dict_id = self.active.get('%s/%s' % (table, cType))
+            if dict_id:
+                return dict_id
+        return self.active.get(table, 0)
+
+    def get_zstd_dict(self, mysql, dict_id):
+        if not dict_id:
+            return None
+        zstd_dict = self.zstd_dicts.get(dict_id)
+        if zstd_dict is None:
+            zstd_dict = self.zstd.ZstdDict(self.get_dict(mysql, dict_id))
+            self.zstd_dicts[dict_id] = zstd_dict
+        return zstd_dict
+
+    def get_compressor(self, mysql, dict_id):
+        zstd = self.get_zstd()
+        if self.impl == 'stdlib':
+            zstd_dict = self.get_zstd_dict(mysql, dict_id)
+            return lambda value: zstd.compress(value, level=self.level, zstd_dict=zstd_dict)
+        compressors = self.local.__dict__.setdefault('compressors', {})
+        compressor = compressors.get(dict_id)
+        if compressor is None:
+            data = self.get_dict(mysql, dict_id)
+            if data:
+                compressor = zstd.ZstdCompressor(level=self.level, dict_data=zstd.ZstdCompressionDict(data))
+            else:
+                compressor = zstd.ZstdCompressor(level=self.level)
+            compressors[dict_id] = compressor
+        return compressor.compress
+
+    def get_decompressor(self, mysql, dict_id):
+        zstd = self.get_zstd()
+        if self.impl == 'stdlib':
+            zstd_dict = self.get_zstd_dict(mysql, dict_id)
+            return lambda value: zstd.decompress(value, zstd_dict=zstd_dict)
+        decompressors = self.local.__dict__.setdefault('decompressors', {})
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            data = self.get_dict(mysql, dict_id)
+            if data:
+                decompressor = zstd.ZstdDecompressor(dict_data=zstd.ZstdCompressionDict(data))
+            else:
+                decompressor = zstd.ZstdDecompressor()
+            decompressors[dict_id] = decompressor
+        return decompressor.decompress
+
+    def encode(self, mysql, table, content, cType=None):
+        """
+        @return: (压缩后的数据, 字典 id)，不压缩时为 (None, None)
+        """
+        if content is None:
+            return None, None
+        data = str(content).encode('utf-8')
+        if len(data) < self.min_size:
+            return None, None
+        dict_id = self.get_dict_id(mysql, table, cType)
+        return self.get_compressor(mysql, dict_id)(data), dict_id
+
+    def decode(self, mysql, data, dict_id):
+        return self.get_decompressor(mysql, dict_id)(bytes(data)).decode('utf-8')
+
+    def compress_rows(self, mysql, table, fields, rows):
+        """
+        @summary: 压缩一批数据的 content，追加 content_zstd、content_dict 字段
+        @return: (字段, [行])
+        """
+        content_index = fields.index('content')
+        ctype_index = fields.index('cType') if 'cType' in fields else None
+        result = []
+        for row in rows:
+            cType = row[ctype_index] if ctype_index is not None else None
+            data, dict_id = self.encode(mysql, table, row[content_index], cType)
+            if data is not None:
+                row = row[:content_index] + ('',) + row[content_index + 1:]
+            result.append(tuple(row) + (data, dict_id))
+        return fields + COMPRESS_FIELDS, result
+
+    def decode_rows(self, mysql, rows):
+        """
+        @summary: 将查询结果中压缩的 content 解压(就地修改)，并去掉 content_zstd 字段
+        """
+        if not rows:
+            return rows
+        for row in [rows] if isinstance(rows, dict) else rows:
+            if 'content_zstd' not in row:
+                # 查询结果中的各行字段相同
+                break
+            data = row.pop('content_zstd')
+            if data is not None:
+                row['content'] = self.decode(mysql, data, row.get('content_dict'))
+        return rows
+
+
+codec = ContentCodec()
+
+
+def create_dict_table(mysql):
+    mysql.update("CREATE TABLE IF NOT EXISTS `%s` ("
+                 "`id` INT UNSIGNED NOT NULL AUTO_INCREMENT, "
+                 "`name` VARCHAR(200) NOT NULL, "
+                 "`dict` MEDIUMBLOB NOT NULL, "
+                 "`samples` INT UNSIGNED NOT NULL DEFAULT 0, "
+                 "`create_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                 "PRIMARY KEY (`id`), KEY `idx_name` (`name`)"
+                 ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" % DICT_TABLE)
+
+
+def get_samples(mysql, table, cType=None, limit=5000):
+    """
+    从表中读取最近的 content 作为训练样本(已压缩的数据由 Mysql.getAll 解压)
+    """
+    where = "WHERE (`content` <> '' OR `content_zstd` IS NOT NULL)"
+    param = None
+    if cType is not None:
+        where += " AND `cType` = %s"
+        param = (cType,)
+    rows = mysql.getAll("SELECT `content`, `content_zstd`, `content_dict` FROM `%s` %s ORDER BY `id` DESC LIMIT %d" % (
+        table, where, limit), param) or []
+    return [row['content'].encode('utf-8') for row in rows if row['content']]
+
+
+def train(mysql, table, per_ctype=False, size=112640, limit=5000, min_samples=100):
+    """
+    为一个表训练字典，per_ctype 时另外为样本足够的每个 cType 各训练一个
+    :return: [(字典名称, 字典 id, 样本数)]
+    """
+    targets = [(table, None)]
+    if per_ctype:
+        rows = mysql.getAll("SELECT `cType`, COUNT(*) AS num FROM `%s` GROUP BY `cType` HAVING num >= %%s" % table,
+                            (min_samples,)) or []
+        targets.extend(('%s/%s' % (table, row['cType']), row['cType']) for row in rows if row['cType'])
+    result = []
+    for name, cType in targets:
+        samples = get_samples(mysql, table, cType, limit)
+        if len(samples) < min_samples:
+            logger.warning('%s 样本数 %s 少于 %s，跳过', name, len(samples), min_samples)
+            continue
+        data = train_dict(samples, size)
+        dict_id = mysql.insertOne("INSERT INTO `%s` (`name`, `dict`, `samples`) VALUES (%%s, %%s, %%s)" % DICT_TABLE,
+                                  (name, data, len(samples)))
+        result.append((name, dict_id, len(samples)))
+    codec.reload()
+    return result
+
+
+def compress_table(table, batch=1000):
+    """
+    压缩表中未压缩的数据
+    :return: (行数, 压缩前字节数, 压缩后字节数)
+    """
+    from .MysqlConn import Mysql
+    count, before, after = 0, 0, 0
+    last_id = 0
+    while True:
+        mysql = Mysql()
+        try:
+            rows = mysql.getAll("SELECT `id`, `cType`, `content` FROM `%s` WHERE `id` > %%s AND `content_zstd` IS NULL "
+                                "AND `content` <> '' ORDER BY `id` LIMIT %d" % (table, batch), (last_id,)) or []
+            for row in rows:
+                data, dict_id = codec.encode(mysql, table, row['content'], row['cType'])
+                if data is None:
+                    continue
+                mysql.update("UPDATE `%s` SET `content` = '', `content_zstd` = %%s, `content_dict` = %%s WHERE `id` = %%s"
+                             % table, (data, dict_id, row['id']))
+                count += 1
+                before += len(row['content'].encode('utf-8'))
+                after += len(data)
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        if len(rows) < batch:
+            return count, before, after
+        last_id = rows[-1]['id']
+
+
+def main(argv=None):
+    from .MysqlConn import Mysql
+    from .schema import get_spiders
+    from .utils import get_table_name
+    parser = argparse.ArgumentParser(description='content 字段的 zstd 字典压缩')
+    parser.add_argument('command', choices=('train', 'compress'), help='train: 训练字典; compress: 压缩已有的数据')
+    parser.add_argument('spiders', nargs='*', help='爬虫名称，缺省为全部')
+    parser.add_argument('--per-ctype', action='store_true', help='按 cType 分别训练字典')
+    parser.add_argument('--size', type=int, default=112640, help='字典大小(字节)')
+    parser.add_argument('--samples', type=int, default=5000, help='每个字典最多使用的样本数')
+    args = parser.parse_args(argv)
+    for spidercls in get_spiders(args.spiders):
+        table = get_table_name(spidercls.name)
+        try:
+            if args.command == 'train':
+                mysql = Mysql()
+                try:
+                    create_dict_table(mysql)
+                    result = train(mysql, table, per_ctype=args.per_ctype, size=args.size, limit=args.samples)
+                except BaseException:
+                    mysql.dispose(is_end=0)
+                    raise
+                mysql.dispose()
+                for name, dict_id, samples in result:
+                    print('%s: 字典 %s, 样本 %s 条' % (name, dict_id, samples))
+            else:
+                count, before, after = compress_table(table)
+                print('%s: 压缩 %s 行, %s -> %s 字节' % (table, count, before, after))
+        except BaseException as e:
+            logger.error('处理 %s 失败: %s', table, e.args)
+            print(e.args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+
+# 常驻的爬取调度进程
+# cron 每天执行 start_task.py 时每个报刊都要重新启动 Python、导入 Scrapy；常驻进程只启动一次，
+# 按 EPAPER_DAEMON_SCHEDULE 的时间对每个报刊运行增量爬取(-a incremental=1)，
+# 也可以通过本机端口 EPAPER_DAEMON_PORT 提交临时任务；同时运行的任务不超过 EPAPER_DAEMON_MAX_JOBS，
+# 同一爬虫同一时间只运行一个；每个任务的开始/结束时间、请求数、入库条数和错误数记录在 epaper_jobs 表中
+#
+# 使用：python -m epaper.daemon run                                    启动
+#       python -m epaper.daemon submit nfrb [-a start_date=2019-01-01]  提交临时任务
+#       python -m epaper.daemon status                                  运行中和排队的任务
+#       python -m epaper.daemon jobs [-n 20]                            最近的任务
+import abc
+import argparse
+import datetime
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer, protocol, task, threads
+from twisted.protocols import basic
+
+from .MysqlConn import Mysql
+from .runner import parse_pairs
+
+logger = logging.getLogger(__name__)
+
+JOBS_TABLE = 'epaper_jobs'
+# 记录在任务中的统计信息 {字段: 统计项}
+JOB_STATS = (
+    ('requests', 'downloader/request_count'),
+    ('items', 'item_scraped_count'),
+    ('errors', 'log_count/ERROR'),
+)
+
+
+def now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class JobStore(abc.ABC):
+    """
+    任务记录，方法在线程中调用
+    任务状态: queued 排队、running 运行中、finished 正常结束、failed 异常结束、skipped 同一爬虫正在运行
+    """
+    name = None
+    columns = ('id', 'spider', 'trigger', 'args', 'status', 'queue_time', 'start_time', 'end_time',
+               'requests', 'items', 'errors', 'finish_reason')
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def create(self, spider, trigger, args):
+        """
+        @return: 任务 id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update(self, job_id, **values):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def recent(self, count=20):
+        """
+        @return: 最近的任务 [dict]
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def last_scheduled(self):
+        """
+        @return: {爬虫: 最近一次定时任务的日期(2019-01-04 格式)}
+        """
+        raise NotImplementedError
+
+
+class MysqlJobStore(JobStore):
+    name = 'mysql'
+
+    def open(self):
+        mysql = Mysql()
+        try:
+            mysql.update("CREATE TABLE IF NOT EXISTS `%s` ("
+                         "`id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT, "
+                         "`spider` VARCHAR(50) NOT NULL, "
+                         "`trigger` VARCHAR(20) NOT NULL DEFAULT '', "
+                         "`args` VARCHAR(1000) NOT NULL DEFAULT '', "
+                         "`status` VARCHAR(10) NOT NULL DEFAULT 'queued', "
+                         "`queue_time` DATETIME NULL, "
+                         "`start_time` DATETIME NULL, "
+                         "`end_time` DATETIME NULL, "
+                         "`requests` INT UNSIGNED NOT NULL DEFAULT 0, "
+                         "`items` INT UNSIGNED NOT NULL DEFAULT 0, "
+                         "`errors` INT UNSIGNED NOT NULL DEFAULT 0, "
+                         "`finish_reason` VARCHAR(100) NOT NULL DEFAULT '', "
+                         "PRIMARY KEY (`id`), "
+                         "KEY `idx_spider` (`spider`, `trigger`, `queue_time`)"
+                         ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" % JOBS_TABLE)
+        finally:
+            mysql.dispose()
+
+    def create(self, spider, trigger, args):
+        mysql = Mysql()
+        try:
+            job_id = mysql.insertRecord(JOBS_TABLE, ('spider', 'trigger', 'args', 'status', 'queue_time'),
+                                        (spider, trigger, args, 'queued', now()))
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        return job_id
+
+    def update(self, job_id, **values):
+        names = sorted(values)
+        mysql = Mysql()
+        try:
+            mysql.update("UPDATE `%s` SET %s WHERE `id` = %%s" % (
+                JOBS_TABLE, ', '.join('`%s` = %%s' % name for name in names)),
+                [values[name] for name in names] + [job_id])
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+
+    def recent(self, count=20):
+        mysql = Mysql()
+        try:
+            rows = mysql.getAll("SELECT %s FROM `%s` ORDER BY `id` DESC LIMIT %d" % (
+                ', '.join('`%s`' % column for column in self.columns), JOBS_TABLE, count)) or []
+        finally:
+            mysql.dispose()
+        return [dict((name, str(value) if isinstance(value, datetime.datetime) else value)
+                     for name, value in row.items()) for row in rows]
+
+    def last_scheduled(self):
+        mysql = Mysql()
+        try:
+            rows = mysql.getAll("SELECT `spider`, MAX(`queue_time`) AS `queue_time` FROM `%s` "
+                                "WHERE `trigger` = 'schedule' GROUP BY `spider`" % JOBS_TABLE) or []
+        finally:
+            mysql.dispose()
+        return dict((row['spider'], row['queue_time'].strftime('%Y-%m-%d')) for row in rows if row['queue_time'])
+
+
+class SqliteJobStore(JobStore):
+    name = 'sqlite'
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(path=settings.get('EPAPER_JOBS_SQLITE_PATH', 'data/jobs.sqlite3'))
+
+    def __init__(self, path='data/jobs.sqlite3'):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.conn is not None:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "%s" ('
+                          '"id" INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          '"spider" TEXT NOT NULL, '
+                          '"trigger" TEXT NOT NULL DEFAULT \'\', '
+                          '"args" TEXT NOT NULL DEFAULT \'\', '
+                          '"status" TEXT NOT NULL DEFAULT \'queued\', '
+                          '"queue_time" TEXT, '
+                          '"start_time" TEXT, '
+                          '"end_time" TEXT, '
+                          '"requests" INTEGER NOT NULL DEFAULT 0, '
+                          '"items" INTEGER NOT NULL DEFAULT 0, '
+                          '"errors" INTEGER NOT NULL DEFAULT 0, '
+                          '"finish_reason" TEXT NOT NULL DEFAULT \'\')' % JOBS_TABLE)
+
+    def close(self):
+        if self.conn is None:
+            return
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+
+    def create(self, spider, trigger, args):
+        with self.lock, self.conn:
+            return self.conn.execute(
+                'INSERT INTO "%s" ("spider", "trigger", "args", "status", "queue_time") VALUES (?, ?, ?, ?, ?)' % (
+                    JOBS_TABLE), (spider, trigger, args, 'queued', now())).lastrowid
+
+    def update(self, job_id, **values):
+        names = sorted(values)
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE "%s" SET %s WHERE "id" = ?' % (
+                JOBS_TABLE, ', '.join('"%s" = ?' % name for name in names)),
+                [values[name] for name in names] + [job_id])
+
+    def recent(self, count=20):
+        with self.lock:
+            rows = self.conn.execute('SELECT %s FROM "%s" ORDER BY "id" DESC LIMIT %d' % (
+                ', '.join('"%s"' % column for column in self.columns), JOBS_TABLE, count)).fetchall()
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def last_scheduled(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT "spider", MAX("queue_time") FROM "%s" WHERE "trigger" = \'schedule\' '
+                                     'GROUP BY "spider"' % JOBS_TABLE).fetchall()
+        return dict((spider, queue_time[:10]) for spider, queue_time in rows if queue_time)
+
+
+JOB_STORES = {
+    MysqlJobStore.name: MysqlJobStore,
+    SqliteJobStore.name: SqliteJobStore,
+}
+
+
+def get_job_store(settings):
+    name = settings.get('EPAPER_JOBS_STORE', 'mysql')
+    if name not in JOB_STORES:
+        raise ValueError('EPAPER_JOBS_STORE 错误: %s' % name)
+    if name == MysqlJobStore.name:
+        Mysql.initPool(settings=settings)
+    store = JOB_STORES[name].from_settings(settings)
+    store.open()
+    return store
+
+
+def get_schedule(schedule, names):
+    """
+    :param schedule: {爬虫名或 '*': 'HH:MM'}，'*' 为没有单独设置的爬虫，时间为空时不定时运行
+    :param names: 全部爬虫名
+    :return: {爬虫名: 'HH:MM'}
+    """
+    result = {}
+    for name in names:
+        value = schedule.get(name, schedule.get('*'))
+        if value:
+            result[name] = '%02d:%02d' % tuple(int(part) for part in value.split(':'))
+    return result
+
+
+class ControlProtocol(basic.LineReceiver):
+    """
+    本机端口上的命令(每行一个，返回一行 JSON):
+      crawl 爬虫名 [NAME=VALUE ...]   提交任务
+      status                         运行中和排队的任务
+      jobs [数量]                     最近的任务
+    """
+    delimiter = b'\n'
+
+    def lineReceived(self, line):
+        parts = line.decode('utf-8').strip().split()
+        if not parts:
+            return
+        d = defer.maybeDeferred(self.factory.daemon.command, parts[0], parts[1:])
+        d.addErrback(lambda failure: {'error': failure.getErrorMessage()})
+        d.addCallback(lambda result: self.sendLine(json.dumps(result, ensure_ascii=False).encode('utf-8')))
+
+
+class CrawlDaemon(object):
+    """
+    常驻进程: 一个 CrawlerRunner 运行所有任务，reactor 一直运行
+    """
+
+    def __init__(self, settings, store, spiders, schedule=None, max_jobs=4, check_interval=30):
+        from scrapy.crawler import CrawlerRunner
+        self.settings = settings
+        self.store = store
+        # {爬虫名: 爬虫类}
+        self.spiders = dict((spidercls.name, spidercls) for spidercls in spiders)
+        self.schedule = get_schedule(schedule or {}, sorted(self.spiders))
+        self.runner = CrawlerRunner(settings)
+        self.semaphore = defer.DeferredSemaphore(max_jobs)
+        self.check_interval = check_interval
+        # {爬虫名: 任务 id}
+        self.running = {}
+        # {任务 id: 爬虫名}
+        self.queued = {}
+        # {爬虫名: 最近一次定时任务的日期}
+        self.last_run = {}
+        # 正在保存定时任务的爬虫
+        self.scheduling = set()
+        self.check_task = task.LoopingCall(self.check_schedule)
+
+    def start(self, port):
+        from twisted.internet import reactor
+        self.last_run = self.store.last_scheduled()
+        factory = protocol.ServerFactory()
+        factory.protocol = ControlProtocol
+        factory.daemon = self
+        reactor.listenTCP(port, factory, interface='127.0.0.1')
+        self.check_task.start(self.check_interval)
+        reactor.addSystemEventTrigger('before', 'shutdown', self.stop)
+        logger.info('调度进程已启动，端口 %s，定时任务 %s 个', port, len(self.schedule))
+
+    def stop(self):
+        if self.check_task.running:
+            self.check_task.stop()
+        return self.runner.stop()
+
+    def check_schedule(self):
+        """
+        @summary: 今天已到执行时间且今天还没有运行过定时任务的爬虫提交增量爬取任务
+        """
+        today = datetime.datetime.now().strftime('%Y-%m-%d')
+        current = datetime.datetime.now().strftime('%H:%M')
+        for name, time in sorted(self.schedule.items()):
+            if self.last_run.get(name) == today or time > current or name in self.scheduling:
+                continue
+            # 任务保存成功后才记为今天已运行，保存失败时下次检查重新提交
+            self.scheduling.add(name)
+            d = self.submit(name, {'incremental': '1'}, trigger='schedule')
+            d.addCallbacks(self.scheduled, self.schedule_failed, callbackArgs=(name, today), errbackArgs=(name,))
+
+    def scheduled(self, job_id, name, today):
+        self.scheduling.discard(name)
+        self.last_run[name] = today
+        return job_id
+
+    def schedule_failed(self, failure, name):
+        self.scheduling.discard(name)
+        logger.error('%s 提交定时任务失败，下次检查时重试: %s', name, failure.getErrorMessage())
+
+    def submit(self, name, kwargs=None, trigger='manual'):
+        """
+        @return: Deferred，结果为任务 id
+        """
+        if name not in self.spiders:
+            raise ValueError('爬虫不存在: %s' % name)
+        kwargs = kwargs or {}
+        d = threads.deferToThread(self.store.create, name, trigger, json.dumps(kwargs, sort_keys=True))
+
+        def queued(job_id):
+            self.queued[job_id] = name
+            run = self.semaphore.run(self.run_job, job_id, name, kwargs)
+            run.addErrback(lambda failure: logger.error('任务 %s(%s) 失败: %s', job_id, name,
+                                                        failure.getErrorMessage()))
+            return job_id
+
+        d.addCallback(queued)
+        return d
+
+    @defer.inlineCallbacks
+    def run_job(self, job_id, name, kwargs):
+        self.queued.pop(job_id, None)
+        if name in self.running:
+            logger.info('%s 正在运行(任务 %s)，跳过任务 %s', name, self.running[name], job_id)
+            yield threads.deferToThread(self.store.update, job_id, status='skipped', end_time=now())
+            return
+        self.running[name] = job_id
+        try:
+            yield threads.deferToThread(self.store.update, job_id, status='running', start_time=now())
+            crawler = self.runner.create_crawler(self.spiders[name])
+            status = 'finished'
+            try:
+                yield self.runner.crawl(crawler, **kwargs)
+            except BaseException as e:
+                logger.error('任务 %s(%s) 异常: %s', job_id, name, e)
+                status = 'failed'
+            stats = crawler.stats.get_stats() if crawler.stats is not None else {}
+            reason = stats.get('finish_reason', '')
+            if reason != 'finished':
+                status = 'failed'
+            values = dict((field, stats.get(key, 0)) for field, key in JOB_STATS)
+            yield threads.deferToThread(self.store.update, job_id, status=status, end_time=now(),
+                                        finish_reason=str(reason), **values)
+            logger.info('任务 %s(%s) 结束: %s, 入库 %s 条', job_id, name, reason, values['items'])
+        finally:
+            self.running.pop(name, None)
+
+    def command(self, name, args):
+        if name == 'crawl':
+            if not args:
+                raise ValueError('crawl 需要爬虫名称')
+            d = self.submit(args[0], parse_pairs(args[1:]))
+            d.addCallback(lambda job_id: {'job': job_id})
+            return d
+        if name == 'status':
+            return {'running': dict((spider, job_id) for spider, job_id in self.running.items()),
+                    'queued': [{'job': job_id, 'spider': spider} for job_id, spider in sorted(self.queued.items())]}
+        if name == 'jobs':
+            return threads.deferToThread(self.store.recent, int(args[0]) if args else 20)
+        raise ValueError('未知命令: %s' % name)
+
+
+def send_command(port, line, timeout=30):
+    """
+    @summary: 向调度进程发送一条命令
+    @return: 返回的 JSON
+    """
+    conn = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    try:
+        conn.sendall(line.encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        conn.close()
+    return json.loads(data.decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻的爬取调度进程')
+    parser.add_argument('command', choices=('run', 'submit', 'status', 'jobs'),
+                        help='run: 启动; submit: 提交任务; status: 运行中和排队的任务; jobs: 最近的任务')
+    parser.add_argument('spider', nargs='?', help='submit 的爬虫名称')
+    parser.add_argument('-a', dest='spargs', action='append', default=[], metavar='NAME=VALUE',
+                        help='传给爬虫的参数')
+    parser.add_argument('-n', type=int, default=20, help='jobs 显示的数量')
+    parser.add_argument('--port', type=int, help='缺省为 EPAPER_DAEMON_PORT')
+    args = parser.parse_args(argv)
+    settings = get_project_settings()
+    port = args.port or settings.getint('EPAPER_DAEMON_PORT', 6810)
+
+    if args.command != 'run':
+        if args.command == 'submit':
+            if not args.spider:
+                parser.error('submit 需要爬虫名称')
+            line = ' '.join(['crawl', args.spider] + args.spargs)
+        elif args.command == 'status':
+            line = 'status'
+        else:
+            line = 'jobs %d' % args.n
+        print(json.dumps(send_command(port, line), ensure_ascii=False, indent=2))
+        return
+
+    from scrapy.utils.log import configure_logging
+    from .schema import get_spiders
+    # CrawlerRunner 不会安装 reactor，需要在导入 reactor 之前按 TWISTED_REACTOR 安装
+    if settings.get('TWISTED_REACTOR'):
+        from scrapy.utils.reactor import install_reactor
+        install_reactor(settings.get('TWISTED_REACTOR'))
+    from twisted.internet import reactor
+    configure_logging(settings)
+    daemon = CrawlDaemon(settings, get_job_store(settings), get_spiders(),
+                         schedule=settings.getdict('EPAPER_DAEMON_SCHEDULE'),
+                         max_jobs=settings.getint('EPAPER_DAEMON_MAX_JOBS', 4))
+    reactor.callWhenRunning(daemon.start, port)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# 网站布局时期(epoch)的自动检测
+# 报刊登记表(papers.py)中每个报刊的 epochs 按时间排列，改版日期(since)不确定时可以省略；
+# 检测时按日期二分查找: 对某一天依次请求各时期的起始链接，起始页符合哪个时期的结构(probe)就属于哪个时期，
+# 两个日期属于不同时期时取中间的日期继续查找，直到相邻的两天；没有出版的日期向前后顺延
+# 找到的改版日期按报刊保存在 .scrapy/ 下的 EPAPER_EPOCH_FILE 中，PaperSpider 对每个日期直接使用对应时期的
+# 起始链接和 XPath，不再请求错误的链接或在每个页面上依次尝试新旧 XPath
+#
+# 使用：python -m epaper.epochs detect zqsb [--start-date 2008-05-14 --end-date 2019-02-24]
+#       python -m epaper.epochs show [zqsb]
+#       python -m epaper.epochs clear zqsb
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import sys
+
+from scrapy.utils.project import data_path
+
+from .utils import locked_file, write_json
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def get_probes(epoch):
+    """
+    :return: 起始页必须匹配的 XPath，缺省为版面和文章链接的 XPath
+    """
+    if epoch.get('probe'):
+        return [epoch['probe']]
+    return [epoch[key] for key in ('layouts', 'articles') if epoch.get(key)]
+
+
+def match_epoch(selectors, response, epoch):
+    """
+    @summary: 起始页是否符合该时期的结构(probe 的每个 XPath 都有结果)
+    """
+    if response.status != 200:
+        return False
+    return all(selectors.extract(response, query) for query in get_probes(epoch))
+
+
+def get_fingerprint(epochs):
+    """
+    :return: 各时期起始链接和 probe 的 sha1，登记表中的时期改变后已保存的检测结果失效
+    """
+    data = json.dumps([[epoch['start_url'], get_probes(epoch)] for epoch in epochs], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def need_detect(epochs, detected, start_date, end_date):
+    """
+    :param detected: 保存的检测结果(EpochStore.get)，没有时为 None
+    :param start_date: 要爬取的开始日期 2019-01-04
+    :param end_date: 要爬取的结束日期
+    :return: 是否需要检测: 有未知的改版日期，且检测结果没有覆盖日期范围中可能改版的部分
+    """
+    if all(epoch.get('since') for epoch in epochs[1:]):
+        return False
+    if detected is None:
+        return True
+    # 时期按时间排列: 检测范围内已出现第一个(最后一个)时期时，范围之前(之后)的日期不会再改版
+    return start_date < detected['start_date'] and detected['first'] > 0 or \
+        end_date > detected['end_date'] and detected['last'] < len(epochs) - 1
+
+
+def bisect_epochs(start, end):
+    """
+    二分查找改版日期，生成器: yield 要检测的日期，send 该日期所属时期的序号(没有出版时为 None)
+    :param start: 开始日期 datetime.date
+    :param end: 结束日期 datetime.date
+    :return: (first, last, {时期序号: 开始日期})，first/last 为 start/end 附近出版日期所属的时期，
+             范围内没有出版的日期时为 (None, None, {})
+    """
+    one_day = datetime.timedelta(days=1)
+
+    def find(first, last, step):
+        # 从 first 开始按 step 顺延到 last(包括)，返回第一个出版日期及其时期
+        date = first
+        while (date - last).days * step.days <= 0:
+            index = yield date
+            if index is not None:
+                return date, index
+            date += step
+        return None, None
+
+    lo, first = yield from find(start, end, one_day)
+    if lo is None:
+        return None, None, {}
+    hi, last = yield from find(end, lo, -one_day)
+    boundaries = {}
+    stack = [(lo, first, hi, last)]
+    while stack:
+        lo, lo_index, hi, hi_index = stack.pop()
+        if lo_index >= hi_index:
+            if lo_index > hi_index:
+                logger.warning('%s 的时期(%s)晚于 %s 的时期(%s)，忽略', lo, lo_index, hi, hi_index)
+            continue
+        mid = lo + (hi - lo) // 2
+        date, index = None, None
+        if mid > lo:
+            date, index = yield from find(mid, hi - one_day, one_day)
+            if date is None and mid - one_day > lo:
+                date, index = yield from find(mid - one_day, lo + one_day, -one_day)
+        if date is None:
+            # lo 和 hi 之间没有出版的日期，hi 即新时期的第一天
+            for i in range(lo_index + 1, hi_index + 1):
+                boundaries[i] = hi.strftime(DATE_FORMAT)
+            continue
+        stack.append((lo, lo_index, date, index))
+        stack.append((date, index, hi, hi_index))
+    return first, last, boundaries
+
+
+class EpochStore(object):
+    """
+    @summary: 检测结果 {爬虫名: {fingerprint, start_date, end_date, first, last, boundaries, detect_time}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(data_path(settings.get('EPAPER_EPOCH_FILE') or 'epochs.json'))
+
+    def read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, name, epochs):
+        """
+        @return: 检测结果，没有或登记表中的时期已改变时为 None
+        """
+        result = self.read().get(name)
+        if result is None or result.get('fingerprint') != get_fingerprint(epochs):
+            return None
+        return result
+
+    def save(self, name, result):
+        """
+        @summary: 保存一个爬虫的检测结果，result 为 None 时删除；多个爬虫同时检测时加锁合并，不覆盖其他爬虫的结果
+        """
+        with locked_file(self.path):
+            data = self.read()
+            if result is None:
+                data.pop(name, None)
+            else:
+                data[name] = result
+            write_json(self.path, data, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+    from .runner import run
+    from .schema import get_spiders
+    parser = argparse.ArgumentParser(description='检测网站的布局时期')
+    subparsers = parser.add_subparsers(dest='command')
+    detect = subparsers.add_parser('detect', help='二分查找改版日期并保存')
+    detect.add_argument('spiders', nargs='+', help='爬虫名称')
+    detect.add_argument('--start-date', help='开始日期，缺省为爬虫的 start_date')
+    detect.add_argument('--end-date', help='结束日期，缺省为爬虫的 end_date')
+    show = subparsers.add_parser('show', help='显示保存的检测结果')
+    show.add_argument('spiders', nargs='*', help='爬虫名称，缺省为全部')
+    clear = subparsers.add_parser('clear', help='删除保存的检测结果')
+    clear.add_argument('spiders', nargs='+', help='爬虫名称')
+    args = parser.parse_args(argv)
+    settings = get_project_settings()
+    store = EpochStore.from_settings(settings)
+    if args.command == 'detect':
+        spiders = [spidercls for spidercls in get_spiders(args.spiders) if hasattr(spidercls, 'epochs')]
+        if not spiders:
+            parser.error('没有登记表中的爬虫: %s' % ' '.join(args.spiders))
+        kwargs = {'epoch_detect': 'only'}
+        for name in ('start_date', 'end_date'):
+            if getattr(args, name):
+                kwargs[name] = getattr(args, name)
+        # 只请求起始页，不使用共享队列和数据库
+        settings.set('EPAPER_FRONTIER', None, priority='cmdline')
+        settings.set('EPAPER_SEEN_FILTER', False, priority='cmdline')
+        settings.set('EPAPER_INCREMENTAL', False, priority='cmdline')
+        run(spiders, kwargs, settings)
+    elif args.command == 'clear':
+        for name in args.spiders:
+            store.save(name, None)
+    elif args.command != 'show':
+        parser.print_help()
+        return 1
+    data = store.read()
+    for name in sorted(data):
+        if args.spiders and name not in args.spiders:
+            continue
+        result = data[name]
+        print('%s: %s 至 %s, 时期 %s-%s, 改版日期 %s' % (
+            name, result['start_date'], result['end_date'], result['first'], result['last'],
+            ', '.join('%s: %s' % (i, date) for i, date in sorted(result['boundaries'].items())) or '无'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Scrapy 扩展
+import json
+import logging
+import os
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from .warc import WarcWriter
+
+logger = logging.getLogger(__name__)
+
+
+class StatsDump(object):
+    """
+    爬虫关闭时把统计信息写入 EPAPER_STATS_FILE(JSON)，多进程运行时由启动程序合并
+    """
+
+    def __init__(self, stats, path):
+        self.stats = stats
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('EPAPER_STATS_FILE')
+        if not path:
+            raise NotConfigured
+        ext = cls(crawler.stats, path)
+        # 在其他扩展(如 CoreStats 记录 finish_time)之后执行
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed, priority=-1000)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        stats = dict(self.stats.get_stats())
+        stats.setdefault('finish_reason', reason)
+        stats['spider'] = spider.name
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2, sort_keys=True, default=str)
+
+
+class WarcArchive(object):
+    """
+    EPAPER_WARC_ENABLED = True 时把下载的响应(不含缓存命中的)保存到 EPAPER_WARC_DIR/<爬虫>/ 下的 WARC 文件，
+    每个文件达到 EPAPER_WARC_ROTATE_BYTES 后换新文件，用于离线重新解析(python -m epaper.replay)
+    """
+
+    def __init__(self, stats, path, rotate_bytes):
+        self.stats = stats
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('EPAPER_WARC_ENABLED', False):
+            raise NotConfigured
+        ext = cls(crawler.stats, settings.get('EPAPER_WARC_DIR', 'data/warc'),
+                  settings.getint('EPAPER_WARC_ROTATE_BYTES', 64 * 1024 * 1024))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.writer = WarcWriter(os.path.join(self.path, spider.name), spider.name, self.rotate_bytes)
+
+    def response_received(self, response, request, spider):
+        if self.writer is None or 'cached' in response.flags:
+            return
+        self.writer.write_response(response, request)
+        self.stats.inc_value('epaper/warc_records')
+
+    def spider_closed(self, spider):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def merge_stats(stats_list):
+    """
+    合并多个进程/爬虫的统计信息: 计数相加，*_max 取最大值，开始时间取最早、结束时间取最晚，
+    平均值和比率类的统计按合并后的计数重新计算
+    :return: dict
+    """
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key in ('start_time',):
+                merged[key] = min(merged.get(key, value), value)
+            elif key in ('finish_time',):
+                merged[key] = max(merged.get(key, value), value)
+            elif key in ('finish_reason', 'spider'):
+                values = merged.setdefault(key, [])
+                if value not in values:
+                    values.append(value)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            elif key.endswith('_avg') or key.endswith('_per_second') or key.endswith('rows_per_commit'):
+                continue
+            elif key.endswith('_max') or key.endswith('max') or key == 'elapsed_time_seconds':
+                merged[key] = max(merged.get(key, value), value)
+            else:
+                merged[key] = merged.get(key, 0) + value
+    commits = merged.get('epaper/flush_count')
+    if commits:
+        merged['epaper/rows_per_commit'] = round(float(merged.get('epaper/flush_rows', 0)) / commits, 2)
+        merged['epaper/flush_latency_avg'] = round(float(merged.get('epaper/flush_latency_total', 0)) / commits, 4)
+    return merged
+
+
+def format_summary(merged, elapsed=None):
+    """
+    合并后的统计信息中主要的几项
+    :param elapsed: 总耗时(秒)，用于计算每秒条数
+    :return: 文本
+    """
+    lines = []
+    names = (('爬虫', 'spider'), ('结束原因', 'finish_reason'), ('请求数', 'downloader/request_count'),
+             ('响应数', 'response_received_count'), ('入库条数', 'item_scraped_count'),
+             ('丢弃条数', 'item_dropped_count'), ('已爬取过滤', 'epaper/seen_filtered'),
+             ('写入失败行数', 'epaper/flush_error_rows'), ('WAL 行数', 'epaper/spool_rows'),
+             ('错误日志', 'log_count/ERROR'))
+    for title, key in names:
+        if key in merged:
+            value = merged[key]
+            if isinstance(value, list):
+                value = ', '.join(str(v) for v in value)
+            lines.append('%s: %s' % (title, value))
+    if elapsed:
+        lines.append('耗时: %.1f 秒, 每秒入库 %.2f 条, 每秒请求 %.2f 个' % (
+            elapsed, merged.get('item_scraped_count', 0) / elapsed,
+            merged.get('downloader/request_count', 0) / elapsed))
+    return '\n'.join(lines)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+# 预编译的 XPath 和正则
+# 爬虫回调中的 XPath 表达式编译为 lxml.etree.XPath 后按表达式缓存，所有爬虫共用，不再每次由 parsel 解析表达式；
+# 爬虫可以为模板固定的页面登记更快的提取方式(RegexExtractor 在源码上匹配正则，TextExtractor 按标记截取文字，
+# 都不需要解析 DOM)，页面与模板不符时返回 None，改用 XPath
+#
+# 对比解析速度：python -m epaper.extractors bench rmrb_hw [data/warc/rmrb_hw ...] [-n 200]
+import argparse
+import html
+import re
+import sys
+import time
+
+from lxml import etree
+
+# 爬虫中常用的正则
+NON_DIGIT = re.compile(r'\D')
+NON_DIGITS = re.compile(r'\D+')
+WHITESPACE = re.compile(r'\s')
+PARENTHESES = re.compile(r'\(.*?\)')
+
+# 标签和注释
+TAG_PATTERN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)[^>]*?(/?)>|<[^>]*>', re.S)
+
+# 编译后的 XPath {表达式: etree.XPath}
+_xpaths = {}
+
+
+def get_xpath(query):
+    """
+    :return: 编译后的 XPath，同一表达式只编译一次
+    """
+    xpath = _xpaths.get(query)
+    if xpath is None:
+        xpath = _xpaths[query] = etree.XPath(query, smart_strings=False)
+    return xpath
+
+
+class RegexExtractor(object):
+    """
+    @summary: 在页面源码上匹配正则，返回每个匹配的第一个分组(还原 HTML 实体，去掉空字符串)，没有匹配时返回 None
+    """
+
+    def __init__(self, pattern, flags=re.S):
+        self.pattern = re.compile(pattern, flags)
+
+    def __call__(self, response):
+        matched = False
+        values = []
+        for match in self.pattern.finditer(response.text):
+            matched = True
+            value = html.unescape(match.group(1).replace('\r\n', '\n'))
+            if value:
+                values.append(value)
+        return values if matched else None
+
+
+class TextExtractor(object):
+    """
+    @summary: 截取 start 与其后的 end 两个标记之间的源码，按标签切分为文字节点(与 //text() 的结果相同)，
+              tags 不为空时只保留这些标签内的文字(如 ('p',) 对应 //p//text())；找不到标记时返回 None
+    """
+
+    def __init__(self, start, end, tags=None):
+        self.start = start
+        self.end = end
+        self.tags = set(tag.lower() for tag in tags) if tags else None
+
+    def __call__(self, response):
+        text = response.text
+        begin = text.find(self.start)
+        if begin < 0:
+            return None
+        begin += len(self.start)
+        end = text.find(self.end, begin)
+        if end < 0:
+            return None
+        block = text[begin:end].replace('\r\n', '\n')
+        values = []
+        depth = 0
+        pos = 0
+        for match in TAG_PATTERN.finditer(block):
+            if match.start() > pos and (self.tags is None or depth > 0):
+                values.append(html.unescape(block[pos:match.start()]))
+            pos = match.end()
+            name = match.group(2)
+            if self.tags is not None and name and name.lower() in self.tags and not match.group(3):
+                depth = max(depth - 1, 0) if match.group(1) else depth + 1
+        if pos < len(block) and (self.tags is None or depth > 0):
+            values.append(html.unescape(block[pos:]))
+        return [value for value in values if value]
+
+
+class SelectorRegistry(object):
+    """
+    @summary: 爬虫的提取规则，以 XPath 表达式为键；登记了快速提取方式的表达式先使用快速提取，
+              返回 None 时使用编译后的 XPath
+    """
+
+    def __init__(self, extractors=None):
+        # {XPath 表达式: [快速提取方式]}
+        self.extractors = {}
+        for query, extractor in (extractors or {}).items():
+            self.register(query, extractor)
+
+    def register(self, query, extractor):
+        """
+        @summary: 为 XPath 表达式登记快速提取方式 extractor(response) -> [str] 或 None，同时预编译表达式
+        """
+        get_xpath(query)
+        self.extractors.setdefault(query, []).append(extractor)
+
+    def extract(self, response, query):
+        """
+        @return: 与 response.xpath(query).extract() 相同
+        """
+        for extractor in self.extractors.get(query, ()):
+            values = extractor(response)
+            if values is not None:
+                return values
+        values = get_xpath(query)(response.selector.root)
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            # 选择的是元素(或数值等)时由 parsel 序列化
+            return response.xpath(query).extract()
+        return values
+
+    def extract_first(self, response, query, default=None):
+        """
+        @return: 与 response.xpath(query).extract_first() 相同
+        """
+        values = self.extract(response, query)
+        return values[0] if values else default
+
+
+class XpathRegistry(SelectorRegistry):
+    """
+    @summary: 不使用快速提取，只用编译后的 XPath(用于对比)
+    """
+
+    def extract(self, response, query):
+        values = get_xpath(query)(response.selector.root)
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            return response.xpath(query).extract()
+        return values
+
+
+class ParselRegistry(SelectorRegistry):
+    """
+    @summary: 与原来的写法相同，每次由 parsel 解析表达式(用于对比)
+    """
+
+    def extract(self, response, query):
+        return response.xpath(query).extract()
+
+
+# 没有原始页面时使用的人民网(paper.people.com.cn)文章页
+SAMPLE_PAGE = '''<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN">
+<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8" /><title>%(title)s</title>
+<script type="text/javascript">var page = 1;</script></head>
+<body><div class="header"><ul>%(nav)s</ul></div>
+<div class="main"><div class="left">%(titles)s</div>
+<div class="right_c"><div class="text_c">
+<h3></h3>
+<h1>%(title)s</h1>
+<h2></h2>
+<h4>记者 张三</h4>
+<div class="lai"><span>《人民日报海外版》（ 2019年02月25日 第 01 版）</span></div>
+<div class="c_c" id="ozoom">
+<!--enpproperty <articleid>1</articleid><date>2019-02-25</date>--><!--/enpproperty--><!--enpcontent-->%(content)s<!--/enpcontent-->
+</div></div></div></div>
+<div class="footer"><p>人民日报社概况 | 关于人民网 | 报社招聘</p></div></body></html>'''
+
+
+def get_sample_page(paragraphs=30):
+    content = ''.join('<P>　　第%d段，新华社北京2月25日电&nbsp;（记者 李四）%s</P>\r\n' % (i, '文章内容' * 30)
+                      for i in range(paragraphs))
+    return (SAMPLE_PAGE % {
+        'title': '示例标题 &amp; 副标题',
+        'nav': ''.join('<li><a href="node_%d.htm">第%d版</a></li>' % (i, i) for i in range(20)),
+        'titles': ''.join('<li><a href="nw.D110000renmrb_20190225_%d-01.htm">标题%d</a></li>' % (i, i)
+                          for i in range(30)),
+        'content': content,
+    }).encode('utf-8')
+
+
+def iter_pages(paths, callback='parse_content'):
+    """
+    :return: 迭代 (链接, 响应头, 页面)，paths 为空时为示例页面
+    """
+    if not paths:
+        yield ('http://paper.people.com.cn/rmrbhwb/html/2019-02/25/content_1.htm',
+               [(b'Content-Type', b'text/html; charset=utf-8')], get_sample_page())
+        return
+    from .warc import iter_records
+    for path in paths:
+        for record in iter_records(path):
+            if record['callback'] == callback:
+                yield record['url'], record['headers'], record['body']
+
+
+def benchmark(spidercls, pages, number=200, callback='parse_content'):
+    """
+    对比三种提取方式解析同一批页面的速度；每次都重新创建响应，页面解析的时间也计算在内
+    :return: [(方式, 每秒页数, [结果])]
+    """
+    from scrapy import Request
+    from scrapy.http import Headers
+    from scrapy.responsetypes import responsetypes
+    spider = spidercls()
+    results = []
+    for mode, registry in (('parsel', ParselRegistry()), ('xpath', XpathRegistry()),
+                           ('fast', spidercls.selectors)):
+        spider.selectors = registry
+        method = getattr(spider, callback)
+        outputs = []
+        count = 0
+        start = time.time()
+        while count < number:
+            for url, headers, body in pages:
+                headers = Headers(headers)
+                respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+                response = respcls(url=url, headers=headers, body=body, request=Request(url))
+                output = [dict(item) for item in method(response) or () if not isinstance(item, Request)]
+                if len(outputs) < len(pages):
+                    outputs.append(output)
+                count += 1
+        elapsed = time.time() - start
+        results.append((mode, count / elapsed if elapsed else 0, outputs))
+    return results
+
+
+def main(argv=None):
+    from .schema import get_spiders
+    parser = argparse.ArgumentParser(description='预编译 XPath 和快速提取')
+    subparsers = parser.add_subparsers(dest='command')
+    bench = subparsers.add_parser('bench', help='对比解析速度')
+    bench.add_argument('spider', help='爬虫名称')
+    bench.add_argument('paths', nargs='*', help='WARC 文件(python -m epaper.replay 使用的存档)，缺省为示例页面')
+    bench.add_argument('-n', '--number', type=int, default=200, help='每种方式解析的页数')
+    bench.add_argument('-c', '--callback', default='parse_content', help='回调')
+    args = parser.parse_args(argv)
+    if args.command != 'bench':
+        parser.print_help()
+        return 1
+    spiders = get_spiders([args.spider])
+    if not spiders:
+        parser.error('爬虫不存在: %s' % args.spider)
+    from .replay import get_paths
+    paths = get_paths(args.spider, args.paths, '') if args.paths else []
+    pages = list(iter_pages(paths, args.callback))[:args.number]
+    if not pages:
+        parser.error('WARC 文件中没有 %s 的页面' % args.callback)
+    results = benchmark(spiders[0], pages, args.number, args.callback)
+    base = results[0][1]
+    expected = results[0][2]
+    print('%-8s %12s %8s %8s' % ('方式', '页/秒', '倍数', '不同'))
+    for mode, rate, outputs in results:
+        diff = sum(1 for output, other in zip(outputs, expected) if
+                   [dict(item, insert_time=None) for item in output] !=
+                   [dict(item, insert_time=None) for item in other])
+        print('%-8s %12.1f %8.2f %8d' % (mode, rate, rate / base if base else 0, diff))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+# 多机共享的爬取队列: (爬虫, 报纸日期) 保存在 epaper_frontier 表中，每台机器的爬虫按批租用日期，
+# 租约到期前续约，一批日期的请求全部完成(爬虫空闲)后标记为 done 再租用下一批；
+# 进程崩溃时租约到期后由其他机器重新租用，增加机器即可加快回溯爬取，不会重复下载同一天的报纸
+#   'mysql'  : 多台机器共用的 MySQL 数据库(MysqlConn.Mysql)
+#   'sqlite' : 本机的 SQLite 文件，适合同一台机器上的多个进程和测试
+#
+# 使用：scrapy crawl xxx -a frontier=mysql                      (或 settings.py 中 EPAPER_FRONTIER = 'mysql')
+#       python -m epaper.frontier status [爬虫名 ...]            各状态的日期数
+#       python -m epaper.frontier reset 爬虫名 [--status failed]  重新爬取
+import abc
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+
+from .MysqlConn import Mysql
+
+FRONTIER_TABLE = 'epaper_frontier'
+
+# 爬虫把租用的日期标记为完成之前发送的信号，处理函数返回 Deferred 时等待其完成；
+# 入库管道在这时写完缓存区和导入文件(见 pipelines.EpaperPipeline.flush_all)，数据入库后日期才标记为 done
+lease_finishing = object()
+
+
+def get_worker_id():
+    """
+    @return: 主机名:进程号，记录在租用的日期中便于排查
+    """
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+class Frontier(abc.ABC):
+    """
+    共享队列基类，方法在线程中调用时需要线程安全
+    日期的状态: pending 等待租用、leased 已租用、done 已完成、failed 租约多次到期仍未完成
+    """
+    name = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(lease_seconds=settings.getint('EPAPER_FRONTIER_LEASE_SECONDS', 1800),
+                   max_attempts=settings.getint('EPAPER_FRONTIER_MAX_ATTEMPTS', 5))
+
+    def __init__(self, lease_seconds=1800, max_attempts=5):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker = get_worker_id()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def seed(self, spider, dates):
+        """
+        @summary: 加入日期(2019-01-04 格式)，已存在的日期不变
+        @return: 新加入的日期数
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def lease(self, spider, count):
+        """
+        @summary: 按日期顺序租用最多 count 个等待中或租约已到期的日期
+        @return: (租约 id, [日期])
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def renew(self, lease_id):
+        """
+        @return: 续约的日期数
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def done(self, lease_id):
+        """
+        @summary: 租约中的日期标记为已完成(租约已被其他机器接管时不变)
+        @return: 标记的日期数
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, lease_id):
+        """
+        @summary: 提前归还租约，日期恢复为等待租用
+        @return: 归还的日期数
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_status(self, spiders=None):
+        """
+        @return: [(爬虫, 状态, 日期数)]
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def reset(self, spider, status=None):
+        """
+        @summary: 日期恢复为等待租用，status 为 None 时重置全部
+        @return: 重置的日期数
+        """
+        raise NotImplementedError
+
+
+class MysqlFrontier(Frontier):
+    """
+    保存在 MySQL 的 epaper_frontier 表中，租约时间使用数据库服务器的时钟
+    """
+    name = 'mysql'
+
+    def open(self):
+        mysql = Mysql()
+        try:
+            mysql.update("CREATE TABLE IF NOT EXISTS `%s` ("
+                         "`spider` VARCHAR(50) NOT NULL, "
+                         "`issue_date` DATE NOT NULL, "
+                         "`status` VARCHAR(10) NOT NULL DEFAULT 'pending', "
+                         "`lease_id` CHAR(32) NULL, "
+                         "`worker` VARCHAR(100) NULL, "
+                         "`lease_until` INT UNSIGNED NOT NULL DEFAULT 0, "
+                         "`attempts` INT UNSIGNED NOT NULL DEFAULT 0, "
+                         "`update_time` DATETIME NULL, "
+                         "PRIMARY KEY (`spider`, `issue_date`), "
+                         "KEY `idx_status` (`spider`, `status`, `lease_until`), "
+                         "KEY `idx_lease_id` (`lease_id`)"
+                         ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" % FRONTIER_TABLE)
+        finally:
+            mysql.dispose()
+
+    def execute(self, sql, param=None):
+        mysql = Mysql()
+        try:
+            count = mysql.update(sql, param)
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        return count
+
+    def seed(self, spider, dates):
+        if not dates:
+            return 0
+        mysql = Mysql()
+        try:
+            count = mysql.insertMany("INSERT IGNORE INTO `%s`(`spider`, `issue_date`) VALUES(%%s, %%s)" % (
+                FRONTIER_TABLE), [(spider, date) for date in dates])
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        return count
+
+    def lease(self, spider, count):
+        lease_id = uuid.uuid4().hex
+        # 单条 UPDATE 在行锁下完成租用，并发租用的机器不会得到相同的日期
+        self.execute("UPDATE `%s` SET `status` = 'leased', `lease_id` = %%s, `worker` = %%s, "
+                     "`lease_until` = UNIX_TIMESTAMP() + %%s, `attempts` = `attempts` + 1, `update_time` = NOW() "
+                     "WHERE `spider` = %%s AND (`status` = 'pending' OR (`status` = 'leased' AND "
+                     "`lease_until` < UNIX_TIMESTAMP())) AND `attempts` < %%s "
+                     "ORDER BY `issue_date` LIMIT %d" % (FRONTIER_TABLE, count),
+                     (lease_id, self.worker, self.lease_seconds, spider, self.max_attempts))
+        # 多次租约到期仍未完成的日期不再租用
+        self.execute("UPDATE `%s` SET `status` = 'failed', `update_time` = NOW() WHERE `spider` = %%s "
+                     "AND `status` = 'leased' AND `lease_until` < UNIX_TIMESTAMP() AND `attempts` >= %%s" % (
+                         FRONTIER_TABLE), (spider, self.max_attempts))
+        mysql = Mysql()
+        try:
+            rows = mysql.getAll("SELECT `issue_date` FROM `%s` WHERE `lease_id` = %%s ORDER BY `issue_date`" % (
+                FRONTIER_TABLE), (lease_id,)) or []
+        finally:
+            mysql.dispose()
+        return lease_id, [row['issue_date'].strftime('%Y-%m-%d') for row in rows]
+
+    def renew(self, lease_id):
+        return self.execute("UPDATE `%s` SET `lease_until` = UNIX_TIMESTAMP() + %%s WHERE `lease_id` = %%s "
+                            "AND `status` = 'leased'" % FRONTIER_TABLE, (self.lease_seconds, lease_id))
+
+    def done(self, lease_id):
+        return self.execute("UPDATE `%s` SET `status` = 'done', `update_time` = NOW() WHERE `lease_id` = %%s "
+                            "AND `status` = 'leased'" % FRONTIER_TABLE, (lease_id,))
+
+    def release(self, lease_id):
+        # 归还不计入租用次数
+        return self.execute("UPDATE `%s` SET `status` = 'pending', `lease_until` = 0, `attempts` = `attempts` - 1, "
+                            "`update_time` = NOW() WHERE `lease_id` = %%s AND `status` = 'leased'" % FRONTIER_TABLE,
+                            (lease_id,))
+
+    def get_status(self, spiders=None):
+        sql = "SELECT `spider`, `status`, COUNT(*) AS `count` FROM `%s`" % FRONTIER_TABLE
+        param = None
+        if spiders:
+            sql += " WHERE `spider` IN (%s)" % ', '.join(['%s'] * len(spiders))
+            param = list(spiders)
+        mysql = Mysql()
+        try:
+            rows = mysql.getAll(sql + " GROUP BY `spider`, `status` ORDER BY `spider`, `status`", param) or []
+        finally:
+            mysql.dispose()
+        return [(row['spider'], row['status'], row['count']) for row in rows]
+
+    def reset(self, spider, status=None):
+        sql = "UPDATE `%s` SET `status` = 'pending', `lease_id` = NULL, `lease_until` = 0, `attempts` = 0, " \
+              "`update_time` = NOW() WHERE `spider` = %%s" % FRONTIER_TABLE
+        param = [spider]
+        if status:
+            sql += " AND `status` = %s"
+            param.append(status)
+        return self.execute(sql, param)
+
+
+class SqliteFrontier(Frontier):
+    """
+    保存在 SQLite 文件中(WAL 模式)，租用在 BEGIN IMMEDIATE 事务中完成，同一台机器上的多个进程可以共用
+    """
+    name = 'sqlite'
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(path=settings.get('EPAPER_FRONTIER_SQLITE_PATH', 'data/frontier.sqlite3'),
+                   lease_seconds=settings.getint('EPAPER_FRONTIER_LEASE_SECONDS', 1800),
+                   max_attempts=settings.getint('EPAPER_FRONTIER_MAX_ATTEMPTS', 5))
+
+    def __init__(self, path='data/frontier.sqlite3', lease_seconds=1800, max_attempts=5):
+        super(SqliteFrontier, self).__init__(lease_seconds=lease_seconds, max_attempts=max_attempts)
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.conn is not None:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "%s" ('
+                          '"spider" TEXT NOT NULL, '
+                          '"issue_date" TEXT NOT NULL, '
+                          '"status" TEXT NOT NULL DEFAULT \'pending\', '
+                          '"lease_id" TEXT, '
+                          '"worker" TEXT, '
+                          '"lease_until" INTEGER NOT NULL DEFAULT 0, '
+                          '"attempts" INTEGER NOT NULL DEFAULT 0, '
+                          '"update_time" TEXT, '
+                          'PRIMARY KEY ("spider", "issue_date"))' % FRONTIER_TABLE)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_%s_lease_id" ON "%s" ("lease_id")' % (
+            FRONTIER_TABLE, FRONTIER_TABLE))
+
+    def close(self):
+        if self.conn is None:
+            return
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+
+    def transaction(self, statements):
+        """
+        @summary: 在一个事务中执行 [(sql, 参数)]
+        @return: 每条语句影响的行数
+        """
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                counts = [self.conn.execute(sql, param).rowcount for sql, param in statements]
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        return counts
+
+    def seed(self, spider, dates):
+        if not dates:
+            return 0
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany('INSERT OR IGNORE INTO "%s" ("spider", "issue_date") VALUES (?, ?)' % (
+                    FRONTIER_TABLE), [(spider, date) for date in dates])
+                count = self.conn.total_changes - before
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        return count
+
+    def lease(self, spider, count):
+        lease_id = uuid.uuid4().hex
+        self.transaction([
+            ('UPDATE "%s" SET "status" = \'leased\', "lease_id" = ?, "worker" = ?, '
+             '"lease_until" = CAST(strftime(\'%%s\', \'now\') AS INTEGER) + ?, "attempts" = "attempts" + 1, '
+             '"update_time" = datetime(\'now\', \'localtime\') WHERE rowid IN ('
+             'SELECT rowid FROM "%s" WHERE "spider" = ? AND ("status" = \'pending\' OR ("status" = \'leased\' AND '
+             '"lease_until" < CAST(strftime(\'%%s\', \'now\') AS INTEGER))) AND "attempts" < ? '
+             'ORDER BY "issue_date" LIMIT ?)' % (FRONTIER_TABLE, FRONTIER_TABLE),
+             (lease_id, self.worker, self.lease_seconds, spider, self.max_attempts, count)),
+            ('UPDATE "%s" SET "status" = \'failed\', "update_time" = datetime(\'now\', \'localtime\') '
+             'WHERE "spider" = ? AND "status" = \'leased\' AND '
+             '"lease_until" < CAST(strftime(\'%%s\', \'now\') AS INTEGER) AND "attempts" >= ?' % FRONTIER_TABLE,
+             (spider, self.max_attempts)),
+        ])
+        with self.lock:
+            rows = self.conn.execute('SELECT "issue_date" FROM "%s" WHERE "lease_id" = ? ORDER BY "issue_date"' % (
+                FRONTIER_TABLE), (lease_id,)).fetchall()
+        return lease_id, [row[0] for row in rows]
+
+    def renew(self, lease_id):
+        return self.transaction([
+            ('UPDATE "%s" SET "lease_until" = CAST(strftime(\'%%s\', \'now\') AS INTEGER) + ? '
+             'WHERE "lease_id" = ? AND "status" = \'leased\'' % FRONTIER_TABLE, (self.lease_seconds, lease_id))])[0]
+
+    def done(self, lease_id):
+        return self.transaction([
+            ('UPDATE "%s" SET "status" = \'done\', "update_time" = datetime(\'now\', \'localtime\') '
+             'WHERE "lease_id" = ? AND "status" = \'leased\'' % FRONTIER_TABLE, (lease_id,))])[0]
+
+    def release(self, lease_id):
+        return self.transaction([
+            ('UPDATE "%s" SET "status" = \'pending\', "lease_until" = 0, "attempts" = "attempts" - 1, '
+             '"update_time" = datetime(\'now\', \'localtime\') WHERE "lease_id" = ? AND "status" = \'leased\'' % (
+                 FRONTIER_TABLE), (lease_id,))])[0]
+
+    def get_status(self, spiders=None):
+        sql = 'SELECT "spider", "status", COUNT(*) FROM "%s"' % FRONTIER_TABLE
+        param = ()
+        if spiders:
+            sql += ' WHERE "spider" IN (%s)' % ', '.join(['?'] * len(spiders))
+            param = tuple(spiders)
+        with self.lock:
+            return [tuple(row) for row in self.conn.execute(
+                sql + ' GROUP BY "spider", "status" ORDER BY "spider", "status"', param)]
+
+    def reset(self, spider, status=None):
+        sql = 'UPDATE "%s" SET "status" = \'pending\', "lease_id" = NULL, "lease_until" = 0, "attempts" = 0, ' \
+              '"update_time" = datetime(\'now\', \'localtime\') WHERE "spider" = ?' % FRONTIER_TABLE
+        param = (spider,)
+        if status:
+            sql += ' AND "status" = ?'
+            param += (status,)
+        return self.transaction([(sql, param)])[0]
+
+
+FRONTIERS = {
+    MysqlFrontier.name: MysqlFrontier,
+    SqliteFrontier.name: SqliteFrontier,
+}
+
+
+def get_frontier(settings, name=None, open_frontier=True):
+    """
+    :param name: 'mysql'/'sqlite'，缺省为 EPAPER_FRONTIER
+    :param open_frontier: 是否打开(建表)，爬虫在线程中打开，不阻塞 reactor
+    :return: Frontier，未启用时为 None
+    """
+    name = name or settings.get('EPAPER_FRONTIER')
+    if not name:
+        return None
+    if name not in FRONTIERS:
+        raise ValueError('EPAPER_FRONTIER 错误: %s' % name)
+    if name == MysqlFrontier.name:
+        Mysql.initPool(settings=settings)
+    frontier = FRONTIERS[name].from_settings(settings)
+    if open_frontier:
+        frontier.open()
+    return frontier
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+    from .schema import get_spiders
+    from .spiders.ePaper import create_assist_date
+    from .utils import format_date
+    parser = argparse.ArgumentParser(description='多机共享的爬取队列')
+    parser.add_argument('command', choices=('status', 'seed', 'reset'),
+                        help='status: 各状态的日期数; seed: 预先加入日期; reset: 日期恢复为等待租用')
+    parser.add_argument('spiders', nargs='*', help='爬虫名称')
+    parser.add_argument('--frontier', help="'mysql'/'sqlite'，缺省为 EPAPER_FRONTIER")
+    parser.add_argument('--status', help='reset 时只重置指定状态的日期，如 failed')
+    parser.add_argument('--start-date', help='seed 的开始日期，缺省为爬虫的 start_date')
+    parser.add_argument('--end-date', help='seed 的结束日期，缺省为爬虫的 end_date')
+    args = parser.parse_args(argv)
+    frontier = get_frontier(get_project_settings(), args.frontier)
+    if frontier is None:
+        parser.error('请使用 --frontier 或 EPAPER_FRONTIER 指定队列')
+    try:
+        if args.command == 'status':
+            for spider, status, count in frontier.get_status(args.spiders):
+                print('%s\t%s\t%s' % (spider, status, count))
+        elif args.command == 'seed':
+            for spidercls in get_spiders(args.spiders):
+                dates = create_assist_date(format_date(args.start_date or spidercls.start_date) or None,
+                                           format_date(args.end_date or spidercls.end_date) or None, sep=('-', '-'))
+                print('%s: 加入 %s 个日期' % (spidercls.name, frontier.seed(spidercls.name, dates)))
+        else:
+            if not args.spiders:
+                parser.error('reset 需要指定爬虫名称')
+            for name in args.spiders:
+                print('%s: 重置 %s 个日期' % (name, frontier.reset(name, args.status)))
+    finally:
+        frontier.close()
+
+
+if __name__ == '__main__':
+    main()
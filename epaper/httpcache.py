@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# 按报纸日期缓存目录页和版面页
+# 往期报纸不会再变化，重新运行爬虫(如修改了文章页的解析规则)时不需要再次下载每一天的 node_*.htm/nbs.*.htm；
+# 链接中的日期早于 EPAPER_HTTPCACHE_IMMUTABLE_DAYS 天的页面缓存后一直有效，较新的页面缓存 EPAPER_HTTPCACHE_RECENT_TTL 秒，
+# 链接中没有日期的页面按较新的页面处理；文章页(回调为 EPAPER_SEEN_CALLBACKS)默认不缓存
+# 缓存按爬虫保存在 HTTPCACHE_DIR 下的 SQLite 文件中，以请求指纹(包括请求方法)为键，页面内容使用 zstd(未安装时 zlib)压缩
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+from .compress import import_zstd
+
+logger = logging.getLogger(__name__)
+
+# 链接中的日期: 2019-01/04、20190104、2019/01/04、2019_01_04 等
+DATE_PATTERN = re.compile(r'(?<!\d)((?:19|20)\d{2})[-/_]?(0[1-9]|1[0-2])[-/_]?(0[1-9]|[12]\d|3[01])(?!\d)')
+# 缓存时间，由 SqliteCacheStorage 写入读出的响应
+CACHE_TIME_HEADER = 'X-Epaper-Cache-Time'
+
+
+def get_issue_date(url):
+    """
+    :return: 链接中的报纸日期 datetime.date，没有时为 None
+    """
+    for match in DATE_PATTERN.finditer(url):
+        try:
+            return datetime.date(*(int(part) for part in match.groups()))
+        except ValueError:
+            continue
+    return None
+
+
+class IssueCachePolicy(object):
+    """
+    HTTPCACHE_POLICY: 只缓存 200 且不是空白页面的响应，按链接中的日期判断缓存是否有效
+    """
+
+    def __init__(self, settings):
+        self.immutable_days = settings.getint('EPAPER_HTTPCACHE_IMMUTABLE_DAYS', 7)
+        self.recent_ttl = settings.getint('EPAPER_HTTPCACHE_RECENT_TTL', 3600)
+        self.min_bytes = settings.getint('EPAPER_THROTTLE_EMPTY_BYTES', 200)
+        self.ignore_schemes = settings.getlist('HTTPCACHE_IGNORE_SCHEMES')
+        self.skip_callbacks = set() if settings.getbool('EPAPER_HTTPCACHE_ARTICLES', False) else set(
+            settings.getlist('EPAPER_SEEN_CALLBACKS', ['parse_content', 'parse_cotent']))
+
+    def should_cache_request(self, request):
+        if request.url.split(':', 1)[0] in self.ignore_schemes:
+            return False
+        return getattr(request.callback, '__name__', None) not in self.skip_callbacks
+
+    def should_cache_response(self, response, request):
+        return response.status == 200 and len(response.body) >= self.min_bytes
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        issue_date = get_issue_date(request.url)
+        if issue_date is not None and (datetime.date.today() - issue_date).days >= self.immutable_days:
+            return True
+        cache_time = cachedresponse.headers.get(CACHE_TIME_HEADER)
+        return cache_time is not None and time.time() - float(cache_time) < self.recent_ttl
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        return False
+
+
+class SqliteCacheStorage(object):
+    """
+    HTTPCACHE_STORAGE: 每个爬虫一个 SQLite 文件，以请求指纹为键(同一链接的 HEAD 和 GET 请求分开缓存)
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.level = settings.getint('EPAPER_HTTPCACHE_LEVEL', 3)
+        self.conn = None
+        self.lock = threading.Lock()
+        self.fingerprinter = None
+        try:
+            self.impl, self.zstd = import_zstd()
+        except ValueError:
+            self.impl, self.zstd = None, None
+
+    def open_spider(self, spider):
+        self.fingerprinter = get_fingerprinter(getattr(spider, 'crawler', None))
+        path = os.path.join(self.cachedir, '%s.sqlite3' % spider.name)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # url_hash 为请求指纹(早期版本为链接的 sha1，这些记录不再命中)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "pages" ('
+                          '"url_hash" TEXT PRIMARY KEY, '
+                          '"url" TEXT NOT NULL, '
+                          '"status" INTEGER NOT NULL, '
+                          '"headers" TEXT NOT NULL, '
+                          '"body" BLOB NOT NULL, '
+                          '"codec" TEXT NOT NULL, '
+                          '"cache_time" REAL NOT NULL)')
+        logger.debug('HTTP 缓存: %s', path)
+
+    def close_spider(self, spider):
+        if self.conn is None:
+            return
+        with self.lock:
+            self.conn.close()
+            self.conn = None
+
+    def compress(self, body):
+        if self.impl == 'zstandard':
+            return 'zstd', self.zstd.ZstdCompressor(level=self.level).compress(body)
+        if self.impl is not None:
+            return 'zstd', self.zstd.compress(body, self.level)
+        return 'zlib', zlib.compress(body, 6)
+
+    def decompress(self, codec, body):
+        if codec == 'zlib':
+            return zlib.decompress(body)
+        if self.zstd is None:
+            self.impl, self.zstd = import_zstd()
+        if self.impl == 'zstandard':
+            return self.zstd.ZstdDecompressor().decompress(body)
+        return self.zstd.decompress(body)
+
+    def retrieve_response(self, spider, request):
+        with self.lock:
+            row = self.conn.execute('SELECT "url", "status", "headers", "body", "codec", "cache_time" FROM "pages" '
+                                    'WHERE "url_hash" = ?', (self.fingerprinter(request),)).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, codec, cache_time = row
+        body = self.decompress(codec, body)
+        headers = Headers(json.loads(headers))
+        headers[CACHE_TIME_HEADER] = str(cache_time)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        codec, body = self.compress(response.body)
+        headers = dict((key.decode('latin1'), [value.decode('latin1') for value in values])
+                       for key, values in response.headers.items())
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO "pages" ("url_hash", "url", "status", "headers", "body", '
+                                  '"codec", "cache_time") VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (self.fingerprinter(request), response.url, response.status,
+                                   json.dumps(headers), body, codec, time.time()))
+
+
+def get_fingerprinter(crawler):
+    """
+    :return: 计算请求指纹(十六进制)的函数，Scrapy 2.7 以前没有 crawler.request_fingerprinter
+    """
+    fingerprinter = getattr(crawler, 'request_fingerprinter', None)
+    if fingerprinter is not None:
+        return lambda request: fingerprinter.fingerprint(request).hex()
+    from scrapy.utils.request import request_fingerprint
+    return request_fingerprint
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# 出版日历: 记录每个报刊哪些日期出版、哪些日期没有出版
+# create_assist_date 生成每一天，周刊、月刊以及周末和节假日不出版的日报，每个不出版的日期都要请求一次 404、错误页面或跳转；
+# 日历按爬虫保存在 .scrapy/ 下的 EPAPER_CALENDAR_DIR 中，已知不出版的日期由 EpaperSpider.get_dates 直接跳过，
+# 未知的日期先用 HEAD 请求探测(见 middlewares.IssueCalendarMiddleware)，返回 404/410 的记为不出版，否则再下载起始页
+# 按星期统计出版规律: 样本足够且经常出版的星期几直接下载，从不出版的星期几只每隔 EPAPER_CALENDAR_RECHECK_WEEKS 周探测一次；
+# 星期几没有规律时(月刊、半月刊)再按每月的第几天统计，规律确定后不再逐日探测
+#
+# 使用：python -m epaper.issues show hqrw                  显示日历和每周的出版规律
+#       python -m epaper.issues import hqrw rmlt          从数据库表中已有的 send_time 导入出版日期
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+
+from scrapy.utils.project import data_path
+
+from .utils import locked_file, write_json
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d'
+WEEKDAYS = ('一', '二', '三', '四', '五', '六', '日')
+
+# 日期的处理方式
+FETCH = 'fetch'
+PROBE = 'probe'
+SKIP = 'skip'
+
+
+class IssueCalendar(object):
+    """
+    @summary: 一个报刊的出版日历 {日期: 是否出版}
+    """
+
+    def __init__(self, path, min_samples=4, recheck_weeks=4, on_ratio=0.5):
+        self.path = path
+        self.min_samples = min_samples
+        self.recheck_weeks = recheck_weeks
+        self.on_ratio = on_ratio
+        # 网站是否支持 HEAD 请求
+        self.head = True
+        self.dates = {}
+        # 本次运行新记录的日期，保存时合并到文件中
+        self.changes = {}
+        self.weekdays = None
+        self.monthdays = None
+        self.load()
+
+    @classmethod
+    def from_settings(cls, settings, name):
+        path = os.path.join(data_path(settings.get('EPAPER_CALENDAR_DIR') or 'calendar'), '%s.json' % name)
+        return cls(path, min_samples=settings.getint('EPAPER_CALENDAR_MIN_SAMPLES', 4),
+                   recheck_weeks=settings.getint('EPAPER_CALENDAR_RECHECK_WEEKS', 4))
+
+    def read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def load(self):
+        data = self.read()
+        self.head = data.get('head', True)
+        self.dates = dict((date, True) for date in data.get('issues', ()))
+        self.dates.update((date, False) for date in data.get('empty', ()))
+        self.dates.update(self.changes)
+        self.weekdays = None
+        self.monthdays = None
+
+    def save(self):
+        """
+        @summary: 与文件中的日历合并后保存(同一报刊的多个进程可以同时运行)
+        """
+        if not self.changes and self.head == self.read().get('head', True):
+            return
+        # 读取、合并和替换期间加锁，其他进程在这之间保存的日期不会丢失
+        with locked_file(self.path):
+            # 合并文件中的日期，是否支持 HEAD 请求以本次运行的结果为准
+            head = self.head
+            self.load()
+            self.head = head
+            data = {
+                'head': self.head,
+                'issues': sorted(date for date, issue in self.dates.items() if issue),
+                'empty': sorted(date for date, issue in self.dates.items() if not issue),
+            }
+            write_json(self.path, data)
+        logger.info('保存出版日历 %s: 新记录 %s 个日期', self.path, len(self.changes))
+        self.changes = {}
+
+    def get(self, date):
+        """
+        @return: True 出版，False 不出版，None 未知
+        """
+        return self.dates.get(date)
+
+    def add(self, date, issue):
+        if self.dates.get(date) == issue:
+            return
+        self.dates[date] = self.changes[date] = issue
+        self.weekdays = None
+        self.monthdays = None
+
+    def count(self, key, size):
+        """
+        @param key: 日期 -> 序号
+        @return: [(出版次数, 已知日期数)]
+        """
+        result = [[0, 0] for _ in range(size)]
+        for date, issue in self.dates.items():
+            counts = result[key(datetime.datetime.strptime(date, DATE_FORMAT))]
+            counts[0] += 1 if issue else 0
+            counts[1] += 1
+        return [tuple(counts) for counts in result]
+
+    def get_weekdays(self):
+        """
+        @return: [(出版次数, 已知日期数)]，按星期一到星期日
+        """
+        if self.weekdays is None:
+            self.weekdays = self.count(lambda day: day.weekday(), 7)
+        return self.weekdays
+
+    def get_monthdays(self):
+        """
+        @return: [(出版次数, 已知日期数)]，按每月的 1 日到 31 日
+        """
+        if self.monthdays is None:
+            self.monthdays = self.count(lambda day: day.day - 1, 31)
+        return self.monthdays
+
+    def plan(self, date):
+        """
+        @param date: 2019-01-04 格式的日期
+        @return: FETCH 直接下载起始页，PROBE 先用 HEAD 请求探测，SKIP 跳过
+        """
+        issue = self.dates.get(date)
+        if issue is not None:
+            return FETCH if issue else SKIP
+        day = datetime.datetime.strptime(date, DATE_FORMAT).date()
+        # 先按星期几，星期几的样本足够但没有规律时(月刊、半月刊)再按每月的第几天，都不能确定时探测
+        for issues, total in (self.get_weekdays()[day.weekday()], self.get_monthdays()[day.day - 1]):
+            if total < self.min_samples:
+                break
+            if issues == 0:
+                # 从不出版的日子每隔几周探测一次，出版规律改变时能够发现
+                if self.recheck_weeks > 0 and day.toordinal() // 7 % self.recheck_weeks:
+                    return SKIP
+                break
+            if issues >= total * self.on_ratio:
+                return FETCH
+        return PROBE if self.head else FETCH
+
+    def filter_dates(self, dates):
+        """
+        @param dates: 2019-01-04 格式的日期列表
+        @return: (要爬取的日期, 跳过的日期数)
+        """
+        result = [date for date in dates if self.plan(date) != SKIP]
+        return result, len(dates) - len(result)
+
+
+def import_dates(name, calendar):
+    """
+    从数据库表中已有的 send_time 导入出版日期
+    :return: 导入的日期数
+    """
+    from .MysqlConn import Mysql
+    from .utils import format_date, get_table_name
+    mysql = Mysql()
+    try:
+        rows = mysql.getAll("SELECT DISTINCT `send_time` FROM `%s`" % get_table_name(name)) or []
+    finally:
+        mysql.dispose()
+    count = 0
+    for row in rows:
+        date = format_date(row['send_time'])
+        if date is not None:
+            calendar.add(date, True)
+            count += 1
+    return count
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+    parser = argparse.ArgumentParser(description='出版日历')
+    parser.add_argument('command', choices=('show', 'import'), help='show 显示日历，import 从数据库导入出版日期')
+    parser.add_argument('spiders', nargs='+', help='爬虫名称')
+    args = parser.parse_args(argv)
+    settings = get_project_settings()
+    if args.command == 'import':
+        from .MysqlConn import Mysql
+        Mysql.initPool(settings=settings)
+    for name in args.spiders:
+        calendar = IssueCalendar.from_settings(settings, name)
+        if args.command == 'import':
+            count = import_dates(name, calendar)
+            calendar.save()
+            print('%s: 导入 %s 个出版日期' % (name, count))
+        issues = sorted(date for date, issue in calendar.dates.items() if issue)
+        print('%s: 出版 %s 天，不出版 %s 天%s' % (name, len(issues), len(calendar.dates) - len(issues),
+                                           '，%s 至 %s' % (issues[0], issues[-1]) if issues else ''))
+        for weekday, (count, total) in zip(WEEKDAYS, calendar.get_weekdays()):
+            print('  星期%s: %s/%s' % (weekday, count, total))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,3 +18,5 @@ class EpaperItem(scrapy.Item):
     href = scrapy.Field()  # 链接
     send_time = scrapy.Field()  # 发布时间
     lable = scrapy.Field()  # 标签(北京晚报独有)
+    simhash = scrapy.Field()  # content 的 SimHash 指纹
+    dup_of = scrapy.Field()  # 重复文章的原文 href_hash
@@ -5,7 +5,24 @@
 # See documentation in:
 # https://doc.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import logging
+import os
+import time
+
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import TextResponse
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import threads
+
+from .MysqlConn import Mysql
+from .bloom import BloomFilter
+from .httpcache import get_issue_date
+from .issues import FETCH
+from .throttle import HostSlot
+from .utils import get_table_name
+
+logger = logging.getLogger(__name__)
 
 
 class EpaperSpiderMiddleware(object):
@@ -101,3 +118,310 @@ class EpaperDownloaderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class SeenUrlMiddleware(object):
+    """
+    跨运行的已爬取链接过滤: 爬虫启动时把数据库表中已有的 href 读入布隆过滤器(保存在 EPAPER_SEEN_DIR 下，
+    下次运行只读取新增的行)，回调为 parse_content 的请求在下载前丢弃
+    布隆过滤器有 EPAPER_SEEN_ERROR_RATE 的误判率，需要重新爬取时设置 EPAPER_SEEN_FILTER = False
+    """
+
+    def __init__(self, stats, path='spool/seen', capacity=2000000, error_rate=0.0001,
+                 callbacks=('parse_content', 'parse_cotent'), chunk=10000):
+        self.stats = stats
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.callbacks = set(callbacks)
+        self.chunk = chunk
+        self.bloom = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('EPAPER_SEEN_FILTER', False):
+            raise NotConfigured
+        # 链接从 MySQL 表中读取
+        if 'mysql' not in settings.getlist('EPAPER_BACKENDS', ['mysql']):
+            raise NotConfigured
+        Mysql.initPool(settings=settings)
+        s = cls(crawler.stats,
+                path=settings.get('EPAPER_SEEN_DIR', 'spool/seen'),
+                capacity=settings.getint('EPAPER_SEEN_CAPACITY', 2000000),
+                error_rate=settings.getfloat('EPAPER_SEEN_ERROR_RATE', 0.0001),
+                callbacks=settings.getlist('EPAPER_SEEN_CALLBACKS', ['parse_content', 'parse_cotent']))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        # 在线程中读取，读取完成后才开始调度请求
+        d = threads.deferToThread(self.load, get_table_name(spider.name))
+        d.addErrback(self.load_failed, spider)
+        return d
+
+    def load(self, table):
+        """
+        @summary: 读取表中 id 大于上次读取位置的 href；元素数超过容量时按两倍容量重建
+        """
+        start = time.time()
+        bloom = BloomFilter(os.path.join(self.path, '%s.bloom' % table), self.capacity, self.error_rate)
+        count = self.load_rows(bloom, table)
+        if bloom.full:
+            logger.info('%s 已有 %s 条链接，超过布隆过滤器容量 %s，重建', table, len(bloom), bloom.capacity)
+            bloom.capacity = len(bloom) * 2
+            bloom.clear()
+            count = self.load_rows(bloom, table)
+        bloom.sync()
+        self.bloom = bloom
+        logger.info('读取 %s 的已爬取链接: 新增 %s 条，共 %s 条，耗时 %.2f 秒', table, count, len(bloom), time.time() - start)
+        if self.stats is not None:
+            self.stats.set_value('epaper/seen_loaded', len(bloom))
+
+    def load_rows(self, bloom, table):
+        count = 0
+        while True:
+            mysql = Mysql()
+            try:
+                rows = mysql.getAll("SELECT `id`, `href` FROM `%s` WHERE `id` > %%s ORDER BY `id` LIMIT %d" % (
+                    table, self.chunk), (bloom.last_id,)) or []
+            finally:
+                mysql.dispose()
+            for row in rows:
+                if row['href']:
+                    bloom.add(row['href'])
+            count += len(rows)
+            if rows:
+                bloom.last_id = rows[-1]['id']
+            if len(rows) < self.chunk:
+                return count
+
+    def load_failed(self, failure, spider):
+        # 读取失败时不过滤
+        logger.warning('读取 %s 的已爬取链接失败，不过滤已爬取的文章: %s', spider.name, failure.value.args)
+
+    def process_request(self, request, spider):
+        if self.bloom is None:
+            return None
+        callback = getattr(request.callback, '__name__', None)
+        if callback in self.callbacks and request.url in self.bloom:
+            if self.stats is not None:
+                self.stats.inc_value('epaper/seen_filtered')
+            raise IgnoreRequest('已爬取: %s' % request.url)
+        return None
+
+    def spider_closed(self, spider):
+        if self.bloom is not None:
+            self.bloom.close()
+            self.bloom = None
+
+
+class HostBudgetMiddleware(object):
+    """
+    同一进程中所有爬虫共用的单站并发限制: 每个网站同时下载的请求数不超过 EPAPER_HOST_BUDGET
+    Scrapy 的 CONCURRENT_REQUESTS_PER_DOMAIN 只限制单个爬虫，一个进程运行多个爬虫(python -m epaper.runner)时，
+    paper.people.com.cn 下的十几个报刊共用这里的限制
+    EPAPER_THROTTLE_ENABLED = True 时每个网站的上限在 1 到 EPAPER_HOST_BUDGET 之间按响应情况自动调整(见 throttle.py)
+    需要放在最靠近下载器的位置，下载完成或失败时归还
+    """
+    # 进程内共用 {网站: HostSlot}
+    slots = {}
+    meta_key = 'epaper_host_budget'
+
+    def __init__(self, stats, budget, adaptive=False, start_limit=4, decrease=0.5, latency_target=5.0,
+                 cooldown=2.0, empty_bytes=200, backoff_codes=(403, 408, 429, 500, 502, 503, 504)):
+        self.stats = stats
+        self.budget = budget
+        self.adaptive = adaptive
+        self.start_limit = start_limit
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.empty_bytes = empty_bytes
+        self.backoff_codes = set(backoff_codes)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        budget = settings.getint('EPAPER_HOST_BUDGET', 0)
+        if budget <= 0:
+            raise NotConfigured
+        return cls(crawler.stats, budget,
+                   adaptive=settings.getbool('EPAPER_THROTTLE_ENABLED', False),
+                   start_limit=settings.getint('EPAPER_THROTTLE_START', 4),
+                   decrease=settings.getfloat('EPAPER_THROTTLE_DECREASE', 0.5),
+                   latency_target=settings.getfloat('EPAPER_THROTTLE_LATENCY',
+                                                    settings.getfloat('DOWNLOAD_TIMEOUT', 15) / 3.0),
+                   cooldown=settings.getfloat('EPAPER_THROTTLE_COOLDOWN', 2.0),
+                   empty_bytes=settings.getint('EPAPER_THROTTLE_EMPTY_BYTES', 200),
+                   backoff_codes=[int(code) for code in settings.getlist(
+                       'EPAPER_THROTTLE_BACKOFF_CODES', [403, 408, 429, 500, 502, 503, 504])])
+
+    def get_slot(self, host):
+        slot = self.slots.get(host)
+        if slot is None:
+            slot = self.slots[host] = HostSlot(host, self.budget, adaptive=self.adaptive,
+                                               start_limit=self.start_limit, decrease=self.decrease,
+                                               latency_target=self.latency_target, cooldown=self.cooldown)
+        return slot
+
+    def process_request(self, request, spider):
+        if self.meta_key in request.meta:
+            return None
+        host = urlparse_cached(request).hostname or ''
+        slot = self.get_slot(host)
+        request.meta[self.meta_key] = host
+        d = slot.acquire()
+        if d is None:
+            return None
+        # 等待其他请求下载完成
+        if self.stats is not None:
+            self.stats.inc_value('epaper/host_budget_waits')
+        d.addCallback(lambda _: None)
+        return d
+
+    def release(self, request):
+        """
+        @return: 请求所在网站的 HostSlot，未经过本中间件的请求(如缓存命中)为 None
+        """
+        host = request.meta.pop(self.meta_key, None)
+        if host is None:
+            return None
+        slot = self.slots[host]
+        slot.release()
+        return slot
+
+    def process_response(self, request, response, spider):
+        slot = self.release(request)
+        if slot is None:
+            return response
+        if response.status in self.backoff_codes:
+            self.backoff(slot, '状态码 %s' % response.status)
+        elif response.status == 200 and len(response.body) < self.empty_bytes and request.method != 'HEAD':
+            # 过载时部分网站返回空白页面(HEAD 请求没有内容，如出版日历的探测请求)
+            self.backoff(slot, '空白页面')
+        else:
+            slot.success(request.meta.get('download_latency'))
+        self.record(slot)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        slot = self.release(request)
+        if slot is not None and not isinstance(exception, IgnoreRequest):
+            self.backoff(slot, exception.__class__.__name__)
+            self.record(slot)
+        return None
+
+    def backoff(self, slot, reason):
+        if slot.backoff(reason) and self.stats is not None:
+            self.stats.inc_value('epaper/throttle/backoff')
+            self.stats.inc_value('epaper/throttle/%s/backoff' % slot.host)
+
+    def record(self, slot):
+        if self.stats is not None and slot.adaptive:
+            self.stats.set_value('epaper/throttle/%s/limit' % slot.host, int(slot.limit))
+            self.stats.max_value('epaper/throttle/%s/limit_max' % slot.host, int(slot.limit))
+            if slot.latency is not None:
+                self.stats.set_value('epaper/throttle/%s/latency' % slot.host, round(slot.latency, 3))
+
+
+class IssueCalendarMiddleware(object):
+    """
+    按出版日历(见 issues.py)处理起始页请求(没有指定回调的 GET 请求，链接中有日期):
+    日期未知且按出版规律不能确定时先发送 HEAD 请求，返回 404/410 的日期记为不出版并丢弃，其他情况再下载起始页；
+    下载的起始页返回 404/410(或爬虫的 no_issue_codes)、跳转到其他日期(或没有日期)的页面、
+    匹配爬虫的 no_issue_xpath(错误页面)时记为不出版，没有跳转的正常页面记为出版
+    爬虫的 calendar 为 None(EPAPER_CALENDAR_ENABLED = False)时不处理；需要放在 RedirectMiddleware 之前
+    """
+    empty_codes = (404, 410)
+    # 不支持 HEAD 请求时的状态码
+    no_head_codes = (405, 501)
+
+    def __init__(self, stats, empty_bytes=200):
+        self.stats = stats
+        self.empty_bytes = empty_bytes
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('EPAPER_CALENDAR_ENABLED', False):
+            raise NotConfigured
+        mw = cls(crawler.stats, settings.getint('EPAPER_THROTTLE_EMPTY_BYTES', 200))
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_request(self, request, spider):
+        calendar = getattr(spider, 'calendar', None)
+        if calendar is None or request.callback is not None or request.method != 'GET' or \
+                'issue_date' in request.meta:
+            return None
+        date = get_issue_date(request.url)
+        if date is None:
+            return None
+        request.meta['issue_date'] = date.strftime('%Y-%m-%d')
+        if calendar.get(request.meta['issue_date']) is False:
+            self.stats.inc_value('epaper/calendar_skipped')
+            raise IgnoreRequest('%s 没有出版' % request.meta['issue_date'])
+        # 运行中学到的规律判断为不出版(SKIP)的日期也已经生成了请求，用 HEAD 请求确认
+        if calendar.plan(request.meta['issue_date']) == FETCH:
+            return None
+        self.stats.inc_value('epaper/calendar_probes')
+        return Request(request.url, method='HEAD', dont_filter=True, priority=request.priority,
+                       meta={'issue_date': request.meta['issue_date'], 'calendar_request': request,
+                             'handle_httpstatus_all': True})
+
+    def check(self, request, response, spider, date):
+        """
+        @return: False 不出版，True 出版，None 无法判断
+        """
+        if response.status in self.empty_codes or response.status in getattr(spider, 'no_issue_codes', ()):
+            return False
+        if request.meta.get('redirect_urls'):
+            # 不出版的日期跳转到首页或当天的报纸；跳转到同一日期(如 https)的页面不记录
+            final = get_issue_date(response.url)
+            if final is None or final.strftime('%Y-%m-%d') != date:
+                return False
+            return None
+        if response.status != 200 or request.method != 'GET' or len(response.body) < self.empty_bytes:
+            return None
+        xpath = getattr(spider, 'no_issue_xpath', None)
+        if xpath and isinstance(response, TextResponse) and spider.selectors.extract(response, xpath):
+            return False
+        return True
+
+    def process_response(self, request, response, spider):
+        date = request.meta.get('issue_date')
+        calendar = getattr(spider, 'calendar', None)
+        if date is None or calendar is None:
+            return response
+        issue = self.check(request, response, spider, date)
+        original = request.meta.get('calendar_request')
+        if original is None:
+            if issue is not None:
+                self.record(calendar, date, issue)
+            return response
+        # HEAD 请求的响应
+        if issue is False:
+            self.record(calendar, date, False)
+            raise IgnoreRequest('%s 没有出版' % date)
+        if response.status in self.no_head_codes:
+            logger.info('%s 不支持 HEAD 请求，直接下载起始页', spider.name)
+            calendar.head = False
+        return original.replace(dont_filter=True)
+
+    def process_exception(self, request, exception, spider):
+        original = request.meta.get('calendar_request')
+        if original is None or isinstance(exception, IgnoreRequest):
+            return None
+        return original.replace(dont_filter=True)
+
+    def record(self, calendar, date, issue):
+        if calendar.get(date) != issue:
+            calendar.add(date, issue)
+            self.stats.inc_value('epaper/calendar_issues' if issue else 'epaper/calendar_empty')
+
+    def spider_closed(self, spider):
+        calendar = getattr(spider, 'calendar', None)
+        if calendar is not None:
+            calendar.save()
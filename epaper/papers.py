@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+# 报刊登记表
+# 页面结构为 起始页(当天第一版) -> 版面页(可省略) -> 文章页 的报刊不再单独写爬虫类，由 spiders/engine.py 中的
+# PaperSpider 按这里的记录生成；新增报刊只需增加一条记录
+#
+# 记录的字段:
+#   name                爬虫名称(同时决定表名)
+#   ctype               入库的 cType
+#   domains             allowed_domains，可省略
+#   start_date/end_date 默认的日期范围
+#   epochs              网站的布局时期，按时间先后排列，每个时期包括:
+#       since           该布局开始使用的日期，第一个时期可省略；改版日期不确定时省略，由 epochs.py 检测
+#       start_url       起始页链接，按 strftime 格式替换日期
+#       probe           检测时期时起始页必须匹配的 XPath，缺省为 layouts 和 articles
+#       layouts         起始页中版面链接的 XPath，省略时起始页直接列出文章
+#       articles        版面页(或起始页)中文章链接的 XPath
+#       title/content   文章页标题和正文的 XPath，正文的文字直接连接
+#   skip_titles         标题等于其中之一的文章不入库(导读、广告等)
+#   skip_words          标题包含其中之一的文章不入库
+#   skip_links          以其中之一结尾的版面/文章链接不请求(如版面的 PDF 下载链接)
+#   selectors           快速提取方式，见 extractors.py，可省略
+#   add_day             日期的间隔天数，缺省为 1
+#   no_issue_codes      不出版的日期返回的状态码(404/410 以外)，可省略
+#   no_issue_xpath      不出版的日期返回的错误页面中才有的 XPath，可省略
+#   其他字段(custom_settings、handle_httpstatus_list 等)作为爬虫类的属性
+from .extractors import RegexExtractor, SelectorRegistry, TextExtractor
+
+# 人民网报刊(paper.people.com.cn)文章页模板固定，标题和正文不解析 DOM，直接从源码中截取
+PEOPLE_SELECTORS = SelectorRegistry({
+    '//div[@class="text_c"]/h1/text()':
+        RegexExtractor(r'<div class="text_c">\s*(?:<h3>[^<]*</h3>\s*)?<h1>([^<]*)</h1>'),
+    '//div[@id="ozoom"]//p//text()': TextExtractor('<!--enpcontent-->', '<!--/enpcontent-->', tags=('p',)),
+})
+
+# 人民网报刊: 日报从第一版的版面导航进入各版面，周刊、月刊的起始页直接列出全部文章
+PEOPLE_ARTICLES = {
+    'articles': '//div[@id="titleList"]/ul/li/a/@href',
+    'title': '//div[@class="text_c"]/h1/text()',
+    'content': '//div[@id="ozoom"]//p//text()',
+}
+PEOPLE_PAGES = dict(PEOPLE_ARTICLES, layouts='//a[@id="pageLink"]/@href')
+
+# 深圳报业集团(sznews.com): 2018-03-22 起第一版的链接由 colA01.html 改为 node_A01.html
+SZNEWS_PAGES = {
+    'layouts': '//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href',
+    'articles': '//div[@class="newslist"]/ul/li/h3/a/@href',
+    'title': '//*[@id="ScroLeft"]/div[1]/h3/text()',
+    'content': '//*[@id="ScroLeft"]/div[2]/founder-content/p//text()',
+}
+
+# 今晚报社(epaper.jwb.com.cn)
+JWB_PAGES = {
+    'layouts': '//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href',
+    'articles': '//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href',
+    'title': '//p[@class="BSHARE_TEXT"]/text()',
+    'content': '//div[@id="ozoom"]//text()',
+}
+
+# 方正电子报的旧版模板(版面导航为 pageLink，文章链接为 content_*.htm)
+FOUNDER_PAGES = {
+    'layouts': '//td[@class="default"]/a[@id="pageLink"]/@href',
+    'articles': '//td[@class="default"]/a[starts-with(@href,"content_")]/@href',
+    'content': '//div[@id="ozoom"]//text()',
+}
+
+
+def people_paper(name, ctype, start_date, end_date, start_url, pages=True):
+    return {
+        'name': name,
+        'ctype': ctype,
+        'domains': ['paper.people.com.cn'],
+        'start_date': start_date,
+        'end_date': end_date,
+        'epochs': [dict(PEOPLE_PAGES if pages else PEOPLE_ARTICLES, start_url=start_url)],
+        'selectors': PEOPLE_SELECTORS,
+    }
+
+
+def sznews_paper(name, ctype, domain, start_date, end_date, host, page='A01'):
+    return {
+        'name': name,
+        'ctype': ctype,
+        'domains': [domain],
+        'start_date': start_date,
+        'end_date': end_date,
+        'epochs': [
+            dict(SZNEWS_PAGES, start_url='http://%s/PC/layout/%%Y%%m/%%d/col%s.html' % (host, page)),
+            dict(SZNEWS_PAGES, since='2018-03-22',
+                 start_url='http://%s/PC/layout/%%Y%%m/%%d/node_%s.html' % (host, page)),
+        ],
+        'skip_words': ['广告'],
+    }
+
+
+def jwb_paper(name, ctype, start_date, end_date):
+    return {
+        'name': name,
+        'ctype': ctype,
+        'domains': ['epaper.jwb.com.cn'],
+        'start_date': start_date,
+        'end_date': end_date,
+        'epochs': [dict(JWB_PAGES, start_url='http://epaper.jwb.com.cn/%s/html/%%Y-%%m/%%d/node_1.htm' % name)],
+    }
+
+
+PAPERS = [
+    # 经济日报
+    {
+        'name': 'jjrb',
+        'ctype': '经济日报',
+        'domains': ['paper.ce.cn'],
+        'start_date': '2008-01-27',
+        'end_date': '2019-02-24',
+        'epochs': [dict(FOUNDER_PAGES, start_url='http://paper.ce.cn/jjrb/html/%Y-%m/%d/node_2.htm',
+                        title='//td[@class="STYLE32"]//td[@class="font01"]/text()')],
+        # 特殊版面(广告、本报信息) 不处理
+        'skip_titles': ['广告', '本报信息'],
+        'handle_httpstatus_list': [404],
+    },
+    # 证券时报，网页布局改版过 3 次
+    # http://epaper.stcn.com/paper/zqsb/html/2008-05/14/node_2.htm 左侧栏
+    # http://epaper.stcn.com/paper/zqsb/html/2011-01/04/node_2.htm 弹窗(2012-02-07 起为点击跳转链接，XPath 相同)
+    # http://epaper.stcn.com/paper/zqsb/html/2016-07/22/node_2.htm 点击弹窗--更新版
+    {
+        'name': 'zqsb',
+        'ctype': '证券时报',
+        'domains': ['epaper.stcn.com'],
+        'start_date': '2008-05-14',
+        'end_date': '2019-02-24',
+        'epochs': [
+            dict(FOUNDER_PAGES, start_url='http://epaper.stcn.com/paper/zqsb/html/%Y-%m/%d/node_2.htm',
+                 title='//td[@class="font01"]/strong/text()'),
+            {
+                'since': '2011-01-04',
+                'start_url': 'http://epaper.stcn.com/paper/zqsb/html/%Y-%m/%d/node_2.htm',
+                'articles': '//div[@id="listWrap"]/div/ul/li/a/@href',
+                'title': '//*[@id="mainTiile"]/h2/text()',
+                'content': '//div[@id="mainCon"]/div/founder-content//text()',
+            },
+            {
+                'since': '2016-07-22',
+                'start_url': 'http://epaper.stcn.com/paper/zqsb/html/%Y-%m/%d/node_2.htm',
+                'articles': '//*[@id="webtree"]/dl/dd/ul/li/a/@href',
+                'title': '/html/body/div[1]/p/text()',
+                'content': '/html/body/div[2]/div/founder-content//text()',
+            },
+        ],
+        'skip_titles': ['导读', '今日导读', '特别提示', '今日公告导读'],
+        'custom_settings': {
+            'REDIRECT_ENABLED': False,
+        },
+    },
+    # 扬子晚报
+    {
+        'name': 'yzwb',
+        'ctype': '扬子晚报',
+        'domains': ['epaper.yzwb.net'],
+        'start_date': '2012-06-14',
+        'end_date': '2019-02-25',
+        'epochs': [{
+            'start_url': 'http://epaper.yzwb.net/html_t/%Y-%m/%d/node_1.htm',
+            'layouts': '//*[@id="navigation"]/ul/li/a/@href',
+            'articles': '//*[starts-with(@id,"mp")]/a/@href',
+            'title': '//td[@class="title1"]/text()',
+            'content': '//div[@id="ozoom"]//text()',
+        }],
+    },
+
+    # 人民网报刊
+    people_paper('rmrb_hw', '人民日报海外版', '2008-06-12', '2019-02-26',
+                 'http://paper.people.com.cn/rmrbhwb/html/%Y-%m/%d/node_865.htm'),
+    people_paper('gjjrb', '国际金融报', '2008-06-16', '2019-02-25',
+                 'http://paper.people.com.cn/gjjrb/html/%Y-%m/%d/node_645.htm'),
+    people_paper('zgnyb', '中国能源报', '2009-04-06', '2019-02-26',
+                 'http://paper.people.com.cn/zgnyb/html/%Y-%m/%d/node_2222.htm#'),
+    people_paper('jksb', '健康时报', '2008-06-16', '2019-02-26',
+                 'http://paper.people.com.cn/jksb/html/%Y-%m/%d/node_811.htm'),
+    people_paper('fcyym', '讽刺与幽默', '2012-03-09', '2019-02-26',
+                 'http://paper.people.com.cn/fcyym/html/%Y-%m/%d/node_841.htm'),
+    people_paper('zgcs', '中国城市报', '2015-02-02', '2019-02-26',
+                 'http://paper.people.com.cn/zgcsb/html/%Y-%m/%d/node_2591.htm'),
+    people_paper('xwzx', '新闻战线', '2007-12-02', '2019-02-26',
+                 'http://paper.people.com.cn/xwzx/html/%Y-%m/%d/node_922.htm', pages=False),
+    people_paper('hqrw', '环球人物', '2011-10-26', '2019-02-26',
+                 'http://paper.people.com.cn/hqrw/html/%Y-%m/%d/node_1122.htm', pages=False),
+    people_paper('rmlt', '人民论坛', '2018-03-11', '2019-02-26',
+                 'http://paper.people.com.cn/rmlt/html/%Y-%m/%d/node_1222.htm', pages=False),
+    people_paper('rmzk', '人民周刊', '2015-08-01', '2019-02-26',
+                 'http://paper.people.com.cn/rmzk/html/%Y-%m/%d/node_2651.htm', pages=False),
+    people_paper('zgjjzk', '中国经济周刊', '2009-01-05', '2019-02-26',
+                 'http://paper.people.com.cn/zgjjzk/html/%Y-%m/%d/node_1422.htm', pages=False),
+    people_paper('xaq', '新安全', '2012-01-02', '2019-02-26',
+                 'http://paper.people.com.cn/xaq/html/%Y-%m/%d/node_2262.htm', pages=False),
+    people_paper('mszk', '民生周刊', '2010-09-20', '2019-02-26',
+                 'http://paper.people.com.cn/mszk/html/%Y-%m/%d/node_1622.htm', pages=False),
+    people_paper('zgby', '中国报业', '2015-08-15', '2019-02-26',
+                 'http://paper.people.com.cn/zgby/html/%Y-%m/%d/node_2751.htm', pages=False),
+
+    # 深圳报业集团
+    sznews_paper('sztqb', '深圳特区报', 'sztqb.sznews.com', '2018-05-01', '2019-02-26', 'sztqb.sznews.com'),
+    sznews_paper('szsb', '深圳商报', 'szsb.sznews.com', '2017-05-01', '2019-02-26', 'szsb.sznews.com'),
+    sznews_paper('szwb', '深圳晚报', 'wb.sznews.com', '2017-05-02', '2019-02-27', 'wb.sznews.com'),
+    sznews_paper('jb', '晶报', 'wb.sznews.com', '2017-05-02', '2019-02-27', 'jb.sznews.com'),
+    sznews_paper('szjy', '深圳教育', 'szjy.sznews.com', '2016-06-02', '2019-02-27', 'szjy.sznews.com', page='01'),
+    dict(sznews_paper('barb', '宝安日报', 'barb.sznews.com', '2017-06-01', '2019-02-27', 'barb.sznews.com'),
+         skip_links=['.pdf']),
+
+    # 今晚报社
+    jwb_paper('jwb', '今晚报', '2015-06-08', '2019-02-28'),
+    jwb_paper('bhzb', '渤海早报', '2015-07-13', '2019-02-28'),
+    jwb_paper('jwjjzb', '今晚经济周刊', '2015-07-10', '2019-02-27'),
+    jwb_paper('zlnsb', '中老年时报', '2015-09-14', '2019-02-28'),
+    jwb_paper('zgjsscb', '中国技术市场报', '2015-08-21', '2019-02-28'),
+
+    # 南方日报，已知有 3 种网页布局，改版日期不确定(由 epochs.py 检测)
+    # 旧版: 版面导航 -> content_*.htm；过渡版: 版面导航 -> artPList1；
+    # 新版: http://epaper.southcn.com/nfdaily/html/2017-03/09/node_2.htm 起始页直接列出文章
+    {
+        'name': 'nfrb',
+        'ctype': '南方日报',
+        'domains': ['epaper.southcn.com'],
+        'start_date': '2007-12-01',
+        'end_date': '2019-02-27',
+        'epochs': [
+            dict(FOUNDER_PAGES, start_url='http://epaper.southcn.com/nfdaily/html/%Y-%m/%d/node_2.htm',
+                 layouts='//td[@class="default"]/a[@id="pageLink" or @id="pagelink"]/@href',
+                 title='//td[@class="font01"]/text()', content='//*[@id="ozoom"]//text()'),
+            {
+                'start_url': 'http://epaper.southcn.com/nfdaily/html/%Y-%m/%d/node_2.htm',
+                'layouts': '//td[@class="default"]/a[@id="pageLink" or @id="pagelink"]/@href',
+                'articles': '//*[@id="artPList1"]/li/a/@href',
+                'title': '//div[@id="print_area"]/h1/text()',
+                'content': '//*[@id="content"]//text()',
+            },
+            {
+                'start_url': 'http://epaper.southcn.com/nfdaily/html/%Y-%m/%d/node_2.htm',
+                'articles': '//*[@id="mCSB_4"]/div[1]/ul/li/div/a/@href',
+                'title': '//div[@id="print_area"]/h1/text()',
+                'content': '//*[@id="content"]//text()',
+            },
+        ],
+    },
+    # 成都商报，版面页改版过 1 次，改版日期不确定(由 epochs.py 检测)，文章页的 XPath 相同
+    {
+        'name': 'cdsb',
+        'ctype': '成都商报',
+        'start_date': '2012-05-01',
+        'end_date': '2019-02-28',
+        'add_day': 90,
+        'epochs': [
+            {
+                'start_url': 'http://e.chengdu.cn/html/%Y-%m/%d/node_2.htm',
+                'layouts': '//a[@id="pageLink"]/@href',
+                'articles': '//div[@class="sidebar-content"]/ul/li/a/@href',
+                'title': '//div[@class="content-title"]/h4/text()',
+                'content': '//td[@class="xilan_content_tt"]//text()',
+            },
+            {
+                'start_url': 'http://e.chengdu.cn/html/%Y-%m/%d/node_2.htm',
+                'layouts': '//a[@id="pageLink"]/@href',
+                'articles': '//*[@id="nowPageArticleList"]/li/a/@href',
+                'title': '//div[@class="content-title"]/h4/text()',
+                'content': '//td[@class="xilan_content_tt"]//text()',
+            },
+        ],
+    },
+    # 南方农村报
+    {
+        'name': 'nfnc',
+        'ctype': '南方农村报',
+        'start_date': '2017-05-18',
+        'end_date': '2019-02-28',
+        'epochs': [{
+            'start_url': 'http://epaper.nfncb.cn/nfnc/content/%Y%m%d/Page01TB.htm',
+            'articles': '//ul[@class="ul_1"]/li/a/@href',
+            'title': '//div[@class="news_title"]/h1/text()',
+            'content': '//div[@class="contenttext"]//text()',
+        }],
+    },
+    # 21世纪经济报
+    {
+        'name': 'sjjj',
+        'ctype': '21世纪经济报',
+        'start_date': '2014-09-02',
+        'end_date': '2019-02-28',
+        'epochs': [{
+            'start_url': 'http://epaper.21jingji.com/html/%Y-%m/%d/node_1.htm',
+            'articles': '//div[@class="news_list"]/ul/li/a/@href',
+            'title': '//h1[@class="news_title"]/text()',
+            'content': '//div[@id="news_text"]/p//text()',
+        }],
+    },
+]
+
+
+def get_paper(name):
+    """
+    :return: 名称为 name 的记录，没有时为 None
+    """
+    for paper in PAPERS:
+        if paper['name'] == name:
+            return paper
+    return None
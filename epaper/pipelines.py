@@ -4,27 +4,776 @@
 #
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://doc.scrapy.org/en/latest/topics/item-pipeline.html
-from .MysqlConn import Mysql
+import glob
+import logging
+import os
+import sqlite3
+import time
+
 import pymysql
 
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, reactor, task, threads
+from twisted.python.threadpool import ThreadPool
+
+from .MysqlConn import Mysql, PoolTimeoutError
+from .backends import MysqlBackend, get_backends
+from .frontier import lease_finishing
+from .simhash import SimHashIndex, get_family, load_index, simhash, to_hex
+from .spool import CircuitBreaker, WriteAheadSpool, get_wal_order, get_wal_pid, pid_alive
+from .utils import get_table_name, get_table_fields, get_hash, get_row, get_row_size, get_tsv_line, parse_tsv_line
+
+logger = logging.getLogger(__name__)
+
+# 服务器或客户端禁用 LOAD DATA LOCAL INFILE 时的错误码
+LOCAL_INFILE_ERRORS = (1148, 2068, 3948)
+
+# 存储不可用(连接失败、断开、超时、磁盘错误)时的异常，只有这些异常打开熔断器并转入 WAL 等待重放；
+# 其余异常(数据错误、违反约束、SQL 错误)重放也不会成功，这批数据写入死信文件
+TRANSIENT_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError, PoolTimeoutError,
+                    sqlite3.OperationalError, OSError)
+
+
+class WriteError(Exception):
+    """
+    一批数据写入部分或全部存储后端失败，errors 为 {后端名称: 异常}，其余后端已写入成功
+    """
+
+    def __init__(self, errors):
+        super(WriteError, self).__init__('; '.join('%s: %r' % item for item in sorted(errors.items())))
+        self.errors = errors
+        # 重放时为 (表名, 字段, 行, 读完后的进度, 写入的后端名称)
+        self.batch = None
+
 
 class EpaperPipeline(object):
-    def process_item(self, item, spider):
-        mysql = Mysql()
-        sql = ''
+    """
+    入库管道，数据库写操作全部在独立的写线程池中执行，不阻塞 Twisted reactor 线程
+    EPAPER_WRITE_MODE = 'single' : 每条数据单独插入并提交(默认)
+    EPAPER_WRITE_MODE = 'batch'  : 按表缓存数据，达到行数/字节数/时间阈值后批量写入
+    EPAPER_WRITE_MODE = 'load'   : 数据写入按表划分的 TSV 文件，每 EPAPER_LOAD_ROWS 行或 EPAPER_LOAD_INTERVAL 秒
+                                   使用 LOAD DATA LOCAL INFILE 导入一次；数据库禁用 local infile 时改为批量插入
+    EPAPER_WRITE_ACK = False : 不等待写入完成，process_item 直接返回(批量导入时使用，仍受高/低水位控制)
+    EPAPER_UPSERT = True : 以 href_hash 为唯一键去重入库，已存在的链接只在 content_hash 变化时更新
+    EPAPER_BACKENDS : 写入的存储后端(见 backends.py)，同一批数据依次写入每个后端，只有失败的后端转入 WAL 或死信文件
+    EPAPER_SPOOL_ENABLED = True : 写入失败或超过耗时预算的次数达到阈值时打开熔断器，数据改为追加到本地 WAL，
+                                  数据库恢复后按顺序分批重放；启动时先重放遗留的 WAL('load' 模式自身会保留导入失败的文件)；
+                                  数据本身导致的写入失败不打开熔断器，该批数据写入 WAL 目录下的死信文件 <表名>.dead.jsonl
+    待写入的行数超过 EPAPER_WRITE_HIGH_WATER 时暂停引擎调度新请求，降到 EPAPER_WRITE_LOW_WATER 以下时恢复
+    """
+
+    def __init__(self, crawler=None, write_mode='single', batch_rows=500, batch_bytes=1024000, batch_interval=5.0,
+                 writer_threads=4, high_water=5000, low_water=1000, upsert=False, write_ack=True,
+                 load_dir='spool/load', load_rows=50000, load_interval=60.0, backends=None,
+                 spool_enabled=True, spool_dir='spool/wal', spool_fsync=True, breaker_failures=3,
+                 breaker_reset=30.0, latency_budget=None, simhash=False):
+        self.crawler = crawler
+        self.backends = backends if backends is not None else [MysqlBackend(upsert=upsert)]
+        # 'load' 模式只能用于 MySQL，其余后端改为批量写入
+        if write_mode == 'load' and not self.get_mysql_backend():
+            logger.warning("EPAPER_BACKENDS 中没有 mysql，'load' 模式改为 'batch'")
+            write_mode = 'batch'
+        self.stats = crawler.stats if crawler is not None else None
+        self.write_mode = write_mode
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        self.batch_interval = batch_interval
+        self.writer_threads = writer_threads
+        self.upsert = upsert
+        # 写入 SimHashPipeline 计算的 simhash、dup_of 字段
+        self.simhash = simhash
+        self.write_ack = write_ack
+        self.load_dir = load_dir
+        self.load_rows = load_rows
+        self.load_interval = load_interval
+        # 数据库不允许 LOAD DATA LOCAL INFILE 时改为批量插入
+        self.load_disabled = False
+        # 导入文件 {(表名, 字段): {'file': 文件对象, 'path': 路径, 'rows': 行数, 'since': 首行时间}}
+        self.spools = {}
+        self.spool_seq = 0
+        # 预写日志和熔断器
+        self.spool_enabled = spool_enabled and write_mode != 'load'
+        self.spool_dir = spool_dir
+        self.spool_fsync = spool_fsync
+        self.wal = None
+        self.breaker = CircuitBreaker(failures=breaker_failures, reset_timeout=breaker_reset,
+                                      latency_budget=latency_budget)
+        self.replay_task = None
+        self.replaying = False
+        # 批量模式下缓存区本身就会积累 batch_rows 行，高水位不能低于它
+        if write_mode == 'batch':
+            high_water = max(high_water, batch_rows * 2)
+        self.high_water = high_water
+        self.low_water = min(low_water, high_water)
+        # 缓存区 {(表名, 字段): {'rows': [], 'bytes': 0, 'since': 首行时间}}
+        self.buffers = {}
+        self.flush_task = None
+        self.writer = None
+        # 待写入的行数(缓存区 + 写线程池队列中)
+        self.pending = 0
+        # 正在执行的写操作
+        self.inflight = set()
+        # 等待写入队列降到低水位的 process_item
+        self.waiters = []
+        self.paused = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(crawler=crawler,
+                       write_mode=settings.get('EPAPER_WRITE_MODE', 'single'),
+                       batch_rows=settings.getint('EPAPER_BATCH_ROWS', 500),
+                       batch_bytes=settings.getint('EPAPER_BATCH_BYTES', 1024000),
+                       batch_interval=settings.getfloat('EPAPER_BATCH_INTERVAL', 5.0),
+                       writer_threads=settings.getint('EPAPER_WRITER_THREADS', 4),
+                       high_water=settings.getint('EPAPER_WRITE_HIGH_WATER', 5000),
+                       low_water=settings.getint('EPAPER_WRITE_LOW_WATER', 1000),
+                       upsert=settings.getbool('EPAPER_UPSERT', False),
+                       write_ack=settings.getbool('EPAPER_WRITE_ACK', True),
+                       load_dir=settings.get('EPAPER_LOAD_DIR', 'spool/load'),
+                       load_rows=settings.getint('EPAPER_LOAD_ROWS', 50000),
+                       load_interval=settings.getfloat('EPAPER_LOAD_INTERVAL', 60.0),
+                       backends=get_backends(settings),
+                       spool_enabled=settings.getbool('EPAPER_SPOOL_ENABLED', True),
+                       spool_dir=settings.get('EPAPER_SPOOL_DIR', 'spool/wal'),
+                       spool_fsync=settings.getbool('EPAPER_SPOOL_FSYNC', True),
+                       breaker_failures=settings.getint('EPAPER_BREAKER_FAILURES', 3),
+                       breaker_reset=settings.getfloat('EPAPER_BREAKER_RESET', 30.0),
+                       latency_budget=settings.getfloat('EPAPER_WRITE_LATENCY_BUDGET', 0) or None,
+                       simhash=settings.getbool('EPAPER_SIMHASH_ENABLED', False))
+        crawler.signals.connect(pipeline.flush_all, signal=lease_finishing)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.writer = ThreadPool(minthreads=1, maxthreads=self.writer_threads, name='epaper-writer')
+        self.writer.start()
+        for backend in self.backends:
+            backend.open(spider)
+        if self.spool_enabled:
+            self.wal = WriteAheadSpool(self.spool_dir, fsync=self.spool_fsync)
+            count = self.wal.recover(self.get_key(spider)[0])
+            if count:
+                logger.info('发现 %s 个未重放的 WAL 文件，重放完成前新数据也写入 WAL', count)
+            self.replay_task = task.LoopingCall(self.replay)
+            self.replay_task.start(min(self.breaker.reset_timeout, 5.0), now=bool(count))
+        if self.write_mode not in ('batch', 'load'):
+            return None
+        # 后端的限制可能要查询数据库，在写线程中读取(不阻塞 reactor)，读取完成后才开始爬取
+        d = threads.deferToThreadPool(reactor, self.writer, self.get_max_bytes)
+        d.addCallback(self.set_max_bytes)
+        interval = self.batch_interval
+        if self.write_mode == 'load':
+            interval = self.load_interval
+            if not os.path.isdir(self.load_dir):
+                os.makedirs(self.load_dir)
+            # 上次运行未导入的文件；文件名中记录了写入的进程号，其他正在运行的进程(如分片)的文件由该进程自己导入
+            table, fields = self.get_key(spider)
+            for path in sorted(glob.glob(os.path.join(self.load_dir, '%s.*.tsv' % table)), key=get_wal_order):
+                if pid_alive(get_wal_pid(path)):
+                    continue
+                path = self.claim_file(path)
+                if path is not None:
+                    self.submit_load(table, fields, path, None)
+        # 定时刷新，避免低速爬取时数据长时间停留在缓存中
+        self.flush_task = task.LoopingCall(self.flush_expired)
+        self.flush_task.start(max(interval / 2.0, 0.5), now=False)
+        return d
+
+    def get_max_bytes(self):
+        """
+        @return: 各后端一批数据最大字节数中的最小值，都没有限制时为 None
+        """
+        sizes = [size for size in (backend.get_max_bytes() for backend in self.backends) if size]
+        return min(sizes) if sizes else None
+
+    def set_max_bytes(self, max_bytes):
+        if max_bytes:
+            self.batch_bytes = min(self.batch_bytes, max_bytes)
+
+    def claim_file(self, path):
+        """
+        @summary: 把已退出进程遗留的文件改名为当前进程号，多个进程同时启动时只有一个进程能导入
+        @return: 新路径，已被其他进程改名时为 None
+        """
+        parts = os.path.basename(path).split('.')
+        parts[-4] = str(os.getpid())
+        claimed = os.path.join(os.path.dirname(path), '.'.join(parts))
         try:
-            # BJSpider 新增一个特殊字段
-            if spider.name == 'BJSpider':
-                sql = "INSERT INTO `epaper_bj`( `title`, `href`, `cType`, `insert_time`, `content`,`send_time`,`lable`) VALUES('%s','%s','%s','%s','%s','%s','%s')" % (
-                    pymysql.escape_string(item['title']), item['href'], item['cType'], item['insert_time'], pymysql.escape_string(item['content']),
-                    item['send_time'], item['lable'])
+            os.rename(path, claimed)
+        except OSError:
+            return None
+        return claimed
+
+    def flush_all(self, spider=None):
+        """
+        @summary: 写入全部缓存区、导入全部 TSV 文件(共享队列把租用的日期标记为完成前调用)
+        @return: Deferred，当前所有写操作结束后触发(写入失败的数据已转入 WAL 或保留在导入文件中)
+        """
+        for key in list(self.buffers):
+            self.flush(key)
+        for key in list(self.spools):
+            self.load_spool(key)
+        return defer.DeferredList(list(self.inflight))
+
+    def close_spider(self, spider):
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+        if self.replay_task is not None and self.replay_task.running:
+            self.replay_task.stop()
+        d = self.flush_all(spider)
+        d.addBoth(self.drain)
+        d.addBoth(self.writer_closed)
+        return d
+
+    def drain(self, _=None):
+        """
+        @summary: 爬虫关闭时熔断器已关闭则重放剩余的 WAL，否则留到下次运行
+        """
+        if self.wal is None or not len(self.wal) or not self.breaker.closed:
+            return None
+        return self.replay()
+
+    def writer_closed(self, _):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        for backend in self.backends:
+            try:
+                backend.close()
+            except BaseException as e:
+                logger.error('关闭存储后端 %s 失败: %s', backend.name, e.args)
+        if self.wal is not None:
+            self.wal.close()
+            left = len(glob.glob(os.path.join(self.spool_dir, '*.wal')))
+            if left:
+                logger.warning('还有 %s 个 WAL 文件未重放，下次运行时先重放', left)
+        if self.stats is None:
+            return
+        if self.wal is not None:
+            self.stats.set_value('epaper/breaker_trips', self.breaker.trips)
+        if self.get_mysql_backend():
+            for name, value in Mysql.poolStats().items():
+                self.stats.set_value('epaper/pool/%s' % name, value)
+        for backend in self.backends:
+            rows = self.stats.get_value('epaper/backend/%s/rows' % backend.name, 0)
+            seconds = self.stats.get_value('epaper/backend/%s/seconds' % backend.name, 0)
+            if rows and seconds:
+                self.stats.set_value('epaper/backend/%s/rows_per_second' % backend.name, round(rows / seconds, 2))
+                logger.info('存储后端 %s: %s 行, 每秒 %.2f 行', backend.name, rows, rows / seconds)
+        commits = self.stats.get_value('epaper/flush_count', 0)
+        rows = self.stats.get_value('epaper/flush_rows', 0)
+        latency = self.stats.get_value('epaper/flush_latency_total', 0)
+        if commits:
+            self.stats.set_value('epaper/rows_per_commit', round(float(rows) / commits, 2))
+            self.stats.set_value('epaper/flush_latency_avg', round(float(latency) / commits, 4))
+            logger.info('入库: %s 次提交, %s 行, 平均每次 %.2f 行, 平均耗时 %.4f 秒',
+                        commits, rows, float(rows) / commits, float(latency) / commits)
+        for mode in ('load', 'load_fallback'):
+            rows = self.stats.get_value('epaper/%s_rows' % mode, 0)
+            seconds = self.stats.get_value('epaper/%s_seconds' % mode, 0)
+            if rows and seconds:
+                self.stats.set_value('epaper/%s_rows_per_second' % mode, round(rows / seconds, 2))
+                logger.info('%s: %s 行, 每秒 %.2f 行', 'LOAD DATA 导入' if mode == 'load' else '批量插入(不支持 local infile)',
+                            rows, rows / seconds)
+        if self.upsert:
+            logger.info('去重入库: 新增 %s 行, 更新 %s 行, 未变化 %s 行',
+                        self.stats.get_value('epaper/upsert_inserted', 0),
+                        self.stats.get_value('epaper/upsert_updated', 0),
+                        self.stats.get_value('epaper/upsert_unchanged', 0))
+
+    def process_item(self, item, spider):
+        if self.write_mode == 'batch':
+            self.buffer_item(item, spider)
+            return self.wait_writable(item)
+        if self.write_mode == 'load':
+            self.spool_item(item, spider)
+            return self.wait_writable(item)
+        table, fields = self.get_key(spider)
+        rows = [get_row(item, fields)]
+        if self.should_spool((table, fields)):
+            self.spool_rows(table, fields, rows)
+            return item
+        self.add_pending(1)
+        d = self.submit(1, self.write_rows, table, fields, rows)
+        d.addCallbacks(self.flushed, self.flush_failed, callbackArgs=(table, rows),
+                       errbackArgs=(table, fields, rows))
+        if not self.write_ack:
+            return self.wait_writable(item)
+        d.addCallback(lambda _: item)
+        return d
+
+    def submit(self, rows, func, *args):
+        """
+        @summary: 将写操作提交到写线程池，完成后从待写入行数中减去 rows
+        @return: Deferred
+        """
+        d = threads.deferToThreadPool(reactor, self.writer, func, *args)
+        self.inflight.add(d)
+        d.addBoth(self.written, d, rows)
+        return d
+
+    def written(self, result, d, rows):
+        self.inflight.discard(d)
+        self.add_pending(-rows)
+        return result
+
+    def add_pending(self, rows):
+        """
+        @summary: 更新待写入行数，并按高/低水位暂停或恢复引擎调度
+        """
+        self.pending += rows
+        if self.stats is not None and rows > 0:
+            self.stats.max_value('epaper/write_pending_max', self.pending)
+        engine = getattr(self.crawler, 'engine', None)
+        if not self.paused and self.pending >= self.high_water:
+            self.paused = True
+            if engine is not None:
+                engine.pause()
+            if self.stats is not None:
+                self.stats.inc_value('epaper/write_backpressure_count')
+            logger.info('待写入 %s 行，超过高水位 %s，暂停调度新请求', self.pending, self.high_water)
+        elif self.paused and self.pending <= self.low_water:
+            self.paused = False
+            if engine is not None:
+                engine.unpause()
+            logger.info('待写入 %s 行，降到低水位 %s，恢复调度新请求', self.pending, self.low_water)
+            waiters, self.waiters = self.waiters, []
+            for waiter, item in waiters:
+                waiter.callback(item)
+
+    def wait_writable(self, item):
+        """
+        @summary: 未超过高水位时直接返回，否则等待写入队列降到低水位
+        """
+        if not self.paused:
+            return defer.succeed(item)
+        d = defer.Deferred()
+        self.waiters.append((d, item))
+        return d
+
+    def get_mysql_backend(self):
+        for backend in self.backends:
+            if isinstance(backend, MysqlBackend):
+                return backend
+        return None
+
+    def get_key(self, spider):
+        """
+        @summary: 爬虫对应的(表名, 字段)
+        """
+        return get_table_name(spider.name), get_table_fields(spider.name, with_hash=self.upsert,
+                                                             with_simhash=self.simhash)
+
+    def buffer_item(self, item, spider):
+        """
+        @summary: 将数据放入对应表的缓存区，达到行数或字节数阈值时刷新
+        """
+        key = self.get_key(spider)
+        row = get_row(item, key[1])
+        size = get_row_size(row)
+        buf = self.buffers.get(key)
+        # 加入该行后超过字节数阈值，先刷新已有的数据
+        if buf is not None and buf['rows'] and buf['bytes'] + size > self.batch_bytes:
+            self.flush(key)
+            buf = None
+        if buf is None:
+            buf = self.buffers.setdefault(key, {'rows': [], 'bytes': 0, 'since': time.time()})
+        buf['rows'].append(row)
+        buf['bytes'] += size
+        self.add_pending(1)
+        if len(buf['rows']) >= self.batch_rows:
+            self.flush(key)
+
+    def flush_expired(self):
+        """
+        @summary: 刷新超过时间阈值的缓存区
+        """
+        now = time.time()
+        for key, buf in list(self.buffers.items()):
+            if buf['rows'] and now - buf['since'] >= self.batch_interval:
+                self.flush(key)
+        for key, spool in list(self.spools.items()):
+            if now - spool['since'] >= self.load_interval:
+                self.load_spool(key)
+
+    def flush(self, key):
+        """
+        @summary: 将缓存区的数据交给写线程池批量插入(缓存区的行已计入待写入行数)
+        """
+        buf = self.buffers.pop(key, None)
+        if not buf or not buf['rows']:
+            return
+        table, fields = key
+        rows = buf['rows']
+        if self.should_spool(key):
+            self.add_pending(-len(rows))
+            self.spool_rows(table, fields, rows)
+            return
+        d = self.submit(len(rows), self.write_rows, table, fields, rows)
+        d.addCallbacks(self.flushed, self.flush_failed, callbackArgs=(table, rows),
+                       errbackArgs=(table, fields, rows))
+
+    def spool_item(self, item, spider):
+        """
+        @summary: 将数据追加到对应表的 TSV 文件，达到行数阈值时导入
+        """
+        key = self.get_key(spider)
+        spool = self.spools.get(key)
+        if spool is None:
+            self.spool_seq += 1
+            # 写入过程中使用 .part 后缀，关闭后再改名，避免被其他进程当作遗留文件导入
+            path = os.path.join(self.load_dir, '%s.%d.%d.%d.tsv.part' % (key[0], os.getpid(), int(time.time()), self.spool_seq))
+            spool = {'file': open(path, 'w', encoding='utf-8', newline='\n'), 'path': path, 'rows': 0, 'since': time.time()}
+            self.spools[key] = spool
+        spool['file'].write(get_tsv_line(get_row(item, key[1])))
+        spool['rows'] += 1
+        if spool['rows'] >= self.load_rows:
+            self.load_spool(key)
+
+    def load_spool(self, key):
+        """
+        @summary: 关闭 TSV 文件并交给写线程池导入
+        """
+        spool = self.spools.pop(key, None)
+        if spool is None:
+            return
+        spool['file'].close()
+        path = spool['path'][:-len('.part')]
+        os.rename(spool['path'], path)
+        self.submit_load(key[0], key[1], path, spool['rows'])
+
+    def submit_load(self, table, fields, path, rows):
+        """
+        @summary: 将导入文件的操作提交到写线程池
+        @param rows: 文件行数，未知时为 None(上次运行遗留的文件)
+        """
+        rows = rows or 0
+        self.add_pending(rows)
+        d = self.submit(rows, self.load_file, table, fields, path)
+        d.addCallbacks(self.loaded, self.load_failed, callbackArgs=(table, path), errbackArgs=(table, path))
+
+    def load_file(self, table, fields, path):
+        """
+        @summary: 导入 TSV 文件(在写线程池中执行)，数据库禁用 local infile 时逐批读出文件插入
+        @return: dict {mode: load/load_fallback, rows: 行数, seconds: 耗时(秒)}
+        """
+        start = time.time()
+        mysql_backend = self.get_mysql_backend()
+        # 其余后端逐批读出文件写入
+        backends = [backend for backend in self.backends if backend is not mysql_backend]
+        if not self.load_disabled:
+            try:
+                count = mysql_backend.load_file(table, fields, path)
+            except pymysql.err.MySQLError as e:
+                if not e.args or e.args[0] not in LOCAL_INFILE_ERRORS:
+                    raise
+                self.load_disabled = True
+                logger.warning('数据库不支持 LOAD DATA LOCAL INFILE(%s)，改为批量插入', e.args)
             else:
-                sql = "INSERT INTO `epaper_%s`( `title`, `href`, `cType`, `insert_time`, `content`,`send_time`) VALUES('%s','%s','%s','%s','%s','%s')" % (
-                    spider.name, pymysql.escape_string(item['title']), item['href'], item['cType'], item['insert_time'], pymysql.escape_string(item['content']),
-                    item['send_time'])
-            mysql.insertOne(sql)
-        except BaseException as e:
-            print(e.args)
-            print(sql)
-        mysql.dispose()
+                seconds = time.time() - start
+                if backends:
+                    self.write_file(table, fields, path, backends)
+                os.remove(path)
+                return {'mode': 'load', 'rows': count, 'seconds': seconds}
+        count = self.write_file(table, fields, path, self.backends)
+        os.remove(path)
+        return {'mode': 'load_fallback', 'rows': count, 'seconds': time.time() - start}
+
+    def write_file(self, table, fields, path, backends):
+        """
+        @summary: 逐批读出 TSV 文件写入指定的后端
+        @return: 行数
+        """
+        count = 0
+        rows = []
+        size = 0
+        with open(path, 'r', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                row = parse_tsv_line(line)
+                rows.append(row)
+                size += get_row_size(row)
+                if len(rows) >= self.batch_rows or size >= self.batch_bytes:
+                    self.write_rows(table, fields, rows, backends)
+                    count += len(rows)
+                    rows, size = [], 0
+        if rows:
+            self.write_rows(table, fields, rows, backends)
+            count += len(rows)
+        return count
+
+    def loaded(self, result, table, path):
+        if self.stats is not None:
+            self.stats.inc_value('epaper/%s_rows' % result['mode'], result['rows'])
+            self.stats.inc_value('epaper/%s_seconds' % result['mode'], result['seconds'])
+            self.stats.inc_value('epaper/%s_files' % result['mode'])
+        logger.debug('导入 %s: %s 行, 耗时 %.4f 秒', path, result['rows'], result['seconds'])
+
+    def load_failed(self, failure, table, path):
+        # 导入失败的文件保留在目录中，下次运行时重新导入
+        logger.error('导入 %s 失败: %s', path, failure.value.args)
+        if self.stats is not None:
+            self.stats.inc_value('epaper/load_error_files')
+
+    def write_rows(self, table, fields, rows, backends=None):
+        """
+        @summary: 依次写入每个存储后端(在写线程池中执行)，新增/更新/未变化行数以第一个后端为准
+        一个后端失败时继续写入其余后端，全部写完后抛出 WriteError，只有失败的后端需要重试
+        @return: dict {latency: 耗时(秒), inserted: 新增行数, updated: 更新行数, unchanged: 未变化行数,
+                       backends: {后端名称: 耗时(秒)}}
+        """
+        start = time.time()
+        result = None
+        seconds = {}
+        errors = {}
+        for backend in backends or self.backends:
+            backend_start = time.time()
+            try:
+                counts = backend.write(table, fields, rows, max_bytes=self.batch_bytes)
+            except Exception as e:
+                errors[backend.name] = e
+                continue
+            seconds[backend.name] = time.time() - backend_start
+            if result is None:
+                result = counts
+        if errors:
+            raise WriteError(errors)
+        result['latency'] = time.time() - start
+        result['backends'] = seconds
+        return result
+
+    def flushed(self, result, table, rows):
+        latency = result['latency']
+        self.breaker.success(latency)
+        if self.stats is not None:
+            self.stats.inc_value('epaper/flush_count')
+            self.stats.inc_value('epaper/flush_rows', len(rows))
+            self.stats.inc_value('epaper/flush_latency_total', latency)
+            self.stats.max_value('epaper/flush_latency_max', latency)
+            self.stats.max_value('epaper/flush_rows_max', len(rows))
+            for name, seconds in result['backends'].items():
+                self.stats.inc_value('epaper/backend/%s/rows' % name, len(rows))
+                self.stats.inc_value('epaper/backend/%s/seconds' % name, seconds)
+            if self.upsert:
+                for name in ('inserted', 'updated', 'unchanged'):
+                    self.stats.inc_value('epaper/upsert_%s' % name, result[name])
+        logger.debug('插入 %s: %s 行, 耗时 %.4f 秒', table, len(rows), latency)
+
+    def flush_failed(self, failure, table, fields, rows):
+        logger.error('插入 %s 失败(%s 行): %s', table, len(rows), failure.value.args)
+        if self.stats is not None:
+            self.stats.inc_value('epaper/flush_error_rows', len(rows))
+        if self.wal is None:
+            return
+        retry = self.write_failed(table, fields, rows, failure.value.errors)
+        if retry:
+            self.breaker.failure()
+            # 写入失败的数据转入 WAL，不再丢失；已写入成功的后端不再重放
+            self.spool_rows(table, fields, rows, retry)
+
+    def write_failed(self, table, fields, rows, errors):
+        """
+        @summary: 数据错误导致失败的后端写入死信文件
+        @param errors: {后端名称: 异常}
+        @return: 存储不可用、需要稍后重试的后端名称(按 EPAPER_BACKENDS 的顺序)
+        """
+        retry = []
+        for name in [backend.name for backend in self.backends if backend.name in errors] + \
+                sorted(set(errors) - set(backend.name for backend in self.backends)):
+            if isinstance(errors[name], TRANSIENT_ERRORS):
+                retry.append(name)
+            else:
+                self.dead_letter(table, fields, rows, errors[name], name)
+        return retry
+
+    def should_spool(self, key):
+        """
+        @summary: 熔断器未关闭或该表还有未重放的 WAL 时，新数据写入 WAL
+        """
+        if self.wal is None:
+            return False
+        return not self.breaker.closed or self.wal.has_backlog(key)
+
+    def spool_rows(self, table, fields, rows, backends=None):
+        """
+        @param backends: 只需要重放到的后端名称，None 为所有后端
+        """
+        if backends is not None and len(backends) == len(self.backends):
+            backends = None
+        self.wal.append((table, fields), rows, backends)
+        if self.stats is not None:
+            self.stats.inc_value('epaper/spool_rows', len(rows))
+
+    def dead_letter(self, table, fields, rows, error, backend=None):
+        """
+        @summary: 数据错误导致写入失败的一批数据写入死信文件，不再重试
+        """
+        path = self.wal.dead_letter((table, fields), rows, error, backend)
+        logger.warning('%s 行数据写入 %s(%s)失败(%r)，已写入死信文件 %s', len(rows), table, backend, error, path)
+        if self.stats is not None:
+            self.stats.inc_value('epaper/dead_letter_rows', len(rows))
+
+    def replay(self):
+        """
+        @summary: 按写入顺序重放 WAL，每次一批，成功后继续下一批(熔断器打开时由半开状态的第一批试探)
+        @return: Deferred，没有需要重放的数据时为 None
+        """
+        if self.replaying or self.wal is None or not len(self.wal) or not self.breaker.can_probe():
+            return None
+        path = self.wal.next_file()
+        if path is None:
+            return None
+        self.replaying = True
+        d = self.submit(0, self.replay_batch, path)
+        d.addCallbacks(self.replayed, self.replay_failed, callbackArgs=(path,), errbackArgs=(path,))
+        return d
+
+    def replay_batch(self, path):
+        """
+        @summary: 从 WAL 读出一批数据写入文件头中记录的后端(在写线程池中执行)
+        @return: 与 write_rows 相同，文件已重放完时为 None；写入失败时抛出的 WriteError 带有这一批数据
+        """
+        table, fields, rows, offset, names = self.wal.read_batch(path, self.batch_rows)
+        if not rows:
+            return None
+        backends = self.backends
+        errors = {}
+        if names is not None:
+            backends = [backend for backend in self.backends if backend.name in names]
+            for name in set(names) - set(backend.name for backend in backends):
+                errors[name] = NotConfigured('EPAPER_BACKENDS 中已没有后端 %s' % name)
+        try:
+            result = self.write_rows(table, fields, rows, backends) if backends else None
+        except WriteError as e:
+            errors.update(e.errors)
+        if errors:
+            error = WriteError(errors)
+            error.batch = (table, fields, rows, offset, names)
+            raise error
+        self.wal.commit(path, offset)
+        result['rows'] = len(rows)
+        return result
+
+    def replayed(self, result, path):
+        self.replaying = False
+        if result is None:
+            self.wal.remove(path)
+            logger.info('WAL %s 重放完成', path)
+        else:
+            self.breaker.success(result['latency'])
+            if self.stats is not None:
+                self.stats.inc_value('epaper/spool_replayed_rows', result['rows'])
+        if not self.breaker.closed:
+            return None
+        return self.replay()
+
+    def replay_failed(self, failure, path):
+        self.replaying = False
+        logger.error('重放 WAL %s 失败: %s', path, failure.value.args)
+        batch = getattr(failure.value, 'batch', None)
+        if batch is None:
+            self.breaker.failure()
+            return None
+        table, fields, rows, offset, names = batch
+        retry = self.write_failed(table, fields, rows, failure.value.errors)
+        if retry and len(retry) == len(names or self.backends):
+            # 所有后端都不可用，保留进度，稍后重放这一批
+            self.breaker.failure()
+            return None
+        # 数据错误的后端已写入死信文件，不能让一行错误的数据阻塞该表之后的所有数据；
+        # 部分后端成功时只把失败的后端重新写入 WAL，避免重复写入已成功的后端
+        self.wal.commit(path, offset)
+        if retry:
+            self.breaker.failure()
+            self.spool_rows(table, fields, rows, retry)
+            return None
+        if not self.breaker.closed:
+            return None
+        return self.replay()
+
+
+class SimHashPipeline(object):
+    """
+    近似重复检测，需要在 EpaperPipeline 之前执行
+    EPAPER_SIMHASH_DOMAINS 下的报刊(缺省为 paper.people.com.cn)计算 content 的 SimHash 指纹，
+    与所有这些报刊已有的指纹比较，海明距离不超过 EPAPER_SIMHASH_DISTANCE 时视为重复:
+    EPAPER_SIMHASH_ACTION = 'tag'  : 在 dup_of 中记录原文的 href_hash 后照常入库(默认)
+    EPAPER_SIMHASH_ACTION = 'drop' : 丢弃重复的文章
+    索引在进程内共用，第一个爬虫启动时从数据库读取已有的指纹(python -m epaper.simhash rebuild 为已有数据计算指纹)
+    """
+    index = None
+    # 已读取指纹的表
+    loaded = set()
+
+    def __init__(self, stats=None, domains=('paper.people.com.cn',), action='tag', distance=3, load=True):
+        if action not in ('tag', 'drop'):
+            raise ValueError("EPAPER_SIMHASH_ACTION 只能是 'tag' 或 'drop': %r" % action)
+        self.stats = stats
+        self.domains = set(domains)
+        self.action = action
+        self.distance = distance
+        self.load = load
+        self.enabled = False
+        if SimHashPipeline.index is None or SimHashPipeline.index.distance != distance:
+            SimHashPipeline.index = SimHashIndex(distance=distance)
+            SimHashPipeline.loaded = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('EPAPER_SIMHASH_ENABLED', False):
+            raise NotConfigured
+        return cls(stats=crawler.stats,
+                   domains=settings.getlist('EPAPER_SIMHASH_DOMAINS', ['paper.people.com.cn']),
+                   action=settings.get('EPAPER_SIMHASH_ACTION', 'tag'),
+                   distance=settings.getint('EPAPER_SIMHASH_DISTANCE', 3),
+                   load='mysql' in settings.getlist('EPAPER_BACKENDS', ['mysql']))
+
+    def open_spider(self, spider):
+        self.enabled = bool(set(getattr(spider, 'allowed_domains', None) or ()) & self.domains)
+        if not self.enabled or not self.load:
+            return None
+        tables = [get_table_name(spidercls.name) for spidercls in get_family(self.domains)]
+        tables = [table for table in tables if table not in SimHashPipeline.loaded]
+        if not tables:
+            return None
+        SimHashPipeline.loaded.update(tables)
+        d = threads.deferToThread(self.load_index, tables)
+        d.addErrback(lambda failure: logger.warning('读取已有的 SimHash 指纹失败: %s', failure.value.args))
+        return d
+
+    def load_index(self, tables):
+        start = time.time()
+        count = load_index(SimHashPipeline.index, tables)
+        logger.info('读取 %s 个表的 SimHash 指纹 %s 条，耗时 %.2f 秒', len(tables), count, time.time() - start)
+
+    def process_item(self, item, spider):
+        if not self.enabled:
+            return item
+        start = time.time()
+        fingerprint = simhash(item.get('content'))
+        if fingerprint is None:
+            return item
+        item['simhash'] = to_hex(fingerprint)
+        href_hash = get_hash(item.get('href'))
+        match = SimHashPipeline.index.find(fingerprint)
+        if match is None:
+            SimHashPipeline.index.add(fingerprint, href_hash)
+        elif match[1] != href_hash:
+            item['dup_of'] = match[1]
+        if self.stats is not None:
+            self.stats.inc_value('epaper/simhash_seconds', time.time() - start)
+            self.stats.inc_value('epaper/simhash_items')
+        if item.get('dup_of'):
+            if self.stats is not None:
+                self.stats.inc_value('epaper/simhash_dups')
+            if self.action == 'drop':
+                raise DropItem('近似重复: %s 与 %s' % (item.get('href'), match[1]))
         return item
+
+    def close_spider(self, spider):
+        if self.stats is None or not self.stats.get_value('epaper/simhash_items'):
+            return
+        items = self.stats.get_value('epaper/simhash_items')
+        seconds = self.stats.get_value('epaper/simhash_seconds', 0)
+        logger.info('SimHash: %s 条, 重复 %s 条, 平均每条 %.2f 毫秒', items,
+                    self.stats.get_value('epaper/simhash_dups', 0), seconds * 1000.0 / items)
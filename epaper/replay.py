@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# 离线重新解析 WARC 文件中保存的响应
+# 每个 WARC 文件交给进程池中的一个进程，按记录中的回调(parse、parse_layout、parse_content 等)和 meta 调用爬虫，
+# 解析出的 item 回到主进程，经过与爬取时相同的 item pipeline 入库；回调产生的新请求不再下载
+# 解析在多个 CPU 核心上同时进行，不需要访问网站
+#
+# 使用：python -m epaper.replay nfrb                          EPAPER_WARC_DIR/nfrb/ 下的全部文件
+#       python -m epaper.replay nfrb data/warc/nfrb/a.warc.gz -j 8 -s EPAPER_WRITE_MODE=batch
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from scrapy import Request, Spider, signals
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from .warc import iter_records
+
+logger = logging.getLogger(__name__)
+
+# 工作进程中的爬虫对象 {爬虫名: 爬虫}
+_spiders = {}
+
+
+def get_spider(name):
+    spider = _spiders.get(name)
+    if spider is None:
+        from .schema import get_spiders
+        spiders = get_spiders([name])
+        if not spiders:
+            raise ValueError('爬虫不存在: %s' % name)
+        spider = _spiders[name] = spiders[0]()
+    return spider
+
+
+def replay_file(name, path):
+    """
+    在工作进程中解析一个 WARC 文件
+    :return: ([item], {records, requests, errors, skipped})
+    """
+    spider = get_spider(name)
+    items = []
+    counts = {'records': 0, 'requests': 0, 'errors': 0, 'skipped': 0}
+    for record in iter_records(path):
+        counts['records'] += 1
+        callback = getattr(spider, record['callback'], None)
+        if callback is None:
+            counts['skipped'] += 1
+            continue
+        request = Request(record['url'], callback=callback, meta=record['meta'], dont_filter=True)
+        headers = Headers(record['headers'])
+        respcls = responsetypes.from_args(headers=headers, url=record['url'], body=record['body'])
+        response = respcls(url=record['url'], status=record['status'], headers=headers, body=record['body'],
+                           request=request)
+        try:
+            for result in callback(response) or ():
+                if isinstance(result, Request):
+                    counts['requests'] += 1
+                elif result is not None:
+                    items.append(result)
+        except Exception as e:
+            counts['errors'] += 1
+            logger.error('解析 %s 失败: %s', record['url'], e)
+    return items, counts
+
+
+class ReplayMiddleware(object):
+    """
+    下载器中间件: meta 中有 replay_path 的请求不下载，交给进程池解析对应的 WARC 文件
+    """
+
+    def __init__(self, stats, workers):
+        self.stats = stats
+        self.workers = workers
+        self.pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mw = cls(crawler.stats, crawler.settings.getint('EPAPER_REPLAY_WORKERS', os.cpu_count() or 1))
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_request(self, request, spider):
+        path = request.meta.get('replay_path')
+        if path is None:
+            return None
+        from twisted.internet import reactor
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        d = defer.Deferred()
+        start = time.time()
+        self.pool.apply_async(replay_file, (spider.name, path),
+                              callback=lambda result: reactor.callFromThread(d.callback, result),
+                              error_callback=lambda e: reactor.callFromThread(d.errback, Failure(e)))
+
+        def parsed(result):
+            items, counts = result
+            for key, value in counts.items():
+                self.stats.inc_value('epaper/replay_%s' % key, value)
+            logger.info('%s: %s 条记录, %s 条数据, 耗时 %.1f 秒', os.path.basename(path), counts['records'],
+                        len(items), time.time() - start)
+            request.meta['replay_items'] = items
+            return Response(request.url, request=request)
+
+        d.addCallback(parsed)
+        return d
+
+    def spider_closed(self, spider):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class ReplaySpider(Spider):
+    """
+    主进程中的爬虫，name 与原爬虫相同(入库到同一张表)，每个 WARC 文件一个请求
+    """
+    name = None
+    paths = ()
+
+    def start_requests(self):
+        for path in self.paths:
+            yield Request('data:,', callback=self.parse_items, meta={'replay_path': path}, dont_filter=True)
+
+    def parse_items(self, response):
+        for item in response.meta.get('replay_items', ()):
+            yield item
+
+
+def get_paths(name, paths, warc_dir):
+    """
+    :return: WARC 文件列表，paths 为空时为 warc_dir/爬虫名/ 下的全部文件
+    """
+    result = []
+    for path in paths or [os.path.join(warc_dir, name)]:
+        if os.path.isdir(path):
+            result.extend(sorted(glob.glob(os.path.join(path, '*.warc.gz'))))
+        else:
+            result.append(path)
+    return result
+
+
+def main(argv=None):
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from .extensions import format_summary
+    from .runner import parse_pairs
+    parser = argparse.ArgumentParser(description='离线重新解析 WARC 文件')
+    parser.add_argument('spider', help='爬虫名称')
+    parser.add_argument('paths', nargs='*', help='WARC 文件或目录，缺省为 EPAPER_WARC_DIR/<爬虫名>/')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='解析进程数，缺省为 CPU 核数')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE', help='设置')
+    args = parser.parse_args(argv)
+    settings = get_project_settings()
+    paths = get_paths(args.spider, args.paths, settings.get('EPAPER_WARC_DIR', 'data/warc'))
+    if not paths:
+        parser.error('没有 WARC 文件')
+
+    # 不下载、不缓存、不再保存 WARC；重新解析的数据通常已存在，缺省按 href_hash 更新
+    settings.set('EPAPER_WARC_ENABLED', False, priority='cmdline')
+    settings.set('EPAPER_SEEN_FILTER', False, priority='cmdline')
+    settings.set('HTTPCACHE_ENABLED', False, priority='cmdline')
+    settings.set('EPAPER_UPSERT', True, priority='cmdline')
+    settings.set('EPAPER_REPLAY_WORKERS', args.workers, priority='cmdline')
+    settings.set('CONCURRENT_REQUESTS', args.workers * 2, priority='cmdline')
+    middlewares = dict(settings.getdict('DOWNLOADER_MIDDLEWARES'))
+    middlewares['epaper.replay.ReplayMiddleware'] = 1
+    settings.set('DOWNLOADER_MIDDLEWARES', middlewares, priority='cmdline')
+    for name, value in parse_pairs(args.set).items():
+        settings.set(name, value, priority='cmdline')
+
+    spidercls = type('ReplaySpider', (ReplaySpider,), {'name': args.spider})
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(spidercls)
+    start = time.time()
+    process.crawl(crawler, paths=paths)
+    process.start()
+    stats = dict(crawler.stats.get_stats())
+    stats['spider'] = args.spider
+    print(format_summary(stats, time.time() - start))
+    print('WARC 文件: %s, 记录: %s, 解析失败: %s' % (len(paths), stats.get('epaper/replay_records', 0),
+                                                stats.get('epaper/replay_errors', 0)))
+    return 0 if stats.get('finish_reason') == 'finished' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# 在一个进程(一个 CrawlerProcess)中同时运行多个爬虫
+# 所有爬虫共用数据库连接池和 HostBudgetMiddleware 的单站并发限制(EPAPER_HOST_BUDGET)，
+# 不需要为每个报刊启动一个 scrapy crawl 进程；全部结束后输出每个爬虫和合并的统计信息
+#
+# 使用：python -m epaper.runner                                  全部爬虫
+#       python -m epaper.runner nfrb cdsb                        指定爬虫
+#       python -m epaper.runner --domain paper.people.com.cn -a incremental=1 -s EPAPER_WRITE_MODE=batch
+import argparse
+import sys
+import time
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from .extensions import format_summary, merge_stats
+
+
+def parse_pairs(pairs):
+    """
+    :param pairs: ['NAME=VALUE', ...]
+    :return: dict
+    """
+    result = {}
+    for pair in pairs:
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError('格式应为 NAME=VALUE: %s' % pair)
+        result[name] = value
+    return result
+
+
+def run(spiders, spider_kwargs=None, settings=None):
+    """
+    在一个进程中运行多个爬虫，全部结束后返回
+    :param spiders: [爬虫类]
+    :param spider_kwargs: 传给每个爬虫的参数(与 scrapy crawl -a 相同)
+    :return: [统计信息 dict]，按 spiders 的顺序
+    """
+    process = CrawlerProcess(settings or get_project_settings())
+    crawlers = []
+    for spidercls in spiders:
+        crawler = process.create_crawler(spidercls)
+        process.crawl(crawler, **(spider_kwargs or {}))
+        crawlers.append((spidercls.name, crawler))
+    process.start()
+    results = []
+    for name, crawler in crawlers:
+        # 启动失败的爬虫没有统计信息
+        stats = dict(crawler.stats.get_stats()) if crawler.stats is not None else {'finish_reason': 'error'}
+        stats['spider'] = name
+        results.append(stats)
+    return results
+
+
+def main(argv=None):
+    from .simhash import get_family
+    parser = argparse.ArgumentParser(description='在一个进程中同时运行多个爬虫')
+    parser.add_argument('spiders', nargs='*', help='爬虫名称，缺省为全部')
+    parser.add_argument('--domain', action='append', default=None, help='按域名选择报刊，可重复')
+    parser.add_argument('-a', dest='spargs', action='append', default=[], metavar='NAME=VALUE',
+                        help='传给每个爬虫的参数')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE', help='设置')
+    args = parser.parse_args(argv)
+    try:
+        spider_kwargs = parse_pairs(args.spargs)
+        overrides = parse_pairs(args.set)
+    except ValueError as e:
+        parser.error(e.args[0])
+    spiders = get_family(args.domain, args.spiders)
+    missing = set(args.spiders) - set(spidercls.name for spidercls in spiders)
+    if missing:
+        parser.error('爬虫不存在: %s' % ', '.join(sorted(missing)))
+    if not spiders:
+        parser.error('没有符合条件的爬虫')
+
+    settings = get_project_settings()
+    for name, value in overrides.items():
+        settings.set(name, value, priority='cmdline')
+    start = time.time()
+    results = run(spiders, spider_kwargs, settings)
+    elapsed = time.time() - start
+
+    failed = 0
+    print('%-16s %-24s %10s %10s' % ('爬虫', '结束原因', '请求数', '入库条数'))
+    for stats in results:
+        reason = stats.get('finish_reason')
+        if reason != 'finished':
+            failed += 1
+        print('%-16s %-24s %10s %10s' % (stats['spider'], reason, stats.get('downloader/request_count', 0),
+                                         stats.get('item_scraped_count', 0)))
+    print(format_summary(merge_stats(results), elapsed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
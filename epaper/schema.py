@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+# 数据库表管理：根据爬虫列表创建/迁移 epaper_xxx 表
+# send_time 使用 DATE 类型并按年份分区，按日期查询时只扫描对应年份的分区
+# 分区表的唯一键必须包含分区字段，(href_hash, send_time) 只能保证同一天内唯一；
+# href_hash 的全局唯一由不分区的 epaper_xxx_href 表(主键 href_hash)保证，由 epaper_xxx 上的触发器维护，
+# 同一链接以不同的 send_time 再次插入时触发器报错(1062)，与原来的 UNIQUE KEY (href_hash) 相同
+#
+# 使用：python -m epaper.schema              创建缺少的表、迁移已有的表、补充新年份的分区
+#       python -m epaper.schema gjjrb zgnyb  只处理指定的爬虫
+#       python -m epaper.schema --dry-run    只打印 SQL 不执行
+import argparse
+import datetime
+import logging
+import pkgutil
+from importlib import import_module
+
+from scrapy.utils.spider import iter_spider_classes
+
+from .MysqlConn import Mysql
+from .utils import get_table_name
+
+logger = logging.getLogger(__name__)
+
+# 爬虫所在的包(包括 ePaper.py 中的爬虫类和按报刊登记表生成的爬虫)
+SPIDER_MODULE = 'epaper.spiders'
+
+# 分区表的主键和唯一键必须包含分区字段 send_time
+COLUMNS = (
+    ('id', "BIGINT UNSIGNED NOT NULL AUTO_INCREMENT"),
+    ('title', "VARCHAR(500) NOT NULL DEFAULT ''"),
+    ('href', "VARCHAR(500) NOT NULL DEFAULT ''"),
+    ('href_hash', "CHAR(32) NOT NULL DEFAULT ''"),
+    ('cType', "VARCHAR(50) NOT NULL DEFAULT ''"),
+    ('insert_time', "DATETIME NULL"),
+    ('content', "MEDIUMTEXT"),
+    ('content_hash', "CHAR(32) NOT NULL DEFAULT ''"),
+    ('send_time', "DATE NOT NULL DEFAULT '1970-01-01'"),
+    # content 压缩存储(见 compress.py)
+    ('content_zstd', "MEDIUMBLOB NULL"),
+    ('content_dict', "INT UNSIGNED NULL"),
+    # 近似重复检测(见 simhash.py)
+    ('simhash', "CHAR(16) NULL"),
+    ('dup_of', "CHAR(32) NULL"),
+)
+BJ_COLUMNS = COLUMNS + (('lable', "VARCHAR(100) NOT NULL DEFAULT ''"),)
+
+
+def get_spiders(names=None):
+    """
+    读取爬虫列表
+    :param names: 只返回指定名称的爬虫，None 为全部
+    :return: [爬虫类]
+    """
+    spiders = []
+    if names:
+        # 只加载指定的爬虫，不导入全部爬虫模块
+        from scrapy.utils.project import get_project_settings
+        from .spiderloader import LazySpiderLoader
+        loader = LazySpiderLoader(get_project_settings())
+        for name in sorted(set(names)):
+            try:
+                spiders.append(loader.load(name))
+            except KeyError:
+                continue
+        return spiders
+    package = import_module(SPIDER_MODULE)
+    for _, name, _ in pkgutil.iter_modules(package.__path__):
+        for spidercls in iter_spider_classes(import_module('%s.%s' % (SPIDER_MODULE, name))):
+            spiders.append(spidercls)
+    return sorted(spiders, key=lambda spidercls: spidercls.name)
+
+
+def get_columns(spider_name):
+    return BJ_COLUMNS if spider_name == 'BJSpider' else COLUMNS
+
+
+def get_href_table(table):
+    """
+    :return: 保证 href_hash 全局唯一的表名
+    """
+    return '%s_href' % table
+
+
+def get_triggers(table):
+    """
+    维护 href 表的触发器，没有计算 href_hash 的写入(非去重入库)由触发器按 href 计算
+    :return: [(触发器名, 时机, 语句)]
+    """
+    href_table = get_href_table(table)
+    return [
+        ('trg_%s_bi' % table, 'BEFORE INSERT',
+         "SET NEW.`href_hash` = IF(NEW.`href_hash` = '', MD5(NEW.`href`), NEW.`href_hash`)"),
+        ('trg_%s_ai' % table, 'AFTER INSERT',
+         "INSERT INTO `%s` (`href_hash`, `send_time`) VALUES (NEW.`href_hash`, NEW.`send_time`)" % href_table),
+        ('trg_%s_au' % table, 'AFTER UPDATE',
+         "UPDATE `%s` SET `href_hash` = NEW.`href_hash`, `send_time` = NEW.`send_time` "
+         "WHERE `href_hash` = OLD.`href_hash`" % href_table),
+        ('trg_%s_ad' % table, 'AFTER DELETE',
+         "DELETE FROM `%s` WHERE `href_hash` = OLD.`href_hash` AND `send_time` = OLD.`send_time`" % href_table),
+    ]
+
+
+def get_partitions(first_year, last_year):
+    """
+    生成按年份的分区定义，最后一个分区存放之后所有年份的数据
+    """
+    parts = ['PARTITION p%d VALUES LESS THAN (%d)' % (year, year + 1) for year in range(first_year, last_year + 1)]
+    parts.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    return '(%s)' % ', '.join(parts)
+
+
+class SchemaManager(object):
+    """
+    创建、迁移 epaper_xxx 表
+    """
+
+    def __init__(self, dry_run=False, last_year=None):
+        self.dry_run = dry_run
+        # 预先创建到明年的分区
+        self.last_year = last_year or datetime.date.today().year + 1
+
+    def execute(self, sql, param=None):
+        print(sql + ';')
+        if self.dry_run:
+            return
+        mysql = Mysql()
+        try:
+            mysql.update(sql, param)
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+
+    def query(self, sql, param=None):
+        mysql = Mysql()
+        try:
+            return mysql.getAll(sql, param) or []
+        finally:
+            mysql.dispose()
+
+    def get_first_year(self, spidercls):
+        start_date = getattr(spidercls, 'start_date', None) or '2007-01-01'
+        return int(str(start_date)[:4])
+
+    def get_table_columns(self, table):
+        """
+        @return: {字段名: 数据类型}，表不存在时为空
+        """
+        rows = self.query("SELECT COLUMN_NAME AS name, DATA_TYPE AS type FROM information_schema.COLUMNS "
+                          "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+        return dict((row['name'], row['type'].lower()) for row in rows)
+
+    def get_table_indexes(self, table):
+        """
+        @return: {索引名: [字段]}
+        """
+        rows = self.query("SELECT INDEX_NAME AS name, COLUMN_NAME AS col FROM information_schema.STATISTICS "
+                          "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+                          (table,))
+        indexes = {}
+        for row in rows:
+            indexes.setdefault(row['name'], []).append(row['col'])
+        return indexes
+
+    def get_table_triggers(self, table):
+        """
+        @return: set(触发器名)
+        """
+        rows = self.query("SELECT TRIGGER_NAME AS name FROM information_schema.TRIGGERS "
+                          "WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = %s", (table,))
+        return set(row['name'] for row in rows)
+
+    def get_table_partitions(self, table):
+        """
+        @return: [分区名]，未分区时为空
+        """
+        rows = self.query("SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS "
+                          "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                          "ORDER BY PARTITION_ORDINAL_POSITION", (table,))
+        return [row['name'] for row in rows]
+
+    def sync(self, spidercls):
+        """
+        @summary: 表不存在时创建，存在时迁移
+        """
+        table = get_table_name(spidercls.name)
+        try:
+            columns = self.get_table_columns(table)
+        except BaseException:
+            # 只打印 SQL 时允许没有数据库连接，按新建表处理
+            if not self.dry_run:
+                raise
+            columns = {}
+        if not columns:
+            self.create(spidercls, table)
+        else:
+            self.migrate(spidercls, table, columns)
+
+    def create(self, spidercls, table):
+        columns = ',\n  '.join('`%s` %s' % column for column in get_columns(spidercls.name))
+        sql = ("CREATE TABLE IF NOT EXISTS `%s` (\n  %s,\n"
+               "  PRIMARY KEY (`id`, `send_time`),\n"
+               "  UNIQUE KEY `uk_href_hash` (`href_hash`, `send_time`),\n"
+               "  KEY `idx_send_time` (`send_time`)\n"
+               ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4\n"
+               "PARTITION BY RANGE (YEAR(`send_time`)) %s") % (
+                  table, columns, get_partitions(self.get_first_year(spidercls), self.last_year))
+        self.execute(sql)
+        self.create_href_table(table, set())
+
+    def create_href_table(self, table, triggers):
+        """
+        @summary: 创建 href 表和缺少的触发器
+        @param triggers: 已有的触发器名
+        """
+        self.execute("CREATE TABLE IF NOT EXISTS `%s` (\n"
+                     "  `href_hash` CHAR(32) NOT NULL,\n"
+                     "  `send_time` DATE NOT NULL,\n"
+                     "  PRIMARY KEY (`href_hash`)\n"
+                     ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" % get_href_table(table))
+        for name, timing, statement in get_triggers(table):
+            if name not in triggers:
+                self.execute("CREATE TRIGGER `%s` %s ON `%s` FOR EACH ROW %s" % (name, timing, table, statement))
+
+    def migrate(self, spidercls, table, columns):
+        """
+        @summary: 迁移已有的表：补充哈希字段、send_time 转为 DATE、去重、重建主键和索引、按年份分区
+        """
+        # 补充缺少的字段
+        for name, definition in get_columns(spidercls.name):
+            if name == 'id' and name not in columns:
+                # 自增字段必须有索引
+                self.execute("ALTER TABLE `%s` ADD COLUMN `id` %s FIRST, ADD KEY `idx_id` (`id`)" % (table, definition))
+            elif name not in columns:
+                self.execute("ALTER TABLE `%s` ADD COLUMN `%s` %s" % (table, name, definition))
+        if 'href_hash' not in columns:
+            self.execute("UPDATE `%s` SET `href_hash` = MD5(`href`), `content_hash` = MD5(`content`)" % table)
+        # send_time 原为字符串(20190104 / 2019-01-04 等)，统一转为日期
+        if columns.get('send_time') != 'date':
+            self.execute("UPDATE `%s` SET `send_time` = IFNULL(DATE_FORMAT(STR_TO_DATE(LEFT(REPLACE(REPLACE("
+                         "`send_time`, '-', ''), '/', ''), 8), '%%Y%%m%%d'), '%%Y-%%m-%%d'), '1970-01-01')" % table)
+            self.execute("ALTER TABLE `%s` MODIFY `send_time` DATE NOT NULL DEFAULT '1970-01-01'" % table)
+        indexes = self.get_table_indexes(table)
+        href_table = self.get_table_columns(get_href_table(table))
+        if not href_table:
+            # 建立 href 表之前写入的数据可能没有 href_hash，或同一链接有不同的 send_time
+            self.execute("UPDATE `%s` SET `href_hash` = MD5(`href`) WHERE `href_hash` = ''" % table)
+        # 唯一键需要包含分区字段 send_time
+        if not href_table or indexes.get('uk_href_hash') != ['href_hash', 'send_time']:
+            self.execute("DELETE a FROM `%s` a JOIN `%s` b ON a.`href_hash` = b.`href_hash` AND a.`id` > b.`id`" % (
+                table, table))
+        if indexes.get('uk_href_hash') != ['href_hash', 'send_time']:
+            alters = []
+            if 'uk_href_hash' in indexes:
+                alters.append("DROP INDEX `uk_href_hash`")
+            alters.append("ADD UNIQUE KEY `uk_href_hash` (`href_hash`, `send_time`)")
+            self.execute("ALTER TABLE `%s` %s" % (table, ', '.join(alters)))
+        if indexes.get('PRIMARY') != ['id', 'send_time']:
+            drop = "DROP PRIMARY KEY, " if 'PRIMARY' in indexes else ""
+            self.execute("ALTER TABLE `%s` %sADD PRIMARY KEY (`id`, `send_time`)" % (table, drop))
+        if 'idx_send_time' not in indexes:
+            self.execute("ALTER TABLE `%s` ADD KEY `idx_send_time` (`send_time`)" % table)
+        if not href_table:
+            self.create_href_table(table, set())
+            self.execute("INSERT IGNORE INTO `%s` (`href_hash`, `send_time`) "
+                         "SELECT `href_hash`, `send_time` FROM `%s`" % (get_href_table(table), table))
+        else:
+            self.create_href_table(table, self.get_table_triggers(table))
+        partitions = self.get_table_partitions(table)
+        if not partitions:
+            self.execute("ALTER TABLE `%s` PARTITION BY RANGE (YEAR(`send_time`)) %s" % (
+                table, get_partitions(self.get_first_year(spidercls), self.last_year)))
+        else:
+            self.add_partitions(table, partitions)
+
+    def add_partitions(self, table, partitions):
+        """
+        @summary: 从 pmax 中拆分出新年份的分区(每年执行一次即可)
+        """
+        years = [int(name[1:]) for name in partitions if name != 'pmax' and name[1:].isdigit()]
+        if not years or 'pmax' not in partitions or max(years) >= self.last_year:
+            return
+        self.execute("ALTER TABLE `%s` REORGANIZE PARTITION pmax INTO %s" % (
+            table, get_partitions(max(years) + 1, self.last_year)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='创建/迁移 epaper_xxx 表')
+    parser.add_argument('spiders', nargs='*', help='爬虫名称，缺省为全部')
+    parser.add_argument('--dry-run', action='store_true', help='只打印 SQL 不执行')
+    args = parser.parse_args(argv)
+    manager = SchemaManager(dry_run=args.dry_run)
+    for spidercls in get_spiders(args.spiders):
+        try:
+            manager.sync(spidercls)
+        except BaseException as e:
+            logger.error('处理 %s 失败: %s', spidercls.name, e.args)
+            print(e.args)
+
+
+if __name__ == '__main__':
+    main()
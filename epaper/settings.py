@@ -13,6 +13,9 @@ BOT_NAME = 'epaper'
 
 SPIDER_MODULES = ['epaper.spiders']
 NEWSPIDER_MODULE = 'epaper.spiders'
+# 按索引只加载要运行的爬虫(见 spiderloader.py)，索引保存在 .scrapy/ 下的 EPAPER_SPIDER_INDEX 文件中
+SPIDER_LOADER_CLASS = 'epaper.spiderloader.LazySpiderLoader'
+EPAPER_SPIDER_INDEX = 'spider_index.json'
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 # USER_AGENT = 'epaper (+http://www.yourdomain.com)'
@@ -54,16 +57,26 @@ COOKIES_ENABLED = False
 # DOWNLOADER_MIDDLEWARES = {
 #    'epaper.middlewares.EpaperDownloaderMiddleware': 543,
 # }
+DOWNLOADER_MIDDLEWARES = {
+    'epaper.middlewares.SeenUrlMiddleware': 50,
+    'epaper.middlewares.IssueCalendarMiddleware': 590,
+    'epaper.middlewares.HostBudgetMiddleware': 950,
+}
 
 # Enable or disable extensions
 # See https://doc.scrapy.org/en/latest/topics/extensions.html
 # EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 # }
+EXTENSIONS = {
+    'epaper.extensions.StatsDump': 500,
+    'epaper.extensions.WarcArchive': 510,
+}
 
 # Configure item pipelines
 # See https://doc.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    'epaper.pipelines.SimHashPipeline': 200,
     'epaper.pipelines.EpaperPipeline': 300,
 }
 
@@ -87,8 +100,127 @@ ITEM_PIPELINES = {
 # HTTPCACHE_DIR = 'httpcache'
 # HTTPCACHE_IGNORE_HTTP_CODES = []
 # HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# 目录页和版面页按报纸日期缓存(见 httpcache.py，默认不启用)，文件保存在 .scrapy/httpcache 下
+HTTPCACHE_ENABLED = False
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_POLICY = 'epaper.httpcache.IssueCachePolicy'
+HTTPCACHE_STORAGE = 'epaper.httpcache.SqliteCacheStorage'
+# 链接中的日期早于该天数的页面缓存一直有效，较新的页面缓存 EPAPER_HTTPCACHE_RECENT_TTL 秒
+EPAPER_HTTPCACHE_IMMUTABLE_DAYS = 7
+EPAPER_HTTPCACHE_RECENT_TTL = 3600
+# 是否也缓存文章页(回调为 EPAPER_SEEN_CALLBACKS 的请求)
+EPAPER_HTTPCACHE_ARTICLES = False
 LOG_LEVEL = "INFO"
 CONCURRENT_REQUESTS = 100
 CONCURRENT_REQUESTS_PER_DOMAIN = 100
 CONCURRENT_REQUESTS_PER_IP = 100
 DOWNLOAD_TIMEOUT = 15
+
+# 入库方式: 'single' 逐条插入; 'batch' 按表缓存后批量插入
+EPAPER_WRITE_MODE = 'single'
+# 批量插入的行数阈值
+EPAPER_BATCH_ROWS = 500
+# 批量插入的字节数阈值(会被限制在 max_allowed_packet 以内)
+EPAPER_BATCH_BYTES = 1024000
+# 批量插入的时间阈值(秒)
+EPAPER_BATCH_INTERVAL = 5.0
+# 写数据库的线程数(写操作不在 reactor 线程中执行)
+EPAPER_WRITER_THREADS = 4
+# 待写入行数超过高水位时暂停调度新请求，降到低水位时恢复
+EPAPER_WRITE_HIGH_WATER = 5000
+EPAPER_WRITE_LOW_WATER = 1000
+# 数据库连接池: 与 MysqlConn.Config 同名的配置项会覆盖 Config 中的值，例如
+# DB_TEST_HOST = '127.0.0.1'
+# DB_MAX_CONNECYIONS = 1000
+# 连接数达到上限时等待空闲连接的最长时间(秒)
+DB_POOL_TIMEOUT = 30
+# 去重入库: 以 href_hash 为唯一键，重复爬取的链接只在内容变化时更新(需要表中有 href_hash、content_hash 字段)
+EPAPER_UPSERT = False
+# 是否等待写入完成后再返回 item，批量导入时可设为 False
+EPAPER_WRITE_ACK = True
+# 'load' 模式: TSV 文件目录、每个文件的行数、导入间隔(秒)；需要 DB_LOCAL_INFILE = True
+EPAPER_LOAD_DIR = 'spool/load'
+EPAPER_LOAD_ROWS = 50000
+EPAPER_LOAD_INTERVAL = 60.0
+# DB_LOCAL_INFILE = True
+# 存储后端，可同时写入多个: 'mysql'、'sqlite'(SQLite 文件，WAL 模式)、'jsonl'(压缩的 JSON Lines 文件)
+EPAPER_BACKENDS = ['mysql']
+EPAPER_SQLITE_PATH = 'data/epaper.sqlite3'
+# jsonl 文件目录、压缩方式('gzip'/'zstd'/'')、每个文件的行数和未压缩字节数上限
+EPAPER_JSONL_DIR = 'data/jsonl'
+EPAPER_JSONL_COMPRESS = 'gzip'
+EPAPER_JSONL_ROTATE_ROWS = 100000
+EPAPER_JSONL_ROTATE_BYTES = 268435456
+# 写入失败或超过耗时预算 EPAPER_BREAKER_FAILURES 次后打开熔断器，数据追加到 EPAPER_SPOOL_DIR 下的 WAL 文件，
+# EPAPER_BREAKER_RESET 秒后试探写入，恢复后按顺序重放；EPAPER_WRITE_LATENCY_BUDGET 为 0 时不限制耗时
+EPAPER_SPOOL_ENABLED = True
+EPAPER_SPOOL_DIR = 'spool/wal'
+EPAPER_SPOOL_FSYNC = True
+EPAPER_BREAKER_FAILURES = 3
+EPAPER_BREAKER_RESET = 30.0
+EPAPER_WRITE_LATENCY_BUDGET = 0
+# content 使用按报刊训练的 zstd 字典压缩后写入 content_zstd 字段(需先执行 python -m epaper.schema 和
+# python -m epaper.compress train)，Mysql 的查询方法读出时自动解压
+EPAPER_CONTENT_COMPRESS = False
+# 已爬取链接过滤: 启动时读取表中已有的 href，回调为 EPAPER_SEEN_CALLBACKS 的已爬取文章不再下载
+# 布隆过滤器保存在 EPAPER_SEEN_DIR 下，误判率 EPAPER_SEEN_ERROR_RATE；需要重新爬取已有文章时设为 False
+EPAPER_SEEN_FILTER = True
+EPAPER_SEEN_DIR = 'spool/seen'
+EPAPER_SEEN_CAPACITY = 2000000
+EPAPER_SEEN_ERROR_RATE = 0.0001
+EPAPER_SEEN_CALLBACKS = ['parse_content', 'parse_cotent']
+# 近似重复检测: EPAPER_SIMHASH_DOMAINS 下的报刊之间海明距离不超过 EPAPER_SIMHASH_DISTANCE 的文章视为重复，
+# 'tag' 在 dup_of 中记录原文后照常入库，'drop' 丢弃(需要表中有 simhash、dup_of 字段)
+EPAPER_SIMHASH_ENABLED = False
+EPAPER_SIMHASH_DOMAINS = ['paper.people.com.cn']
+EPAPER_SIMHASH_ACTION = 'tag'
+EPAPER_SIMHASH_DISTANCE = 3
+# 增量爬取: 从表中最新的 send_time 减去 EPAPER_INCREMENTAL_OVERLAP 天开始爬取到今天(也可用 -a incremental=1 指定)
+EPAPER_INCREMENTAL = False
+EPAPER_INCREMENTAL_OVERLAP = 2
+# 爬虫关闭时统计信息写入的 JSON 文件，为空时不写入
+EPAPER_STATS_FILE = None
+# 同一进程中所有爬虫对同一网站的并发请求数(HostBudgetMiddleware，0 为不限制)；
+# 多进程分片运行(python -m epaper.shard)时按进程数平分
+EPAPER_HOST_BUDGET = 100
+# 自适应并发(AIMD，默认不启用，单站并发固定为 EPAPER_HOST_BUDGET): 每个网站从 EPAPER_THROTTLE_START 开始，
+# 正常响应时增加，状态码为 EPAPER_THROTTLE_BACKOFF_CODES、超时/连接错误、页面小于 EPAPER_THROTTLE_EMPTY_BYTES 字节
+# 或平均耗时超过 EPAPER_THROTTLE_LATENCY 秒(缺省为 DOWNLOAD_TIMEOUT / 3)时乘以 EPAPER_THROTTLE_DECREASE，上限为 EPAPER_HOST_BUDGET
+EPAPER_THROTTLE_ENABLED = False
+EPAPER_THROTTLE_START = 4
+EPAPER_THROTTLE_DECREASE = 0.5
+# EPAPER_THROTTLE_LATENCY = 5.0
+EPAPER_THROTTLE_COOLDOWN = 2.0
+EPAPER_THROTTLE_EMPTY_BYTES = 200
+EPAPER_THROTTLE_BACKOFF_CODES = [403, 408, 429, 500, 502, 503, 504]
+# 多机共享的爬取队列('mysql'/'sqlite'，None 不使用): 每次租用 EPAPER_FRONTIER_LEASE_DATES 个日期，
+# 租约 EPAPER_FRONTIER_LEASE_SECONDS 秒内未续约时由其他机器接管，租用 EPAPER_FRONTIER_MAX_ATTEMPTS 次仍未完成的日期标记为 failed
+EPAPER_FRONTIER = None
+EPAPER_FRONTIER_SQLITE_PATH = 'data/frontier.sqlite3'
+EPAPER_FRONTIER_LEASE_DATES = 10
+EPAPER_FRONTIER_LEASE_SECONDS = 1800
+EPAPER_FRONTIER_MAX_ATTEMPTS = 5
+# 常驻调度进程(python -m epaper.daemon run): 每天按 EPAPER_DAEMON_SCHEDULE 的时间运行增量爬取
+# ({爬虫名或 '*': 'HH:MM'}，'*' 为其他爬虫，值为 None 时不定时运行)，临时任务通过本机端口 EPAPER_DAEMON_PORT 提交，
+# 同时运行的任务不超过 EPAPER_DAEMON_MAX_JOBS；任务记录在 EPAPER_JOBS_STORE('mysql'/'sqlite') 的 epaper_jobs 表中
+EPAPER_DAEMON_SCHEDULE = {'*': '05:00'}
+EPAPER_DAEMON_PORT = 6810
+EPAPER_DAEMON_MAX_JOBS = 4
+EPAPER_JOBS_STORE = 'mysql'
+EPAPER_JOBS_SQLITE_PATH = 'data/jobs.sqlite3'
+# 保存下载的原始响应(WARC 格式，见 warc.py)到 EPAPER_WARC_DIR/<爬虫>/，每个文件达到 EPAPER_WARC_ROTATE_BYTES 后换新文件；
+# python -m epaper.replay 用 EPAPER_REPLAY_WORKERS 个进程(缺省为 CPU 核数)离线重新解析
+EPAPER_WARC_ENABLED = False
+EPAPER_WARC_DIR = 'data/warc'
+EPAPER_WARC_ROTATE_BYTES = 64 * 1024 * 1024
+# EPAPER_REPLAY_WORKERS = 8
+# 登记表中改版日期未知的报刊，爬取前先二分查找改版日期(见 epochs.py)，结果保存在 .scrapy/ 下的 EPAPER_EPOCH_FILE 中
+EPAPER_EPOCH_DETECT = True
+EPAPER_EPOCH_FILE = 'epochs.json'
+# 出版日历(见 issues.py，默认不启用): 按爬虫保存在 .scrapy/ 下的 EPAPER_CALENDAR_DIR 中，已知不出版的日期不再请求，
+# 未知的日期先发送 HEAD 请求；某个星期几(或每月的第几天)已知的日期达到 EPAPER_CALENDAR_MIN_SAMPLES 个后按出版规律处理，
+# 从不出版的日子每 EPAPER_CALENDAR_RECHECK_WEEKS 周探测一次
+EPAPER_CALENDAR_ENABLED = False
+EPAPER_CALENDAR_DIR = 'calendar'
+EPAPER_CALENDAR_MIN_SAMPLES = 4
+EPAPER_CALENDAR_RECHECK_WEEKS = 4
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+# 单个爬虫的多进程分片运行
+# 一个 Scrapy 进程只能使用一个 CPU 核心解析页面，回溯爬取几千天的报刊时解析成为瓶颈；
+# 把日期范围分为 N 段互不重叠的区间，启动 N 个 scrapy crawl 进程各爬取一段，结束后合并统计信息
+# 每个进程的单站并发数为 EPAPER_HOST_BUDGET / N，所有进程对同一网站的并发请求总数不超过 EPAPER_HOST_BUDGET
+# 登记表中有未知的改版日期时先检测整个日期范围一次(见 epochs.py)，分片不再各自检测
+#
+# 使用：python -m epaper.shard nfrb -n 4
+#       python -m epaper.shard nfrb -n 4 --start-date 2010-01-01 --end-date 2019-02-26 -s EPAPER_WRITE_MODE=load
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+from scrapy.utils.project import get_project_settings
+
+from .epochs import EpochStore, need_detect
+from .extensions import format_summary, merge_stats
+from .schema import get_spiders
+from .utils import format_date
+
+
+def split_range(start_date, end_date, shards):
+    """
+    把日期范围分为 shards 段互不重叠的连续区间
+    :return: [(开始日期, 结束日期)]
+    """
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+    days = (end - start).days + 1
+    if days <= 0:
+        raise ValueError('结束日期 %s 早于开始日期 %s' % (end_date, start_date))
+    shards = max(1, min(shards, days))
+    ranges = []
+    offset = 0
+    for i in range(shards):
+        size = days // shards + (1 if i < days % shards else 0)
+        first = start + datetime.timedelta(days=offset)
+        last = first + datetime.timedelta(days=size - 1)
+        ranges.append((first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')))
+        offset += size
+    return ranges
+
+
+def get_shard_settings(settings, index, shards, budget, run_dir):
+    """
+    每个分片进程的设置
+    :return: {设置名: 值}
+    """
+    # 向下取整，各进程之和不超过 budget(进程数多于 budget 时每个进程至少 1)
+    per_host = max(1, budget // shards)
+    overrides = {
+        'CONCURRENT_REQUESTS_PER_DOMAIN': per_host,
+        'EPAPER_HOST_BUDGET': per_host,
+        'LOG_FILE': os.path.join(run_dir, 'shard-%d.log' % index),
+        'EPAPER_STATS_FILE': os.path.join(run_dir, 'shard-%d.json' % index),
+        # 已爬取链接的布隆过滤器文件不能由多个进程同时写入
+        'EPAPER_SEEN_DIR': os.path.join(settings.get('EPAPER_SEEN_DIR', 'spool/seen'), 'shard-%d-of-%d' % (index, shards)),
+    }
+    if settings.getint('CONCURRENT_REQUESTS_PER_IP'):
+        overrides['CONCURRENT_REQUESTS_PER_IP'] = per_host
+    # 逐条写入时每条数据一次提交，多进程下改为批量写入
+    if settings.get('EPAPER_WRITE_MODE', 'single') == 'single':
+        overrides['EPAPER_WRITE_MODE'] = 'batch'
+    return overrides
+
+
+def get_command(spider, first, last, sets, overrides):
+    """
+    :param sets: 命令行 -s 指定的设置
+    :param overrides: 追加的设置 {设置名: 值}
+    :return: 爬取 first 至 last 的 scrapy crawl 命令
+    """
+    command = [sys.executable, '-m', 'scrapy', 'crawl', spider, '-a', 'start_date=%s' % first,
+               '-a', 'end_date=%s' % last]
+    for item in sets:
+        command.extend(['-s', item])
+    for name, value in sorted(overrides.items()):
+        command.extend(['-s', '%s=%s' % (name, value)])
+    return command
+
+
+def detect_epochs(spidercls, settings, start_date, end_date, sets, run_dir):
+    """
+    各分片分别检测时每个进程都请求一遍起始页，且只检测自己的日期范围；在启动分片之前检测整个日期范围一次
+    :return: 是否进行了检测
+    """
+    if not hasattr(spidercls, 'epochs') or not settings.getbool('EPAPER_EPOCH_DETECT', True):
+        return False
+    detected = EpochStore.from_settings(settings).get(spidercls.name, spidercls.epochs)
+    if not need_detect(spidercls.epochs, detected, start_date, end_date):
+        return False
+    if detected is not None:
+        # 与保存的检测范围合并，之前检测过的日期仍然有效
+        start_date = min(start_date, detected['start_date'])
+        end_date = max(end_date, detected['end_date'])
+    print('检测改版日期: %s 至 %s' % (start_date, end_date))
+    # 只请求起始页，不使用共享队列和数据库
+    command = get_command(spidercls.name, start_date, end_date, sets, {
+        'EPAPER_FRONTIER': '',
+        'EPAPER_SEEN_FILTER': False,
+        'EPAPER_INCREMENTAL': False,
+        'LOG_FILE': os.path.join(run_dir, 'detect.log'),
+    }) + ['-a', 'epoch_detect=only']
+    code = subprocess.call(command)
+    if code:
+        print('检测改版日期异常退出: %s' % code)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把一个爬虫的日期范围分片，多进程同时爬取')
+    parser.add_argument('spider', help='爬虫名称')
+    parser.add_argument('-n', '--shards', type=int, default=os.cpu_count() or 1, help='进程数，缺省为 CPU 核数')
+    parser.add_argument('--start-date', help='开始日期，缺省为爬虫的 start_date')
+    parser.add_argument('--end-date', help='结束日期，缺省为爬虫的 end_date')
+    parser.add_argument('--budget', type=int, help='所有进程对同一网站的并发请求数，缺省为 EPAPER_HOST_BUDGET')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE', help='传给每个进程的设置')
+    parser.add_argument('--run-dir', help='日志和统计信息目录，缺省为 logs/<爬虫>-<时间>')
+    args = parser.parse_args(argv)
+
+    settings = get_project_settings()
+    for item in args.set:
+        name, _, value = item.partition('=')
+        settings.set(name, value, priority='cmdline')
+    spiders = get_spiders([args.spider])
+    if not spiders:
+        parser.error('爬虫不存在: %s' % args.spider)
+    spidercls = spiders[0]
+    start_date = format_date(args.start_date or spidercls.start_date)
+    end_date = format_date(args.end_date or spidercls.end_date) or datetime.datetime.now().strftime('%Y-%m-%d')
+    if start_date is None:
+        parser.error('%s 没有 start_date，请使用 --start-date 指定' % args.spider)
+    budget = args.budget or settings.getint('EPAPER_HOST_BUDGET') or settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+    run_dir = args.run_dir or os.path.join('logs', '%s-%s' % (args.spider, time.strftime('%Y%m%d-%H%M%S')))
+    if not os.path.isdir(run_dir):
+        os.makedirs(run_dir)
+
+    ranges = split_range(start_date, end_date, args.shards)
+    start = time.time()
+    # 已检测过时分片不再检测(检测失败时也不在每个分片中重复)
+    detected = detect_epochs(spidercls, settings, start_date, end_date, args.set, run_dir)
+    processes = []
+    for index, (first, last) in enumerate(ranges):
+        overrides = get_shard_settings(settings, index, len(ranges), budget, run_dir)
+        command = get_command(args.spider, first, last, args.set, overrides)
+        if detected:
+            command.extend(['-a', 'epoch_detect=0'])
+        print('分片 %d: %s 至 %s' % (index, first, last))
+        processes.append((index, first, last, subprocess.Popen(command)))
+
+    failed = 0
+    stats_list = []
+    for index, first, last, process in processes:
+        code = process.wait()
+        if code:
+            failed += 1
+            print('分片 %d(%s 至 %s) 异常退出: %s' % (index, first, last, code))
+        path = os.path.join(run_dir, 'shard-%d.json' % index)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            stats_list.append(stats)
+            elapsed = stats.get('elapsed_time_seconds') or 0
+            if elapsed:
+                print('分片 %d: 入库 %s 条, 每秒 %.2f 条' % (
+                    index, stats.get('item_scraped_count', 0), stats.get('item_scraped_count', 0) / elapsed))
+    elapsed = time.time() - start
+    merged = merge_stats(stats_list)
+    with open(os.path.join(run_dir, 'stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2, sort_keys=True, default=str)
+    print(format_summary(merged, elapsed))
+    print('日志和统计信息: %s' % run_dir)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# 基于 SimHash 的近似重复检测
+# 人民网旗下的报刊(paper.people.com.cn)之间大量转载相同的文章，content 的 64 位 SimHash 指纹海明距离不超过
+# EPAPER_SIMHASH_DISTANCE 时视为重复；指纹按 16 位分为 4 段建立索引，距离不超过 3 的指纹至少有一段完全相同，
+# 查找时只比较同段的候选，不需要遍历全部指纹
+# 指纹(16 位十六进制)保存在 simhash 字段，重复文章在 dup_of 字段中记录原文的 href_hash
+#
+# 使用：python -m epaper.simhash rebuild [爬虫名 ...] [--missing]   为已有数据计算指纹并标记重复
+import argparse
+import hashlib
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 空白和常见标点不参与计算
+_IGNORE = re.compile(r'[\s　，。、；：？！“”‘’（）《》【】,.;:?!"\'()\-]+')
+
+# 按位累加时每一位的计数占用的字节数，一次最多累加 65535 个分词
+_LANE_BYTES = 2
+_LANE = _LANE_BYTES * 8
+_LANE_MASK = (1 << _LANE) - 1
+_LANE_LIMIT = _LANE_MASK
+# 字节值展开为 8 个计数位(小端序): 第 b 位为 1 时第 b 个计数位为 1
+_SPREAD = [b''.join((b'\x01' if value >> bit & 1 else b'\x00') + b'\x00' * (_LANE_BYTES - 1) for bit in range(8))
+           for value in range(256)]
+
+# 分词的展开值缓存(文章之间大量重复)，超过上限时清空
+_spread_cache = {}
+_CACHE_SIZE = 100000
+
+
+def _spread(shingle):
+    """
+    分词的 64 位哈希展开为 64 个计数位，多个分词的展开值相加即得到每一位为 1 的次数
+    """
+    value = _spread_cache.get(shingle)
+    if value is None:
+        if len(_spread_cache) >= _CACHE_SIZE:
+            _spread_cache.clear()
+        digest = hashlib.md5(shingle.encode('utf-8')).digest()
+        value = int.from_bytes(b''.join([_SPREAD[byte] for byte in digest[:8]]), 'little')
+        _spread_cache[shingle] = value
+    return value
+
+
+def simhash(text, width=3):
+    """
+    计算 64 位 SimHash(按 width 个字切分，每个分词权重相同，重复出现的分词累加)
+    :return: int，文本为空时为 None
+    """
+    if not text:
+        return None
+    text = _IGNORE.sub('', str(text))
+    if not text:
+        return None
+    total = max(len(text) - width + 1, 1)
+    bits = [0] * 64
+    # 所有位的计数在一个大整数中同时累加，每段不超过计数位的上限
+    for start in range(0, total, _LANE_LIMIT):
+        end = min(start + _LANE_LIMIT, total)
+        counts = sum(map(_spread, [text[i:i + width] for i in range(start, end)]))
+        for bit in range(64):
+            bits[bit] += (counts >> (bit * _LANE)) & _LANE_MASK
+    half = total / 2.0
+    result = 0
+    for bit in range(64):
+        if bits[bit] > half:
+            result |= 1 << bit
+    return result
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def to_hex(value):
+    return '%016x' % value if value is not None else None
+
+
+def from_hex(value):
+    return int(value, 16) if value else None
+
+
+class SimHashIndex(object):
+    """
+    分段索引: 64 位指纹分为 bands 段，任意一段相同的指纹为候选，再比较海明距离
+    """
+
+    def __init__(self, bands=None, distance=3):
+        # 段数多于最大距离时，距离以内的指纹至少有一段相同
+        bands = bands or max(4, distance + 1)
+        self.bands = bands
+        self.distance = distance
+        self.band_bits = 64 // bands
+        self.band_mask = (1 << self.band_bits) - 1
+        # [{段的值: [(指纹, 键)]}]
+        self.index = [{} for _ in range(bands)]
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def get_bands(self, fingerprint):
+        return [(fingerprint >> (i * self.band_bits)) & self.band_mask for i in range(self.bands)]
+
+    def find(self, fingerprint):
+        """
+        @return: 距离最近且不超过 distance 的 (指纹, 键)，没有时为 None
+        """
+        best = None
+        best_distance = self.distance + 1
+        for index, band in zip(self.index, self.get_bands(fingerprint)):
+            for other, key in index.get(band, ()):
+                distance = hamming(fingerprint, other)
+                if distance < best_distance:
+                    best, best_distance = (other, key), distance
+        return best
+
+    def add(self, fingerprint, key):
+        with self.lock:
+            for index, band in zip(self.index, self.get_bands(fingerprint)):
+                index.setdefault(band, []).append((fingerprint, key))
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
+def get_family(domains, names=None):
+    """
+    读取属于指定域名的爬虫
+    :return: [爬虫类]
+    """
+    from .schema import get_spiders
+    return [spidercls for spidercls in get_spiders(names)
+            if not domains or set(getattr(spidercls, 'allowed_domains', None) or ()) & set(domains)]
+
+
+def load_index(index, tables, chunk=10000):
+    """
+    从表中读取已有的指纹(只读取原文，重复文章不加入索引)
+    :return: 读取的指纹数
+    """
+    from .MysqlConn import Mysql
+    count = 0
+    for table in tables:
+        last_id = 0
+        while True:
+            mysql = Mysql()
+            try:
+                rows = mysql.getAll("SELECT `id`, `simhash`, `href_hash` FROM `%s` WHERE `id` > %%s "
+                                    "AND `simhash` IS NOT NULL AND `dup_of` IS NULL ORDER BY `id` LIMIT %d" % (
+                                        table, chunk), (last_id,)) or []
+            finally:
+                mysql.dispose()
+            for row in rows:
+                index.add(from_hex(row['simhash']), row['href_hash'])
+            count += len(rows)
+            if len(rows) < chunk:
+                break
+            last_id = rows[-1]['id']
+    return count
+
+
+def rebuild(index, table, missing=False, chunk=1000):
+    """
+    为表中的数据计算指纹，与索引中的指纹比较后写入 simhash、dup_of
+    :param missing: 只处理还没有指纹的行
+    :return: (处理行数, 重复行数)
+    """
+    from .MysqlConn import Mysql
+    from .utils import get_hash
+    count, dups = 0, 0
+    last_id = 0
+    where = " AND `simhash` IS NULL" if missing else ""
+    while True:
+        mysql = Mysql()
+        try:
+            # 读取 content_zstd 时 Mysql 自动解压到 content
+            rows = mysql.getAll("SELECT `id`, `href`, `href_hash`, `content`, `content_zstd`, `content_dict` "
+                                "FROM `%s` WHERE `id` > %%s%s ORDER BY `id` LIMIT %d" % (table, where, chunk),
+                                (last_id,)) or []
+            for row in rows:
+                fingerprint = simhash(row['content'])
+                if fingerprint is None:
+                    continue
+                href_hash = row['href_hash'] or get_hash(row['href'])
+                match = index.find(fingerprint)
+                dup_of = match[1] if match is not None and match[1] != href_hash else None
+                if dup_of is None:
+                    if match is None:
+                        index.add(fingerprint, href_hash)
+                else:
+                    dups += 1
+                mysql.update("UPDATE `%s` SET `simhash` = %%s, `dup_of` = %%s WHERE `id` = %%s" % table,
+                             (to_hex(fingerprint), dup_of, row['id']))
+                count += 1
+        except BaseException:
+            mysql.dispose(is_end=0)
+            raise
+        mysql.dispose()
+        if len(rows) < chunk:
+            return count, dups
+        last_id = rows[-1]['id']
+
+
+def main(argv=None):
+    from .utils import get_table_name
+    parser = argparse.ArgumentParser(description='SimHash 近似重复检测')
+    parser.add_argument('command', choices=('rebuild',), help='rebuild: 为已有数据计算指纹并标记重复')
+    parser.add_argument('spiders', nargs='*', help='爬虫名称，缺省为 paper.people.com.cn 下的全部报刊')
+    parser.add_argument('--domain', action='append', default=None, help='按域名选择报刊，可重复')
+    parser.add_argument('--missing', action='store_true', help='只处理还没有指纹的行')
+    parser.add_argument('--distance', type=int, default=3, help='视为重复的最大海明距离')
+    args = parser.parse_args(argv)
+    domains = args.domain or ([] if args.spiders else ['paper.people.com.cn'])
+    tables = [get_table_name(spidercls.name) for spidercls in get_family(domains, args.spiders)]
+    index = SimHashIndex(distance=args.distance)
+    if args.missing:
+        # 已有的指纹先加入索引
+        load_index(index, tables)
+    for table in tables:
+        try:
+            count, dups = rebuild(index, table, missing=args.missing)
+            print('%s: %s 行, 重复 %s 行' % (table, count, dups))
+        except BaseException as e:
+            logger.error('处理 %s 失败: %s', table, e.args)
+            print(e.args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+# 按需加载爬虫(SPIDER_LOADER_CLASS)
+# Scrapy 默认的 SpiderLoader 每次启动都导入 SPIDER_MODULES 下的全部模块并生成全部爬虫类；
+# LazySpiderLoader 使用索引 {爬虫名: 模块和类名 / 报刊登记表的记录}，scrapy list 不导入任何爬虫，
+# scrapy crawl xxx 只导入 xxx 所在的模块(登记表中的报刊只生成这一个爬虫类)
+# 索引保存在 .scrapy/ 下，记录了爬虫模块和登记表的 sha1，源码改变后第一次启动时重新生成
+#
+# 使用：python -m epaper.spiderloader index          重新生成索引
+#       python -m epaper.spiderloader time [爬虫名]  对比全部导入和按需加载的启动耗时(各启动一个新进程)
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from scrapy.utils.project import data_path
+
+try:
+    # 新版 Scrapy 按 SpiderLoaderProtocol 检查，scrapy.interfaces 已弃用
+    from scrapy.spiderloader import SpiderLoaderProtocol  # noqa: F401
+
+    def implementer(interface):
+        return lambda cls: cls
+
+    ISpiderLoader = None
+except ImportError:
+    from scrapy.interfaces import ISpiderLoader
+    from zope.interface import implementer
+
+logger = logging.getLogger(__name__)
+
+# 报刊登记表所在的模块
+PAPERS_MODULE = 'epaper.papers'
+INDEX_VERSION = 1
+
+
+def get_sources(spider_modules):
+    """
+    :return: {文件路径: sha1}，包括爬虫模块和报刊登记表
+    """
+    paths = []
+    for name in spider_modules:
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            continue
+        if spec.submodule_search_locations:
+            for location in spec.submodule_search_locations:
+                for root, _, files in os.walk(location):
+                    paths.extend(os.path.join(root, filename) for filename in files if filename.endswith('.py'))
+        elif spec.origin:
+            paths.append(spec.origin)
+    spec = importlib.util.find_spec(PAPERS_MODULE)
+    if spec is not None and spec.origin:
+        paths.append(spec.origin)
+    sources = {}
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            sources[os.path.abspath(path)] = hashlib.sha1(f.read()).hexdigest()
+    return sources
+
+
+@implementer(ISpiderLoader)
+class LazySpiderLoader(object):
+    """
+    @summary: 按索引加载爬虫，索引不存在或已过期时导入全部爬虫模块重新生成
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.spider_modules = settings.getlist('SPIDER_MODULES')
+        self.path = data_path(settings.get('EPAPER_SPIDER_INDEX') or 'spider_index.json')
+        # 已加载的爬虫类 {爬虫名: 类}，加载耗时 {爬虫名: 秒}
+        self._spiders = {}
+        self.load_times = {}
+        self.index = self.read_index()
+        if self.index is None:
+            self.index = self.build_index()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings)
+
+    def read_index(self):
+        """
+        @return: 索引 {爬虫名: 位置}，文件不存在、格式不同或源码已改变时为 None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if index.get('version') != INDEX_VERSION or index.get('spider_modules') != self.spider_modules:
+            return None
+        if index.get('sources') != get_sources(self.spider_modules):
+            logger.debug('爬虫源码已改变，重新生成索引')
+            return None
+        return index['spiders']
+
+    def build_index(self):
+        """
+        @summary: 用 Scrapy 默认的 SpiderLoader 导入全部爬虫，生成并保存索引
+        @return: 索引
+        """
+        from scrapy.spiderloader import SpiderLoader
+        start = time.time()
+        loader = SpiderLoader.from_settings(self.settings)
+        spiders = {}
+        for name in loader.list():
+            spidercls = loader.load(name)
+            self._spiders[name] = spidercls
+            if getattr(spidercls, 'paper', None) is not None:
+                spiders[name] = {'paper': name}
+            else:
+                spiders[name] = {'module': spidercls.__module__, 'class': spidercls.__name__}
+        logger.info('生成爬虫索引: %s 个爬虫，耗时 %.1f ms', len(spiders), (time.time() - start) * 1000)
+        index = {
+            'version': INDEX_VERSION,
+            'spider_modules': self.spider_modules,
+            'sources': get_sources(self.spider_modules),
+            'spiders': spiders,
+        }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+        except (IOError, OSError) as e:
+            logger.warning('保存爬虫索引 %s 失败: %s', self.path, e)
+        return spiders
+
+    def load(self, spider_name):
+        spidercls = self._spiders.get(spider_name)
+        if spidercls is not None:
+            return spidercls
+        entry = self.index.get(spider_name)
+        if entry is None:
+            raise KeyError('Spider not found: %s' % spider_name)
+        start = time.time()
+        if 'paper' in entry:
+            from .papers import get_paper
+            from .spiders.engine import create_spider
+            paper = get_paper(entry['paper'])
+            if paper is None:
+                raise KeyError('Spider not found: %s' % spider_name)
+            spidercls = create_spider(paper)
+        else:
+            spidercls = getattr(importlib.import_module(entry['module']), entry['class'])
+        self.load_times[spider_name] = time.time() - start
+        logger.info('加载爬虫 %s 耗时 %.1f ms', spider_name, self.load_times[spider_name] * 1000)
+        self._spiders[spider_name] = spidercls
+        return spidercls
+
+    def list(self):
+        return sorted(self.index)
+
+    def find_by_request(self, request):
+        return [name for name in self.list() if self.load(name).handles_request(request)]
+
+
+# 在新进程中测量启动耗时: 导入 Scrapy 后分别用默认 SpiderLoader 和 LazySpiderLoader 列出爬虫并加载指定的爬虫
+TIME_SCRIPT = '''
+import sys, time
+from scrapy.utils.project import get_project_settings
+settings = get_project_settings()
+start = time.time()
+if sys.argv[1] == 'default':
+    from scrapy.spiderloader import SpiderLoader as Loader
+else:
+    from epaper.spiderloader import LazySpiderLoader as Loader
+loader = Loader.from_settings(settings)
+loader.list()
+for name in sys.argv[2:]:
+    loader.load(name)
+print('%.1f %d' % ((time.time() - start) * 1000, len([m for m in sys.modules if m.startswith('epaper')])))
+'''
+
+
+def time_loader(mode, names):
+    """
+    :return: (加载耗时 ms, 导入的项目模块数)
+    """
+    output = subprocess.check_output([sys.executable, '-c', TIME_SCRIPT, mode] + list(names))
+    elapsed, modules = output.decode('utf-8').split()
+    return float(elapsed), int(modules)
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+    parser = argparse.ArgumentParser(description='爬虫索引')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('index', help='重新生成索引')
+    timer = subparsers.add_parser('time', help='对比启动耗时')
+    timer.add_argument('spiders', nargs='*', help='要加载的爬虫，缺省时只列出爬虫(scrapy list)')
+    timer.add_argument('-n', '--repeat', type=int, default=3, help='每种方式启动的次数')
+    args = parser.parse_args(argv)
+    settings = get_project_settings()
+    if args.command == 'index':
+        path = data_path(settings.get('EPAPER_SPIDER_INDEX') or 'spider_index.json')
+        if os.path.exists(path):
+            os.remove(path)
+        loader = LazySpiderLoader(settings)
+        print('%s: %s 个爬虫' % (loader.path, len(loader.index)))
+    elif args.command == 'time':
+        # 先确保索引是最新的
+        LazySpiderLoader(settings)
+        print('%-8s %12s %10s' % ('方式', '耗时(ms)', '项目模块'))
+        for mode in ('default', 'lazy'):
+            results = [time_loader(mode, args.spiders) for _ in range(args.repeat)]
+            print('%-8s %12.1f %10d' % (mode, min(elapsed for elapsed, _ in results), results[0][1]))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
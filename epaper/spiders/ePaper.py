@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
 
+from ..extractors import NON_DIGIT, PARENTHESES, WHITESPACE, SelectorRegistry
+from ..frontier import get_frontier, lease_finishing
+from ..issues import IssueCalendar
 from ..items import EpaperItem
-from scrapy import Request
+from ..MysqlConn import Mysql
+from ..utils import format_date, get_table_name
+from scrapy import Request, signals
+from scrapy.exceptions import DontCloseSpider
 from scrapy.spiders import Spider
+from twisted.internet import defer, task, threads
 import datetime
+import logging
 import traceback
 from urllib import parse
-import re
+
+logger = logging.getLogger(__name__)
 
 
 def create_assist_date(datestart=None, dateend=None, add_day=1, sep=('-', '/')):
@@ -38,8 +47,231 @@ def create_assist_date(datestart=None, dateend=None, add_day=1, sep=('-', '/')):
     return date_list
 
 
+class EpaperSpider(Spider):
+    """
+    报刊爬虫基类
+    start_date/end_date 可以用 -a 参数指定: scrapy crawl xxx -a start_date=2019-01-01 -a end_date=20190131
+    增量模式(-a incremental=1 或 settings.py 中 EPAPER_INCREMENTAL = True): 从表中最新的 send_time
+    减去 EPAPER_INCREMENTAL_OVERLAP 天开始爬取到今天，表中没有数据时仍使用 start_date
+    共享队列(-a frontier=mysql 或 settings.py 中 EPAPER_FRONTIER): 日期范围加入 epaper_frontier 表，
+    start_requests 每次只爬取租用的一批日期，爬虫空闲时等待入库管道写完数据，再标记为完成并租用下一批，见 frontier.py；
+    共享队列的数据库操作都在线程中执行，不阻塞 reactor(常驻进程中同时运行的其他任务)
+    出版日历(settings.py 中 EPAPER_CALENDAR_ENABLED): 已知不出版的日期不再请求，见 issues.py
+    """
+    start_date = None
+    end_date = None
+    # 日期的间隔天数
+    add_day = 1
+    # 增量模式的 (overlap, end_date)，爬虫打开时读取表中最新的 send_time
+    incremental = None
+    # 预编译的 XPath 和快速提取方式，见 extractors.py
+    selectors = SelectorRegistry()
+    # 共享队列、当前租约和租用的日期
+    frontier = None
+    lease_id = None
+    leased_dates = None
+    # 正在完成租约/租用下一批
+    frontier_busy = False
+    # 出版日历；不出版的日期返回的状态码(404/410 以外)和错误页面中才有的 XPath，见 middlewares.IssueCalendarMiddleware
+    calendar = None
+    no_issue_codes = ()
+    no_issue_xpath = None
+
+    def __init__(self, *args, **kwargs):
+        super(EpaperSpider, self).__init__(*args, **kwargs)
+        # -a 参数传入的日期统一格式
+        for name in ('start_date', 'end_date'):
+            if name in kwargs:
+                value = format_date(kwargs[name])
+                if value is None:
+                    raise ValueError('%s 格式错误: %s' % (name, kwargs[name]))
+                setattr(self, name, value)
+        # -a frontier=xxx 在 from_crawler 中处理
+        self.frontier = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(EpaperSpider, cls).from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        incremental = kwargs.get('incremental')
+        if incremental is None:
+            incremental = settings.getbool('EPAPER_INCREMENTAL', False)
+        else:
+            incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        # 显式指定了 start_date 时不使用增量模式
+        if incremental and 'start_date' not in kwargs:
+            Mysql.initPool(settings=settings)
+            spider.incremental = (settings.getint('EPAPER_INCREMENTAL_OVERLAP', 2), kwargs.get('end_date'))
+        if settings.getbool('EPAPER_CALENDAR_ENABLED', False):
+            spider.calendar = IssueCalendar.from_settings(settings, spider.name)
+        frontier = get_frontier(settings, kwargs.get('frontier'), open_frontier=False)
+        if frontier is not None:
+            spider.set_frontier(crawler, frontier, settings.getint('EPAPER_FRONTIER_LEASE_DATES', 10))
+        crawler.signals.connect(spider.opened, signal=signals.spider_opened)
+        return spider
+
+    def set_frontier(self, crawler, frontier, lease_dates=10):
+        """
+        @summary: 使用共享队列，爬虫空闲时租用下一批日期，租约到期前续约
+        """
+        self.frontier = frontier
+        self.lease_size = lease_dates
+        self.renew_task = task.LoopingCall(self.renew_lease)
+        crawler.signals.connect(self.frontier_idle, signal=signals.spider_idle)
+        crawler.signals.connect(self.frontier_closed, signal=signals.spider_closed)
+
+    def get_dates(self, add_day=1, sep=('-', '/')):
+        """
+        @summary: 要爬取的日期列表，使用共享队列时为当前租用的日期，不包括出版日历中跳过的日期
+        @return: ['2019/01/04', ...]，格式与 create_assist_date 相同
+        """
+        if self.frontier is None:
+            dates = create_assist_date(datestart=self.start_date, dateend=self.end_date, add_day=add_day,
+                                       sep=('-', '-'))
+        else:
+            # 第一批在 frontier_opened 中租用
+            dates = self.leased_dates or []
+        if self.calendar is not None:
+            dates, skipped = self.calendar.filter_dates(dates)
+            if skipped:
+                logger.info('%s 按出版日历跳过 %s 个日期', self.name, skipped)
+                self.crawler.stats.inc_value('epaper/calendar_skipped', skipped)
+        fmt = '%Y{0}%m{1}%d'.format(sep[0], sep[1])
+        return [datetime.datetime.strptime(date, '%Y-%m-%d').strftime(fmt) for date in dates]
+
+    def opened(self, spider):
+        """
+        @summary: 爬虫打开时在线程中读取增量模式的开始日期、加入并租用共享队列的日期，不阻塞 reactor(常驻进程中的其他任务)；
+        start_requests 在这之后才执行
+        @return: Deferred，不需要访问数据库时为 None
+        """
+        if spider is not self or (self.incremental is None and self.frontier is None):
+            return None
+        d = defer.succeed(None)
+        if self.incremental is not None:
+            d.addCallback(lambda _: threads.deferToThread(self.set_incremental, *self.incremental))
+        if self.frontier is not None:
+            d.addCallback(self.frontier_opened)
+        return d
+
+    def frontier_opened(self, _):
+        """
+        @summary: 加入日期范围(已有的日期状态不变)并租用第一批
+        @return: Deferred
+        """
+        d = threads.deferToThread(self.seed)
+        d.addCallback(lambda _: threads.deferToThread(self.frontier.lease, self.name, self.lease_size))
+        d.addCallback(self.leased)
+        d.addCallback(self.start_renew)
+        return d
+
+    def start_renew(self, _):
+        # start 返回的 Deferred 在停止续约时才触发，不能返回给 spider_opened
+        self.renew_task.start(max(self.frontier.lease_seconds / 3.0, 1), now=False)
+
+    def seed(self):
+        self.frontier.open()
+        count = self.frontier.seed(self.name, create_assist_date(
+            datestart=self.start_date, dateend=self.end_date, add_day=self.add_day, sep=('-', '-')))
+        logger.info('%s 共享队列: 新加入 %s 个日期', self.name, count)
+
+    def leased(self, result):
+        self.lease_id, self.leased_dates = result
+        if self.leased_dates:
+            logger.info('%s 租用 %s 个日期: %s 至 %s', self.name, len(self.leased_dates), self.leased_dates[0],
+                        self.leased_dates[-1])
+
+    def renew_lease(self):
+        if not self.leased_dates:
+            return
+        d = threads.deferToThread(self.frontier.renew, self.lease_id)
+        d.addErrback(lambda failure: logger.warning('%s 续约失败: %s', self.name, failure.getErrorMessage()))
+        return d
+
+    def frontier_idle(self, spider):
+        """
+        @summary: 当前租用的日期的请求已全部完成，等待入库管道写完这些日期的数据后标记为完成，再租用下一批；
+        没有可租用的日期时爬虫结束
+        """
+        if spider is not self or self.leased_dates is None:
+            return
+        if self.frontier_busy:
+            raise DontCloseSpider
+        if not self.leased_dates:
+            return
+        self.frontier_busy = True
+        # 先写完缓存区和导入文件中的数据再标记为完成，否则进程崩溃时这些日期的数据丢失，日期也不会再被租用
+        d = self.crawler.signals.send_catch_log_deferred(signal=lease_finishing, spider=self)
+        d.addCallback(lambda _: threads.deferToThread(self.frontier.done, self.lease_id))
+        d.addCallback(self.lease_done)
+        d.addCallback(lambda _: threads.deferToThread(self.frontier.lease, self.name, self.lease_size))
+        d.addCallback(self.leased)
+        d.addCallback(self.crawl_leased)
+        # 失败时保留当前租约，下次空闲时重试
+        d.addErrback(lambda failure: logger.warning('%s 完成租约或租用下一批失败: %s', self.name,
+                                                    failure.getErrorMessage()))
+        d.addBoth(self.frontier_ready)
+        raise DontCloseSpider
+
+    def lease_done(self, _):
+        self.crawler.stats.inc_value('epaper/frontier_dates', len(self.leased_dates))
+
+    def crawl_leased(self, _):
+        for request in self.start_requests():
+            self.crawler.engine.crawl(request)
+
+    def frontier_ready(self, _):
+        self.frontier_busy = False
+
+    def frontier_closed(self, spider, reason):
+        if spider is not self:
+            return None
+        if self.renew_task.running:
+            self.renew_task.stop()
+        return threads.deferToThread(self.release)
+
+    def release(self):
+        try:
+            # 中途停止时未完成的日期立即归还，不必等租约到期
+            if self.lease_id is not None and self.frontier.release(self.lease_id):
+                logger.info('%s 归还未完成的日期: %s 至 %s', self.name, self.leased_dates[0], self.leased_dates[-1])
+        finally:
+            self.frontier.close()
+
+    def get_last_date(self):
+        """
+        @return: 表中最新的 send_time(2019-01-04 格式)，表中没有数据时为 None
+        """
+        mysql = Mysql()
+        try:
+            result = mysql.getOne("SELECT MAX(`send_time`) AS send_time FROM `%s`" % get_table_name(self.name))
+        finally:
+            mysql.dispose()
+        return format_date(result['send_time']) if result else None
+
+    def set_incremental(self, overlap=2, end_date=None):
+        """
+        @summary: 从表中最新的 send_time 减去 overlap 天开始爬取到今天
+        """
+        try:
+            last_date = self.get_last_date()
+        except BaseException as e:
+            logger.warning('%s 读取最新的 send_time 失败，爬取全部日期: %s', self.name, e.args)
+            return
+        today = datetime.datetime.now().strftime('%Y-%m-%d')
+        self.end_date = format_date(end_date) or today
+        if last_date is None:
+            logger.info('%s 表中没有数据，从 %s 开始爬取', self.name, self.start_date)
+            return
+        start = datetime.datetime.strptime(last_date, '%Y-%m-%d') - datetime.timedelta(days=overlap)
+        self.start_date = max(start.strftime('%Y-%m-%d'), self.start_date or '')
+        if self.start_date > self.end_date:
+            self.start_date = self.end_date
+        logger.info('%s 增量爬取: 表中最新 %s，爬取 %s 至 %s', self.name, last_date, self.start_date, self.end_date)
+
+
 # 光明日报（2008-2019）
-class GMRBSpider(Spider):
+class GMRBSpider(EpaperSpider):
     name = 'GMRBpaper'
     allowed_domains = ['epaper.gmw.cn']
     start_date = '2008-01-01'
@@ -50,13 +282,13 @@ class GMRBSpider(Spider):
     # 生成不同日期的链接
     def start_requests(self):
         # 新闻页码 示例链接：http://epaper.gmw.cn/gmrb/html/2019-01/04/nbs.D110000gmrb_02.htm#
-        for date in create_assist_date(datestart=self.start_date, dateend=self.end_date):
+        for date in self.get_dates():
             yield Request('http://epaper.gmw.cn/gmrb/html/{0}/nbs.D110000gmrb_01.htm'.format(date))
 
     # 解析版面目录
     def parse(self, response):
 
-        page_data = response.xpath('//*[@id="pageLink"]/@href').extract()
+        page_data = self.selectors.extract(response, '//*[@id="pageLink"]/@href')
         for page in page_data:
             base_url = str(response.url).rsplit('nbs')[0]
             cur_page_url = base_url + page
@@ -64,7 +296,7 @@ class GMRBSpider(Spider):
 
     # 解析左侧链接
     def parse_left_url(self, response):
-        article_urls = response.xpath('//*[@id="titleList"]/ul/li/a/@href').extract()
+        article_urls = self.selectors.extract(response, '//*[@id="titleList"]/ul/li/a/@href')
         for url in article_urls:
             content_url = response.meta['base_url'] + url
             yield Request(content_url, callback=self.parse_content)
@@ -74,11 +306,11 @@ class GMRBSpider(Spider):
         item = EpaperItem()
 
         try:
-            title = response.xpath("/html/body/div[6]/div[2]/div[3]/div/h1/text()").extract_first()
-            p_list = response.xpath('//*[@id="articleContent"]/p//text()').extract()
+            title = self.selectors.extract_first(response, "/html/body/div[6]/div[2]/div[3]/div/h1/text()")
+            p_list = self.selectors.extract(response, '//*[@id="articleContent"]/p//text()')
             content = "\n".join(p_list).replace('\xa0', '')  # 替换原文中的空格(&nbsp)
             if len(content) == 0:
-                div_list = response.xpath('//*[@id="articleContent"]//text()').extract()
+                div_list = self.selectors.extract(response, '//*[@id="articleContent"]//text()')
                 content = "\n".join(div_list).replace('\xa0', '')
 
             item['title'] = title
@@ -95,7 +327,7 @@ class GMRBSpider(Spider):
 
 
 # 人民日报（2018-2019）
-class RMRBSpider(Spider):
+class RMRBSpider(EpaperSpider):
     name = 'RMRBpaper'
     allowed_domains = ['paper.people.com.cn']
     start_date = '2018-01-01'
@@ -106,13 +338,13 @@ class RMRBSpider(Spider):
     # 生成不同日期的链接
     def start_requests(self):
         # 新闻页码 示例链接：http://epaper.gmw.cn/gmrb/html/2019-01/04/nbs.D110000gmrb_02.htm#
-        for date in create_assist_date(datestart=self.start_date, dateend=self.end_date):
+        for date in self.get_dates():
             yield Request('http://paper.people.com.cn/rmrb/html/{0}/nbs.D110000renmrb_01.htm'.format(date))
 
     # 解析版面目录
     def parse(self, response):
 
-        page_data = response.xpath('//*[@id="pageLink"]/@href').extract()
+        page_data = self.selectors.extract(response, '//*[@id="pageLink"]/@href')
         for page in page_data:
             base_url = str(response.url).rsplit('nbs')[0]
             cur_page_url = base_url + page
@@ -120,7 +352,7 @@ class RMRBSpider(Spider):
 
     # 解析左侧链接
     def parse_left_url(self, response):
-        article_urls = response.xpath('//*[@id="titleList"]/ul/li/a/@href').extract()
+        article_urls = self.selectors.extract(response, '//*[@id="titleList"]/ul/li/a/@href')
         for url in article_urls:
             content_url = response.meta['base_url'] + url
             yield Request(content_url, callback=self.parse_content)
@@ -130,11 +362,11 @@ class RMRBSpider(Spider):
         item = EpaperItem()
 
         try:
-            title = response.xpath("/html/body/div[1]/div/div[2]/div[4]/div/h1/text()").extract_first()
-            p_list = response.xpath('//*[@id="articleContent"]/p//text()').extract()
+            title = self.selectors.extract_first(response, "/html/body/div[1]/div/div[2]/div[4]/div/h1/text()")
+            p_list = self.selectors.extract(response, '//*[@id="articleContent"]/p//text()')
             content = "\n".join(p_list).replace('\xa0', '')  # 替换原文中的空格(&nbsp)
             if len(content) == 0:
-                div_list = response.xpath('//*[@id="articleContent"]//text()').extract()
+                div_list = self.selectors.extract(response, '//*[@id="articleContent"]//text()')
                 content = "\n".join(div_list).replace('\xa0', '')
 
             item['title'] = title
@@ -151,7 +383,7 @@ class RMRBSpider(Spider):
 
 
 # 北京晚报（2017-2019）
-class BJSpider(Spider):
+class BJSpider(EpaperSpider):
     # http://bjwb.bjd.com.cn/html/2019-01/08/node_113.htm
     # http://bjwb.bjd.com.cn/html/2019-01/01/content_570345.htm
     name = 'BJSpider'
@@ -161,34 +393,34 @@ class BJSpider(Spider):
     # 生成不同日期的链接
     def start_requests(self):
         # 新闻页码 示例链接：http://epaper.gmw.cn/gmrb/html/2019-01/04/nbs.D110000gmrb_02.htm#
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
+        date_list = self.get_dates()
         for date in date_list:
             yield Request('http://bjwb.bjd.com.cn/html/{0}/node_113.htm'.format(date), dont_filter=True)
 
     # 解析不同版面
     def parse(self, response):
-        res = response.xpath('//div[@class="hidenPage"]/li/a/@href').extract()
-        res_lable = response.xpath('//div[@class="hidenPage"]/li/a/text()').extract()
+        res = self.selectors.extract(response, '//div[@class="hidenPage"]/li/a/@href')
+        res_lable = self.selectors.extract(response, '//div[@class="hidenPage"]/li/a/text()')
         for index, tmp in enumerate(res):
             url = parse.urljoin(response.url, tmp)
-            lable = re.sub('\(.*?\)', '', res_lable[index])
+            lable = PARENTHESES.sub('', res_lable[index])
             yield Request(url, callback=self.parse_layout, dont_filter=True, meta={'lable': lable})
 
     def parse_layout(self, response):
-        res = response.xpath('//*[@id="list"]/div[2]/ul/li/h2/a/@href').extract()
+        res = self.selectors.extract(response, '//*[@id="list"]/div[2]/ul/li/h2/a/@href')
         for index, tmp in enumerate(res):
             url = parse.urljoin(response.url, tmp)
             yield Request(url, callback=self.parse_content, dont_filter=True, meta=response.meta)
 
     def parse_content(self, response):
-        content_list = response.xpath('//div[@class="text"]//text()').extract()
+        content_list = self.selectors.extract(response, '//div[@class="text"]//text()')
         content = "\n".join(content_list).replace('\xa0', '').strip()
 
-        title_list = response.xpath('//*[@id="list"]/div/h2/text()|//*[@id="list"]/div/h1/text()').extract()
+        title_list = self.selectors.extract(response, '//*[@id="list"]/div/h2/text()|//*[@id="list"]/div/h1/text()')
         title = ''.join(title_list).strip().replace('\r\n', '').replace('\t', '').replace('\r', '')
 
-        day = ''.join(response.xpath('//*[@id="list"]/div/div[1]/span[2]/text()').extract()).strip()
-        day = re.sub(re.compile('\D'), '', day)
+        day = ''.join(self.selectors.extract(response, '//*[@id="list"]/div/div[1]/span[2]/text()')).strip()
+        day = NON_DIGIT.sub('', day)
 
         item = EpaperItem()
         item['title'] = title
@@ -204,7 +436,7 @@ class BJSpider(Spider):
 
 
 # 新京报
-class BjnewsSpider(Spider):
+class BjnewsSpider(EpaperSpider):
     name = 'bjnews'
     allowed_domains = ['epaper.bjnews.com.cn']
 
@@ -212,29 +444,29 @@ class BjnewsSpider(Spider):
     end_date = '2019-02-23'
 
     def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
+        date_list = self.get_dates()
         for date in date_list:
             yield Request('http://epaper.bjnews.com.cn/html/{0}/node_1.htm'.format(date), dont_filter=True)
 
     # 解析版面
     def parse(self, response):
-        link_list = response.xpath('//*[@id="pageLink"]/@href').extract()
+        link_list = self.selectors.extract(response, '//*[@id="pageLink"]/@href')
         for link in link_list:
             new_url = parse.urljoin(response.url, link)
             yield Request(new_url, callback=self.parse_layout, dont_filter=True)
 
     def parse_layout(self, response):
-        news_link_list = response.xpath('//area/@href').extract()
+        news_link_list = self.selectors.extract(response, '//area/@href')
         for news_link in news_link_list:
             news_link = str(parse.urljoin(response.url, news_link)).split('?')[0]
             yield Request(news_link, callback=self.parse_content)
 
     # 解析内容
     def parse_content(self, response):
-        title = response.xpath('/html/body/div[2]/div[2]/h1/text()').extract_first()
-        content_list = response.xpath('//founder-content//text()').extract()
+        title = self.selectors.extract_first(response, '/html/body/div[2]/div[2]/h1/text()')
+        content_list = self.selectors.extract(response, '//founder-content//text()')
         content = ''.join(content_list).strip()
-        day = re.sub(re.compile('\D'), '', str(response.url).rsplit('_')[0])
+        day = NON_DIGIT.sub('', str(response.url).rsplit('_')[0])
 
         if title and content and len(title) > 0 and len(content) > 100:
             item = EpaperItem()
@@ -248,26 +480,26 @@ class BjnewsSpider(Spider):
 
 
 # 新民晚报(分词中)
-class XmwbSpider(Spider):
+class XmwbSpider(EpaperSpider):
     name = 'xmwb'
     allowed_domains = ['xmwb.xinmin.cn']
     start_date = '2012-01-01'
     end_date = '2019-02-25'
 
     def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
+        date_list = self.get_dates()
         for date in date_list:
             yield Request('http://xmwb.xinmin.cn/html/{0}/node_1.htm'.format(date), dont_filter=True)
 
     # 解析不同的版面
     def parse(self, response):
-        link_list = response.xpath('//td[@class="default"]/a[@id="pageLink"]/@href').extract()
+        link_list = self.selectors.extract(response, '//td[@class="default"]/a[@id="pageLink"]/@href')
         for link in link_list:
             new_link = parse.urljoin(response.url, link)
             yield Request(new_link, callback=self.parsr_layout, dont_filter=True)
 
     def parsr_layout(self, response):
-        news_link_list = response.xpath('//*[@id="main-ed-articlenav-list"]/table//a/@href').extract()
+        news_link_list = self.selectors.extract(response, '//*[@id="main-ed-articlenav-list"]/table//a/@href')
         for news_link in news_link_list:
             content_link = parse.urljoin(response.url, news_link)
             # 当为报头版面时，不进行任何处理
@@ -277,12 +509,12 @@ class XmwbSpider(Spider):
     # 解析内容
     def parse_cotent(self, response):
         # print(response.url)
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
+        day = NON_DIGIT.sub('', str(response.url))[:8]
         try:
-            title = response.xpath('//*[@id="article-title"]/founder-title/text()').extract()[1]
+            title = self.selectors.extract(response, '//*[@id="article-title"]/founder-title/text()')[1]
         except BaseException as e:
             title = ''
-        content_list = response.xpath('//*[@id="ozoom"]//text()').extract()
+        content_list = self.selectors.extract(response, '//*[@id="ozoom"]//text()')
         content = ''.join(content_list).strip()
         # 特殊版面(广告、本报信息) 不处理
         if title and content and len(title) > 0 and len(content) > 100 and title not in ['广告', '本报信息']:
@@ -297,14 +529,14 @@ class XmwbSpider(Spider):
 
 
 # 羊城晚报
-class YcwbSpider(Spider):
+class YcwbSpider(EpaperSpider):
     name = 'ycwb'
     allowed_domains = ['ep.ycwb.com']
     start_date = '2017-01-01'
     end_date = '2019-02-24'
 
     def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
+        date_list = self.get_dates()
         for date in date_list:
             yield Request('http://ep.ycwb.com/epaper/ycwb/html/{0}/index.htm'.format(date), dont_filter=True)
 
@@ -320,19 +552,19 @@ class YcwbSpider(Spider):
                 yield Request(new_link, callback=self.parse_layout, dont_filter=True)
 
     def parse_layout(self, response):
-        news_link_list = response.xpath('//*[@id="list"]/div[2]/ul/li/h2/a/@href').extract()
+        news_link_list = self.selectors.extract(response, '//*[@id="list"]/div[2]/ul/li/h2/a/@href')
         for news_link in news_link_list:
             news_link = parse.urljoin(response.url, news_link)
             yield Request(news_link, callback=self.parse_cotent, dont_filter=True)
 
     def parse_cotent(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url).rsplit('_')[0])
-        title = response.xpath('//*[@id="list"]/div/h1/text()').extract_first()
+        day = NON_DIGIT.sub('', str(response.url).rsplit('_')[0])
+        title = self.selectors.extract_first(response, '//*[@id="list"]/div/h1/text()')
 
-        content_list = response.xpath('//*[@id="list"]/div/div[2]/p/text()').extract()
+        content_list = self.selectors.extract(response, '//*[@id="list"]/div/div[2]/p/text()')
         content = ''.join(content_list[0:-1]).strip()
 
-        epaper_type = response.xpath('//*[@id="list"]/div/div[1]/span[1]/text()').extract_first()
+        epaper_type = self.selectors.extract_first(response, '//*[@id="list"]/div/div[1]/span[1]/text()')
         if epaper_type:
             cType = epaper_type[3:]
         else:
@@ -350,1522 +582,47 @@ class YcwbSpider(Spider):
             yield item
 
 
-# 经济日报
-class JjrbSpider(Spider):
-    name = 'jjrb'
-    allowed_domains = ['paper.ce.cn']
-    # http://paper.ce.cn/jjrb/html/2008-01/27/node_2.htm#
-    start_date = '2008-01-27'
-    end_date = '2019-02-24'
-    # end_date = '2008-02-27'
-    handle_httpstatus_list = [404]
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            yield Request('http://paper.ce.cn/jjrb/html/{0}/node_2.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//td[@class="default"]/a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        # print(response.url, '-----')
-        news_link_list = response.xpath('//td[@class="default"]/a[starts-with(@href,"content_")]/@href').extract()
-        # print(news_link_list)
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            # print(url)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//td[@class="STYLE32"]//td[@class="font01"]/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        # 特殊版面(广告、本报信息) 不处理
-        if title and content and len(title) > 0 and len(content) > 100 and title not in ['广告', '本报信息']:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '经济日报'
-            item['send_time'] = day
-            yield item
-
-
-# 证券时报
-# 4个不同的日期分隔点 网页布局不同
-# http://epaper.stcn.com/paper/zqsb/html/2008-05/14/node_2.htm 左侧栏
-# http://epaper.stcn.com/paper/zqsb/html/2011-01/04/node_2.htm  弹窗
-# http://epaper.stcn.com/paper/zqsb/html/2012-02/07/node_2.htm  #  点击跳转链接
-# http://epaper.stcn.com/paper/zqsb/html/2016-07/22/node_2.htm  #  点击弹窗--更新版
-class ZqsbSpider(Spider):
-    name = 'zqsb'
-    allowed_domains = ['epaper.stcn.com']
-    custom_settings = {
-        'REDIRECT_ENABLED': False,
-    }
-    # start_date = '2016-07-22'
-    start_date = '2008-05-14'
-    end_date = '2019-02-24'
-
-    # end_date = '2016-07-22'
-
-    def opinion_date(self, url):
-        date = int(re.sub(re.compile('\D'), '', url[39:50]))
-        if date < 20110104:
-            return 1
-        elif date < 20120207:
-            return 2
-        elif date < 20160722:
-            return 3
-        else:
-            return 4
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            url = 'http://epaper.stcn.com/paper/zqsb/html/{0}/node_2.htm'.format(date)
-            type = self.opinion_date(url)
-            yield Request(url, dont_filter=True, meta={'type': type})
-
-    def parse(self, response):
-        ctype = int(response.meta['type'])
-        if ctype == 1:
-            model_links = response.xpath('//td[@class="default"]/a[@id="pageLink"]/@href').extract()
-        elif ctype == 2 or ctype == 3:
-            # 该类型 可直接获取到内容链接
-            content_links = response.xpath('//div[@id="listWrap"]/div/ul/li/a/@href').extract()
-            for link in content_links:
-                url = parse.urljoin(response.url, link)
-                yield Request(url, callback=self.parse_content, dont_filter=True, meta=response.meta)
-            model_links = []
-        elif ctype == 4:
-            content_links = response.xpath('//*[@id="webtree"]/dl/dd/ul/li/a/@href').extract()
-            for link in content_links:
-                url = parse.urljoin(response.url, link)
-                yield Request(url, callback=self.parse_content, dont_filter=True, meta=response.meta)
-            model_links = []
-        else:
-            model_links = []
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True, meta=response.meta)
-
-    def parse_layout(self, response):
-        ctype = int(response.meta['type'])
-        if ctype == 1:
-            news_link_list = response.xpath('//td[@class="default"]/a[starts-with(@href,"content_")]/@href').extract()
-            for link in news_link_list:
-                url = parse.urljoin(response.url, link)
-                yield Request(url, callback=self.parse_content, dont_filter=True, meta=response.meta)
-
-    def parse_content(self, response):
-        ctype = int(response.meta['type'])
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        if ctype == 1:
-            title = response.xpath('//td[@class="font01"]/strong/text()').extract_first()
-            content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-            content = ''.join(content_list).strip()
-        elif ctype == 2 or ctype == 3:
-            title = response.xpath('//*[@id="mainTiile"]/h2/text()').extract_first()
-            content_list = response.xpath('//div[@id="mainCon"]/div/founder-content//text()').extract()
-            content = ''.join(content_list).strip()
-        elif ctype == 4:
-            title = response.xpath('/html/body/div[1]/p/text()').extract_first()
-            content_list = response.xpath('/html/body/div[2]/div/founder-content//text()').extract()
-            content = ''.join(content_list).strip()
-        else:
-            title, content = '', ''
-        if title and title not in ['导读', '今日导读', '特别提示', '今日公告导读'] and content and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '证券时报'
-            item['send_time'] = day
-            yield item
-
-
-# 扬子晚报
-class YzwbSpider(Spider):
-    name = 'yzwb'
-    allowed_domains = ['epaper.yzwb.net']
-    # http://epaper.yzwb.net/html_t/2012-06/14/node_1.htm
-    start_date = '2012-06-14'
-    end_date = '2019-02-25'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            yield Request('http://epaper.yzwb.net/html_t/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="navigation"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//*[starts-with(@id,"mp")]/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//td[@class="title1"]/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '扬子晚报'
-            item['send_time'] = day
-            yield item
-
-
-# 人民日报海外版
-class Rmrb_hw(Spider):
-    name = 'rmrb_hw'
-    # http://paper.people.com.cn/rmrbhwb/html/2014-07/09/node_865.htm
-    allowed_domains = ['paper.people.com.cn']
-    # start_date = '2008-06-12'
-    start_date = '2008-06-12'
-    # end_date = '2019-02-25'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/rmrbhwb/html/{0}/node_865.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '人民日报海外版'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 国际金融报
-class GjjrbSpider(Spider):
-    name = 'gjjrb'
-    # http://paper.people.com.cn/gjjrb/html/2019-02/18/node_645.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2008-06-16'
-    end_date = '2019-02-25'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/gjjrb/html/{0}/node_645.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '国际金融报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中国能源报
-class ZgnybSpider(Spider):
-    name = 'zgnyb'
-    # http://paper.people.com.cn/zgnyb/html/2009-04/06/node_2222.htm#
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2009-04-06'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/zgnyb/html/{0}/node_2222.htm#'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '中国能源报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 健康时报
-class JksbSpider(Spider):
-    name = 'jksb'
-    # http://paper.people.com.cn/jksb/html/2008-06/16/node_811.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2008-06-16'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/jksb/html/{0}/node_811.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '健康时报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 讽刺与幽默
-class FcyymSpider(Spider):
-    name = 'fcyym'
-    # http://paper.people.com.cn/fcyym/html/2012-03/09/node_841.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2012-03-09'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/fcyym/html/{0}/node_841.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '讽刺与幽默'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中国城市报
-class ZgcsSpider(Spider):
-    name = 'zgcs'
-    # http://paper.people.com.cn/zgcsb/html/2015-02/02/node_2591.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2015-02-02'
-    end_date = '2019-02-26'
+# ----------------------------------------------------------------------------------------
+# 南方都市报
+class NfdsbSpider(EpaperSpider):
+    name = 'nfdsb'
+    start_date = '2017-10-16'
+    # end_date = '2017-10-16'
+    # start_date = '2019-02-28'
+    end_date = '2019-02-28'
 
     def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
+        date_list = self.get_dates()
         for date in date_list:
-            yield Request('http://paper.people.com.cn/zgcsb/html/{0}/node_2591.htm'.format(date), dont_filter=True)
+            # 生成起始链接
+            yield Request('http://epaper.oeeee.com/epaper/A/html/{0}/index.htm'.format(date), dont_filter=True)
 
     def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
+        model_links = self.selectors.extract(response, '//div[@class="shortcutbox"]/ul/li[1]/div/ul/li/a/@href')
         for link in model_links:
-            url = parse.urljoin(response.url, link)
+            url = response.urljoin(link)
             yield Request(url, callback=self.parse_layout, dont_filter=True)
 
     def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
+        news_link_list = self.selectors.extract(response, '//div[@class="main-list"]//a/@href')
         for link in news_link_list:
-            url = parse.urljoin(response.url, link)
+            url = response.urljoin(link)
             yield Request(url, callback=self.parse_content, dont_filter=True)
 
     def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
+        day = NON_DIGIT.sub('', str(response.url))[:8]
+        # 旧版
+        title = self.selectors.extract_first(response, '//div[@class="article"]/h1/text()')
+        content_list = self.selectors.extract(response, '//div[@class="text"]//text()')
         content = ''.join(content_list).strip()
+        content = WHITESPACE.sub(' ', str(content))
         if title and content and len(title) > 0 and len(content) > 100:
             item = EpaperItem()
             item['title'] = title
             item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             item['content'] = content
             item['href'] = response.url
-            item['cType'] = '中国城市报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# ---------------------------------------------------------------
-
-# 新闻战线
-class XwzxSpider(Spider):
-    name = 'xwzx'
-    # http://paper.people.com.cn/xwzx/html/2007-12/10/node_922.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2007-12-02'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/xwzx/html/{0}/node_922.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '新闻战线'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 环球人物
-class HqrwSpider(Spider):
-    name = 'hqrw'
-    # http://paper.people.com.cn/hqrw/html/2011-10/26/node_1122.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2011-10-26'
-    end_date = '2019-02-26'
-
-    # end_date = '2011-12-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/hqrw/html/{0}/node_1122.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '环球人物'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 人民论坛
-class RmltSpider(Spider):
-    name = 'rmlt'
-    # http://paper.people.com.cn/rmlt/html/2018-03/11/node_1222.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2018-03-11'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/rmlt/html/{0}/node_1222.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '人民论坛'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 人民周刊
-class RmzkSpider(Spider):
-    name = 'rmzk'
-    # http://paper.people.com.cn/rmzk/html/2015-08/01/node_2651.htm#
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2015-08-01'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/rmzk/html/{0}/node_2651.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '人民周刊'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中国经济周刊
-class ZgjjzkSpider(Spider):
-    name = 'zgjjzk'
-    # http://paper.people.com.cn/zgjjzk/html/2009-01/05/node_1422.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2009-01-05'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/zgjjzk/html/{0}/node_1422.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '中国经济周刊'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 新安全
-class XaqSpider(Spider):
-    name = 'xaq'
-    # http://paper.people.com.cn/xaq/html/2012-01/02/node_2262.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2012-01-02'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/xaq/html/{0}/node_2262.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '新安全'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 民生周刊
-class MszkSpider(Spider):
-    name = 'mszk'
-    # http://paper.people.com.cn/mszk/html/2010-09/20/node_1622.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2010-09-20'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/mszk/html/{0}/node_1622.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '民生周刊'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中国报业
-class ZgbySpider(Spider):
-    name = 'zgby'
-    # http://paper.people.com.cn/zgby/html/2015-08/15/node_2751.htm
-    allowed_domains = ['paper.people.com.cn']
-    start_date = '2015-08-15'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            yield Request('http://paper.people.com.cn/zgby/html/{0}/node_2751.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@id="titleList"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="text_c"]/h1/text()').extract_first()
-
-        content_list = response.xpath('//div[@id="ozoom"]//p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '中国报业'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# ----------------------------------------------
-
-# 深圳特区报
-class SztqbSpider(Spider):
-    name = 'sztqb'
-    # http://sztqb.sznews.com/PC/layout/201705/01/colA01.html
-    allowed_domains = ['sztqb.sznews.com']
-    start_date = '2018-05-01'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://sztqb.sznews.com/PC/layout/201803/21/colA01.html
-            # http://sztqb.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://sztqb.sznews.com/PC/layout/{0}/colA01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://sztqb.sznews.com/PC/layout/{0}/node_A01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '深圳特区报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 深圳商报
-class SzsbSpider(Spider):
-    name = 'szsb'
-    allowed_domains = ['szsb.sznews.com']
-    start_date = '2017-05-01'
-    end_date = '2019-02-26'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://szsb.sznews.com/PC/layout/201803/21/colA01.html
-            # http://szsb.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://szsb.sznews.com/PC/layout/{0}/colA01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://szsb.sznews.com/PC/layout/{0}/node_A01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '深圳商报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 深圳晚报
-class SzwbSpider(Spider):
-    name = 'szwb'
-    allowed_domains = ['wb.sznews.com']
-    start_date = '2017-05-02'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://wb.sznews.com/PC/layout/201803/21/colA01.html
-            # http://wb.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://wb.sznews.com/PC/layout/{0}/colA01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://wb.sznews.com/PC/layout/{0}/node_A01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '深圳晚报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 晶报
-class JbSpider(Spider):
-    name = 'jb'
-    # http://jb.sznews.com/PC/layout/201705/02/colA01.html
-    allowed_domains = ['wb.sznews.com']
-    start_date = '2017-05-02'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://jb.sznews.com/PC/layout/201803/21/colA01.html
-            # http://jb.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://jb.sznews.com/PC/layout/{0}/colA01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://jb.sznews.com/PC/layout/{0}/node_A01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '晶报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 深圳教育时报
-class SzjySpider(Spider):
-    name = 'szjy'
-    # http://szjy.sznews.com/PC/layout/201706/02/col01.html
-    allowed_domains = ['szjy.sznews.com']
-    start_date = '2016-06-02'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://szjy.sznews.com/PC/layout/201803/21/colA01.html
-            # http://szjy.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://szjy.sznews.com/PC/layout/{0}/col01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://szjy.sznews.com/PC/layout/{0}/node_01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '深圳教育'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 宝安日报
-class BarbSpider(Spider):
-    name = 'barb'
-    # http://barb.sznews.com/PC/layout/201706/01/colA01.html
-    allowed_domains = ['barb.sznews.com']
-    start_date = '2017-06-01'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', '/'))
-
-        for date in date_list:
-            # http://barb.sznews.com/PC/layout/201803/21/colA01.html
-            # http://barb.sznews.com/PC/layout/201803/22/node_A01.html
-            # 不同日期的起始链接不同
-            if int(re.sub(re.compile(r'\D+'), '', date)) < 20180322:
-                yield Request('http://barb.sznews.com/PC/layout/{0}/colA01.html'.format(date), dont_filter=True)
-            else:
-                yield Request('http://barb.sznews.com/PC/layout/{0}/node_A01.html'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="Therestlist"]/ul/li/a[not(@class="restmask")]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            if not str(url).endswith('.pdf'):
-                yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="newslist"]/ul/li/h3/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//*[@id="ScroLeft"]/div[1]/h3/text()').extract_first()
-
-        content_list = response.xpath('//*[@id="ScroLeft"]/div[2]/founder-content/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100 and '广告' not in title:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '宝安日报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# -----------------------------
-# 今晚报
-class JwbSpider(Spider):
-    name = 'jwb'
-    # http://epaper.jwb.com.cn/jwb/html/2015-06/08/node_1.htm
-    allowed_domains = ['epaper.jwb.com.cn']
-    start_date = '2015-06-08'
-    # end_date = '2015-06-08'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.jwb.com.cn/jwb/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = str(response.xpath('//p[@class="BSHARE_TEXT"]/text()').extract_first()).strip().replace('\n', ' ')
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '今晚报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 渤海早报
-class BhzbSpider(Spider):
-    name = 'bhzb'
-    # http://epaper.jwb.com.cn/bhzb/html/2015-07/13/node_1.htm
-    allowed_domains = ['epaper.jwb.com.cn']
-    start_date = '2015-07-13'
-    # end_date = '2015-07-13'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.jwb.com.cn/bhzb/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = str(response.xpath('//p[@class="BSHARE_TEXT"]/text()').extract_first()).strip().replace('\n', ' ')
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '渤海早报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 今晚经济周报
-class JwjjzbSpider(Spider):
-    name = 'jwjjzb'
-    # http://epaper.jwb.com.cn/jwjjzb/html/2015-07/10/node_1.htm
-    allowed_domains = ['epaper.jwb.com.cn']
-    start_date = '2015-07-10'
-    # end_date = '2015-07-10'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.jwb.com.cn/jwjjzb/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = str(response.xpath('//p[@class="BSHARE_TEXT"]/text()').extract_first()).strip().replace('\n', ' ')
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '今晚经济周刊'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中老年时报
-class ZlnsbSpider(Spider):
-    name = 'zlnsb'
-    # http://epaper.jwb.com.cn/zlnsb/html/2015-09/14/node_1.htm
-    allowed_domains = ['epaper.jwb.com.cn']
-    start_date = '2015-09-14'
-    # end_date = '2015-07-10'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.jwb.com.cn/zlnsb/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = str(response.xpath('//p[@class="BSHARE_TEXT"]/text()').extract_first()).strip().replace('\n', ' ')
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '中老年时报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# 中国技术市场报
-class ZgjsscbSpider(Spider):
-    name = 'zgjsscb'
-    # http://epaper.jwb.com.cn/zgjsscb/html/2015-08/21/node_1.htm
-    allowed_domains = ['epaper.jwb.com.cn']
-    start_date = '2015-08-21'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.jwb.com.cn/zgjsscb/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//*[@id="bmdhTable"]/tbody/tr/td/a[@class="rigth_bmdh_href"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//tr[@class="wzlb_tr"]/td[@class="default"]/div/a/@href').extract()
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = str(response.xpath('//p[@class="BSHARE_TEXT"]/text()').extract_first()).strip().replace('\n', ' ')
-        content_list = response.xpath('//div[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '中国技术市场报'
-            item['send_time'] = day
-            # print(title, response.url, content)
-            yield item
-
-
-# ----------------------------------------------------------------------------------------
-# 南方日报
-# 已知的有2种网页布局，因不确定是哪一天网页布局更改，故写了2种xpath路径
-class NfrbSpider(Spider):
-    name = 'nfrb'
-    allowed_domains = ['epaper.southcn.com']
-    # start_date = '2010-05-20'
-    # end_date = '2010-05-20'
-    start_date = '2007-12-01'
-    end_date = '2019-02-27'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.southcn.com/nfdaily/html/{0}/node_2.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        # 直接处理新闻链接 http://epaper.southcn.com/nfdaily/html/2017-03/09/node_2.htm
-        news_links = response.xpath('//*[@id="mCSB_4"]/div[1]/ul/li/div/a/@href').extract()
-        if len(news_links) > 0:
-            for link in news_links:
-                url = parse.urljoin(response.url, link)
-                yield Request(url, callback=self.parse_content, dont_filter=True)
-        else:
-            # 解析不同版面，再处理新闻
-            model_links = response.xpath('//td[@class="default"]/a[@id="pageLink" or @id="pagelink"]/@href').extract()
-            for link in model_links:
-                url = parse.urljoin(response.url, link)
-                yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        # 2个xpath路径，可提取网站改版前后的新闻链接地址
-        news_link_list = response.xpath('//td[@class="default"]/a[starts-with(@href,"content_")]/@href').extract()  # 旧版
-        if len(news_link_list) == 0:
-            news_link_list = response.xpath('//*[@id="artPList1"]/li/a/@href').extract()  # 新版
-
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        # 旧版
-        title = response.xpath('//td[@class="font01"]/text()').extract_first()
-        content_list = response.xpath('//*[@id="ozoom"]//text()').extract()
-        content = ''.join(content_list).strip()
-        content = re.sub(re.compile(r'\s'), ' ', str(content))
-        if title is None:
-            # 新版
-            title = response.xpath('//div[@id="print_area"]/h1/text()').extract_first()
-            content_list = response.xpath('//*[@id="content"]//text()').extract()
-            content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '南方日报'
-            item['send_time'] = day
-            # print(title, day, response.url, content, '----------------------')
-            yield item
-
-
-# 成都商报
-class CdsbSpider(Spider):
-    name = 'cdsb'
-    start_date = '2012-05-01'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, add_day=90)
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://e.chengdu.cn/html/{0}/node_2.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//a[@id="pageLink"]/@href').extract()
-        for link in model_links:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        # 旧版
-        news_link_list = response.xpath('//div[@class="sidebar-content"]/ul/li/a/@href').extract()
-        if len(news_link_list) == 0:
-            # 新版
-            news_link_list = response.xpath('//*[@id="nowPageArticleList"]/li/a/@href').extract()
-
-        for link in news_link_list:
-            url = parse.urljoin(response.url, link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        # 旧版 和 新版 的xpath路径相同
-        title = response.xpath('//div[@class="content-title"]/h4/text()').extract_first()
-        content_list = response.xpath('//td[@class="xilan_content_tt"]//text()').extract()
-        content = ''.join(content_list).strip()
-
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '成都商报'
-            item['send_time'] = day
-            # print(title, day, content)
-            yield item
-
-
-# 南方都市报
-class NfdsbSpider(Spider):
-    name = 'nfdsb'
-    start_date = '2017-10-16'
-    # end_date = '2017-10-16'
-    # start_date = '2019-02-28'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.oeeee.com/epaper/A/html/{0}/index.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="shortcutbox"]/ul/li[1]/div/ul/li/a/@href').extract()
-        for link in model_links:
-            url = response.urljoin(link)
-            yield Request(url, callback=self.parse_layout, dont_filter=True)
-
-    def parse_layout(self, response):
-        news_link_list = response.xpath('//div[@class="main-list"]//a/@href').extract()
-        for link in news_link_list:
-            url = response.urljoin(link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        # 旧版
-        title = response.xpath('//div[@class="article"]/h1/text()').extract_first()
-        content_list = response.xpath('//div[@class="text"]//text()').extract()
-        content = ''.join(content_list).strip()
-        content = re.sub(re.compile(r'\s'), ' ', str(content))
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '南方都市报'
+            item['cType'] = '南方都市报'
             item['send_time'] = day
             print(title, day, response.url, content, '--------------------')
             # yield item
-
-
-# 南方农村报
-class NfncSpider(Spider):
-    name = 'nfnc'
-    start_date = '2017-05-18'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date, sep=('', ''))
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.nfncb.cn/nfnc/content/{0}/Page01TB.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//ul[@class="ul_1"]/li/a/@href').extract()
-        for link in model_links:
-            url = response.urljoin(link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//div[@class="news_title"]/h1/text()').extract_first()
-        content_list = response.xpath('//div[@class="contenttext"]//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '南方农村报'
-            item['send_time'] = day
-            # print(title, day, response.url, content, '--------------------')
-            yield item
-
-
-# 21世纪经济报
-# http://epaper.21jingji.com/html/2014-09/02/node_1.htm#
-class SjjjSpider(Spider):
-    name = 'sjjj'
-    start_date = '2014-09-02'
-    # end_date = '2014-09-02'
-    end_date = '2019-02-28'
-
-    def start_requests(self):
-        date_list = create_assist_date(datestart=self.start_date, dateend=self.end_date)
-        for date in date_list:
-            # 生成起始链接
-            yield Request('http://epaper.21jingji.com/html/{0}/node_1.htm'.format(date), dont_filter=True)
-
-    def parse(self, response):
-        model_links = response.xpath('//div[@class="news_list"]/ul/li/a/@href').extract()
-        for link in model_links:
-            url = response.urljoin(link)
-            yield Request(url, callback=self.parse_content, dont_filter=True)
-
-    def parse_content(self, response):
-        # print(response.url)
-        day = re.sub(re.compile('\D'), '', str(response.url))[:8]
-        title = response.xpath('//h1[@class="news_title"]/text()').extract_first()
-        content_list = response.xpath('//div[@id="news_text"]/p//text()').extract()
-        content = ''.join(content_list).strip()
-        if title and content and len(title) > 0 and len(content) > 100:
-            item = EpaperItem()
-            item['title'] = title
-            item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            item['content'] = content
-            item['href'] = response.url
-            item['cType'] = '21世纪经济报'
-            item['send_time'] = day
-            # print(title, day, response.url, content, '--------------------')
-            yield item
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# 报刊登记表(papers.py)驱动的爬虫引擎
+# 所有登记的报刊共用 PaperSpider 的解析流程，预编译的 XPath、快速提取、共享队列、增量爬取等对每个报刊都有效；
+# 全部爬虫类在 registry.py 中生成，LazySpiderLoader(spiderloader.py)只生成要运行的爬虫
+import datetime
+import logging
+from urllib import parse
+
+from scrapy import Request
+
+from ..epochs import EpochStore, bisect_epochs, get_fingerprint, match_epoch, need_detect
+from ..extractors import NON_DIGIT, SelectorRegistry
+from ..items import EpaperItem
+from .ePaper import EpaperSpider
+
+logger = logging.getLogger(__name__)
+
+# 生成的爬虫类所在的模块
+REGISTRY_MODULE = 'epaper.spiders.registry'
+
+
+class PaperSpider(EpaperSpider):
+    """
+    登记表驱动的报刊爬虫: 起始页 -> 版面页(可省略) -> 文章页
+    每个日期按所在的布局时期选择起始链接和 XPath，时期的序号在 meta['epoch'] 中传给后续请求；
+    改版日期未知的日期可能属于几个时期，meta['epoch'] 为候选时期的列表，由起始页的结构决定(见 epochs.py)
+    -a epoch_detect=1 先检测改版日期再爬取，epoch_detect=only 只检测，epoch_detect=0 不检测；
+    缺省按 EPAPER_EPOCH_DETECT，有未知的改版日期且保存的检测结果没有覆盖要爬取的日期时先检测
+    """
+    paper = None
+    epochs = ()
+    skip_titles = ()
+    skip_words = ()
+    skip_links = ()
+    # 保存的检测结果(见 epochs.EpochStore)、检测方式和进行中的检测
+    detected = None
+    epoch_detect = 'auto'
+    epoch_search = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(PaperSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.epoch_store = EpochStore.from_settings(crawler.settings)
+        spider.detected = spider.epoch_store.get(spider.name, spider.epochs)
+        detect = str(kwargs.get('epoch_detect', '')).lower()
+        if detect in ('', 'auto'):
+            detect = 'auto' if crawler.settings.getbool('EPAPER_EPOCH_DETECT', True) else '0'
+        spider.epoch_detect = detect
+        spider.epoch_search = None
+        return spider
+
+    def get_since(self):
+        """
+        @return: 各时期的开始日期，登记表中省略且未检测到的为 None
+        """
+        since = [epoch.get('since') for epoch in self.epochs]
+        if self.detected is not None:
+            for index, date in self.detected['boundaries'].items():
+                since[int(index)] = date
+        return since
+
+    def get_epoch(self, date):
+        """
+        @summary: 日期所在的布局时期
+        @return: 时期的序号，改版日期未知时为候选时期序号的列表
+        """
+        since = self.get_since()
+        detected = self.detected
+        if detected is not None and detected['start_date'] <= date <= detected['end_date']:
+            index = detected['first']
+            for i in range(detected['first'] + 1, detected['last'] + 1):
+                if since[i] and date >= since[i]:
+                    index = i
+            return index
+        index = 0
+        for i in range(1, len(since)):
+            if since[i] and date >= since[i]:
+                index = i
+        candidates = [index]
+        while candidates[-1] + 1 < len(since) and since[candidates[-1] + 1] is None:
+            candidates.append(candidates[-1] + 1)
+        return index if len(candidates) == 1 else candidates
+
+    def get_detect_range(self):
+        """
+        @return: (开始日期, 结束日期)，缺省为 2016-01-01 至今天
+        """
+        return self.start_date or '2016-01-01', self.end_date or datetime.date.today().strftime('%Y-%m-%d')
+
+    def need_detect(self):
+        if self.epoch_detect in ('1', 'true', 'yes', 'only'):
+            return True
+        if self.epoch_detect != 'auto':
+            return False
+        return need_detect(self.epochs, self.detected, *self.get_detect_range())
+
+    def start_requests(self):
+        if self.need_detect():
+            yield self.start_detect()
+        elif self.epoch_detect != 'only':
+            for request in self.date_requests():
+                yield request
+
+    def date_requests(self):
+        for date in self.get_dates(add_day=self.add_day, sep=('-', '-')):
+            day = datetime.datetime.strptime(date, '%Y-%m-%d')
+            index = self.get_epoch(date)
+            if not isinstance(index, list):
+                yield Request(day.strftime(self.epochs[index]['start_url']), dont_filter=True, meta={'epoch': index})
+                continue
+            # 候选时期的起始链接不同时每个链接请求一次
+            for start_url, indexes in self.group_start_urls(index):
+                yield Request(day.strftime(start_url), dont_filter=True, meta={'epoch': indexes})
+
+    def group_start_urls(self, indexes):
+        """
+        @return: [(起始链接, [时期序号])]，按时期从新到旧
+        """
+        groups = []
+        for index in sorted(indexes, reverse=True):
+            start_url = self.epochs[index]['start_url']
+            for url, group in groups:
+                if url == start_url:
+                    group.append(index)
+                    break
+            else:
+                groups.append((start_url, [index]))
+        return groups
+
+    # 改版日期检测: 按 epochs.bisect_epochs 给出的日期依次请求起始页，每次只有一个检测请求
+    def start_detect(self):
+        first, last = self.get_detect_range()
+        if self.detected is not None and self.epoch_detect == 'auto':
+            # 保存的结果没有覆盖本次的日期范围时合并两个范围重新检测，结果仍然适用于之前检测过的日期
+            first = min(first, self.detected['start_date'])
+            last = max(last, self.detected['end_date'])
+        start = datetime.datetime.strptime(first, '%Y-%m-%d').date()
+        end = datetime.datetime.strptime(last, '%Y-%m-%d').date()
+        logger.info('%s 检测改版日期: %s 至 %s', self.name, start, end)
+        self.epoch_range = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        self.epoch_search = bisect_epochs(start, end)
+        self.probe_groups = self.group_start_urls(range(len(self.epochs)))
+        return self.probe_request(next(self.epoch_search), 0)
+
+    def probe_request(self, date, group):
+        self.crawler.stats.inc_value('epaper/epoch_probes')
+        url = date.strftime(self.probe_groups[group][0])
+        return Request(url, callback=self.parse_probe, errback=self.probe_failed, dont_filter=True, priority=100,
+                       meta={'epoch_probe': [date.strftime('%Y-%m-%d'), group], 'handle_httpstatus_all': True})
+
+    def parse_probe(self, response):
+        if self.epoch_search is None:
+            return []
+        for index in self.probe_groups[response.meta['epoch_probe'][1]][1]:
+            if match_epoch(self.selectors, response, self.epochs[index]):
+                return self.probe_result(index)
+        return self.next_probe(response.meta['epoch_probe'])
+
+    def probe_failed(self, failure):
+        return self.next_probe(failure.request.meta['epoch_probe'])
+
+    def next_probe(self, probe):
+        date, group = probe
+        if group + 1 < len(self.probe_groups):
+            return [self.probe_request(datetime.datetime.strptime(date, '%Y-%m-%d').date(), group + 1)]
+        # 所有起始链接都不符合，当天没有出版
+        return self.probe_result(None)
+
+    def probe_result(self, index):
+        try:
+            return [self.probe_request(self.epoch_search.send(index), 0)]
+        except StopIteration as e:
+            first, last, boundaries = e.value
+        self.epoch_search = None
+        if first is None:
+            logger.warning('%s 在 %s 至 %s 没有找到出版的日期', self.name, *self.epoch_range)
+        else:
+            self.detected = {
+                'fingerprint': get_fingerprint(self.epochs),
+                'start_date': self.epoch_range[0],
+                'end_date': self.epoch_range[1],
+                'first': first,
+                'last': last,
+                'boundaries': dict((str(i), date) for i, date in boundaries.items()),
+                'detect_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self.epoch_store.save(self.name, self.detected)
+            logger.info('%s 改版日期: %s (时期 %s-%s, %s 次请求)', self.name, boundaries or '无', first, last,
+                        self.crawler.stats.get_value('epaper/epoch_probes'))
+        if self.epoch_detect == 'only':
+            return []
+        # 使用共享队列时每次租到新的日期都会调用 start_requests，本次运行不再重复检测
+        self.epoch_detect = '0'
+        return self.date_requests()
+
+    def resolve_epoch(self, response):
+        """
+        @return: 起始页所属的时期，候选时期都不符合时为 None
+        """
+        index = response.meta.get('epoch', 0)
+        if not isinstance(index, list):
+            return index
+        for i in index:
+            if match_epoch(self.selectors, response, self.epochs[i]):
+                return i
+        return None
+
+    def follow(self, response, query, callback, index):
+        for link in self.selectors.extract(response, query):
+            url = parse.urljoin(response.url, link)
+            if self.skip_links and url.endswith(self.skip_links):
+                continue
+            yield Request(url, callback=callback, dont_filter=True, meta={'epoch': index})
+
+    def get_epoch_rules(self, response):
+        return self.epochs[response.meta.get('epoch', 0)]
+
+    # 起始页: 有版面导航时进入各版面，否则直接进入文章
+    def parse(self, response):
+        index = self.resolve_epoch(response)
+        if index is None:
+            return []
+        epoch = self.epochs[index]
+        if epoch.get('layouts'):
+            return self.follow(response, epoch['layouts'], self.parse_layout, index)
+        return self.follow(response, epoch['articles'], self.parse_content, index)
+
+    def parse_layout(self, response):
+        return self.follow(response, self.get_epoch_rules(response)['articles'], self.parse_content,
+                           response.meta.get('epoch', 0))
+
+    def parse_content(self, response):
+        epoch = self.get_epoch_rules(response)
+        title = (self.selectors.extract_first(response, epoch['title']) or '').strip().replace('\n', ' ')
+        content = ''.join(self.selectors.extract(response, epoch['content'])).strip()
+        if not title or len(content) <= 100 or title in self.skip_titles or \
+                any(word in title for word in self.skip_words):
+            return
+        item = EpaperItem()
+        item['title'] = title
+        item['insert_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        item['content'] = content
+        item['href'] = response.url
+        item['cType'] = self.paper['ctype']
+        item['send_time'] = NON_DIGIT.sub('', str(response.url))[:8]
+        yield item
+
+
+def create_spider(paper):
+    """
+    按登记表的记录生成爬虫类
+    :param paper: papers.PAPERS 中的记录
+    :return: PaperSpider 的子类，属于 REGISTRY_MODULE
+    """
+    attrs = dict((key, value) for key, value in paper.items() if key not in (
+        'ctype', 'domains', 'epochs', 'skip_titles', 'skip_words', 'skip_links', 'selectors'))
+    attrs.update({
+        '__module__': REGISTRY_MODULE,
+        '__doc__': paper['ctype'],
+        'paper': paper,
+        'epochs': list(paper['epochs']),
+        'skip_titles': tuple(paper.get('skip_titles', ())),
+        'skip_words': tuple(paper.get('skip_words', ())),
+        'skip_links': tuple(paper.get('skip_links', ())),
+        'selectors': paper.get('selectors') or SelectorRegistry(),
+    })
+    if paper.get('domains'):
+        attrs['allowed_domains'] = list(paper['domains'])
+    return type('%sSpider' % paper['name'].capitalize(), (PaperSpider,), attrs)
+
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+# 按报刊登记表(papers.py)生成全部爬虫类，供 Scrapy 的 SpiderLoader 和 schema.get_spiders 遍历
+from ..papers import PAPERS
+from .engine import create_spider
+
+for _paper in PAPERS:
+    _spidercls = create_spider(_paper)
+    globals()[_spidercls.__name__] = _spidercls
+del _paper, _spidercls
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+# 数据库不可用或写入过慢时的本地预写日志(WAL)和熔断器
+# 熔断器打开后数据追加到本地文件，数据库恢复后按写入顺序分批重放；重启后先重放遗留的文件
+import errno
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 文件序号，同一进程中的多个管道写入同一目录时文件名不重复
+_file_seq = itertools.count(1)
+
+
+class CircuitBreaker(object):
+    """
+    熔断器: 连续失败(或超过耗时预算)达到 failures 次后打开，reset_timeout 秒后进入半开状态，
+    由一次试探写入决定关闭还是重新打开
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failures=3, reset_timeout=30.0, latency_budget=None):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.latency_budget = latency_budget
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0
+        # 打开的次数
+        self.trips = 0
+
+    @property
+    def closed(self):
+        return self.state == self.CLOSED
+
+    def can_probe(self):
+        """
+        @return: 打开超过 reset_timeout 秒后返回 True 并进入半开状态
+        """
+        if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            logger.info('熔断器半开，尝试写入数据库')
+        return self.state != self.OPEN
+
+    def success(self, latency=None):
+        if self.latency_budget and latency is not None and latency > self.latency_budget:
+            logger.warning('写入耗时 %.2f 秒，超过预算 %.2f 秒', latency, self.latency_budget)
+            self.failure()
+            return
+        if self.state != self.CLOSED:
+            logger.info('数据库写入恢复，熔断器关闭')
+        self.state = self.CLOSED
+        self.failure_count = 0
+
+    def failure(self):
+        self.failure_count += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failure_count >= self.failures):
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self.trips += 1
+            logger.warning('数据库连续 %s 次写入失败或过慢，熔断器打开，数据写入本地 WAL', self.failure_count)
+
+
+class WriteAheadSpool(object):
+    """
+    按(表名, 字段, 后端)追加写入的本地文件: <目录>/<表名>.<进程号>.<时间>.<序号>.wal
+    第一行为 {"table": 表名, "fields": [字段], "backends": [后端名称]}，之后每行一条数据(JSON 数组)；
+    backends 为只需要重放到的后端(其余后端已写入成功)，没有时重放到所有后端
+    重放进度(已写入数据库的数据在文件中的结束字节位置)记录在 <文件>.offset 中，中断后从该位置继续
+    数据错误导致无法写入的行追加到死信文件 <目录>/<表名>.dead.jsonl，每行 {"time", "backend", "error", "fields", "row"}
+    """
+
+    def __init__(self, path='spool/wal', fsync=True):
+        self.path = path
+        self.fsync = fsync
+        # 正在追加的文件 {(表名, 字段, 后端): {'file': 文件对象, 'path': 路径, 'rows': 行数}}
+        self.files = {}
+        # 已关闭待重放的文件(按写入顺序)
+        self.closed = []
+        # 死信文件在写线程池中追加
+        self.dead_lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def __len__(self):
+        return len(self.closed) + len(self.files)
+
+    def recover(self, table):
+        """
+        @summary: 找出上次运行遗留的文件，排在待重放队列的最前面
+        @return: 文件数
+        """
+        paths = sorted(glob.glob(os.path.join(self.path, '%s.*.wal' % table)), key=get_wal_order)
+        # 其他正在运行的进程的文件由该进程自己重放
+        current = set(out['path'] for out in self.files.values())
+        paths = [path for path in paths if path not in self.closed and path not in current
+                 and not pid_alive(get_wal_pid(path))]
+        self.closed[:0] = paths
+        return len(paths)
+
+    def has_backlog(self, key):
+        """
+        @return: 该表是否有未重放的数据(有则新数据也需要写入 WAL，保证顺序)
+        """
+        if any(table == key[0] for table, _, _ in self.files):
+            return True
+        prefix = os.path.join(self.path, key[0] + '.')
+        return any(path.startswith(prefix) for path in self.closed)
+
+    def append(self, key, rows, backends=None):
+        """
+        @summary: 追加数据并写入磁盘
+        @param backends: 只需要重放到的后端名称，None 为所有后端
+        """
+        backends = tuple(backends) if backends is not None else None
+        out = self.files.get(key + (backends,))
+        if out is None:
+            path = os.path.join(self.path, '%s.%d.%d.%d.wal' % (key[0], os.getpid(), int(time.time()),
+                                                               next(_file_seq)))
+            out = {'file': open(path, 'a', encoding='utf-8', newline='\n'), 'path': path, 'rows': 0}
+            header = {'table': key[0], 'fields': list(key[1])}
+            if backends is not None:
+                header['backends'] = list(backends)
+            out['file'].write(json.dumps(header) + '\n')
+            self.files[key + (backends,)] = out
+        out['file'].write(''.join(json.dumps(list(row), ensure_ascii=False, default=str) + '\n' for row in rows))
+        out['file'].flush()
+        if self.fsync:
+            os.fsync(out['file'].fileno())
+        out['rows'] += len(rows)
+
+    def dead_letter(self, key, rows, error, backend=None):
+        """
+        @summary: 追加到该表的死信文件
+        @param backend: 写入失败的后端名称
+        @return: 死信文件路径
+        """
+        path = os.path.join(self.path, '%s.dead.jsonl' % key[0])
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        lines = ''.join(json.dumps({'time': now, 'backend': backend, 'error': repr(error), 'fields': list(key[1]),
+                                    'row': list(row)}, ensure_ascii=False, default=str) + '\n' for row in rows)
+        with self.dead_lock:
+            with open(path, 'a', encoding='utf-8', newline='\n') as f:
+                f.write(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        return path
+
+    def rotate(self):
+        """
+        @summary: 关闭正在追加的文件，加入待重放队列
+        """
+        for key in list(self.files):
+            out = self.files.pop(key)
+            out['file'].close()
+            self.closed.append(out['path'])
+
+    def close(self):
+        self.rotate()
+        self.closed = []
+
+    def next_file(self):
+        """
+        @return: 下一个待重放的文件，没有已关闭的文件时先关闭正在追加的文件
+        """
+        if not self.closed:
+            self.rotate()
+        return self.closed[0] if self.closed else None
+
+    def read_batch(self, path, rows):
+        """
+        @summary: 从重放进度处读出最多 rows 行
+        @return: (表名, 字段, [行], 读完后的进度, 需要重放到的后端名称(None 为所有后端))
+        """
+        offset = self.get_offset(path)
+        batch = []
+        # 以二进制方式读取，tell() 才是可以直接 seek 的字节位置
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            if offset:
+                f.seek(offset)
+            offset = f.tell()
+            while len(batch) < rows:
+                line = f.readline()
+                # 写入中断时最后一行可能不完整
+                if not line.endswith(b'\n'):
+                    break
+                batch.append(tuple(json.loads(line.decode('utf-8'))))
+                offset = f.tell()
+        backends = header.get('backends')
+        if backends is not None:
+            backends = tuple(backends)
+        return header['table'], tuple(header['fields']), batch, offset, backends
+
+    def get_offset(self, path):
+        try:
+            with open(path + '.offset', 'r') as f:
+                return int(f.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def commit(self, path, offset):
+        """
+        @summary: 记录重放进度
+        """
+        tmp = path + '.offset.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+        os.rename(tmp, path + '.offset')
+
+    def remove(self, path):
+        """
+        @summary: 文件重放完成后删除
+        """
+        if path in self.closed:
+            self.closed.remove(path)
+        for name in (path, path + '.offset'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+def get_wal_pid(path):
+    """
+    文件名 <表名>.<进程号>.<时间>.<序号>.<后缀> 中的进程号(WAL 文件和 'load' 模式的 TSV 文件)
+    """
+    try:
+        return int(os.path.basename(path).split('.')[-4])
+    except (IndexError, ValueError):
+        return 0
+
+
+def pid_alive(pid):
+    """
+    进程是否仍在运行(不能判断时视为已退出)
+    """
+    if not pid or pid == os.getpid() or os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def get_wal_order(path):
+    """
+    按文件名中的时间和序号排序
+    """
+    parts = os.path.basename(path).split('.')
+    try:
+        return int(parts[-3]), int(parts[-2])
+    except (IndexError, ValueError):
+        return 0, 0
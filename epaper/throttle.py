@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# 按网站自适应的并发限制(AIMD)
+# paper.people.com.cn、*.sznews.com 等网站负载高时响应变慢、超时或返回空白页面，固定的并发数要么太低要么被限流；
+# 每个网站的并发上限按 TCP 拥塞控制的方式调整: 正常响应时加法增加(慢启动阶段每次加 1，之后每轮加 1)，
+# 出现超时、连接错误、限流状态码、空白页面或平均耗时超过目标时乘法减少，两次减少之间至少间隔一个冷却时间
+# 同一进程中访问同一网站的所有爬虫共用一个 HostSlot(见 middlewares.HostBudgetMiddleware)
+import logging
+import time
+from collections import deque
+
+from twisted.internet import defer
+
+logger = logging.getLogger(__name__)
+
+
+class HostSlot(object):
+    """
+    一个网站的并发控制: 同时下载的请求数不超过 int(limit)，超过时排队等待
+    adaptive 为 False 时 limit 固定为 max_limit
+    """
+
+    def __init__(self, host, max_limit=100, adaptive=False, start_limit=4, min_limit=1, decrease=0.5,
+                 latency_target=5.0, cooldown=2.0):
+        self.host = host
+        self.max_limit = max_limit
+        self.adaptive = adaptive
+        self.min_limit = min(min_limit, max_limit)
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.limit = float(min(start_limit, max_limit) if adaptive else max_limit)
+        # 慢启动阈值，第一次减少前为上限
+        self.ssthresh = float(max_limit)
+        self.latency = None
+        self.last_backoff = 0
+        self.backoffs = 0
+        self.active = 0
+        self.waiting = deque()
+
+    def acquire(self):
+        """
+        @return: None 表示可以立即下载，否则为等待的 Deferred
+        """
+        if self.active < int(self.limit):
+            self.active += 1
+            return None
+        d = defer.Deferred()
+        self.waiting.append(d)
+        return d
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+    def wake(self):
+        while self.waiting and self.active < int(self.limit):
+            d = self.waiting.popleft()
+            # 爬虫关闭时等待中的请求可能已被取消
+            if d.called:
+                continue
+            self.active += 1
+            d.callback(None)
+
+    def success(self, latency=None):
+        """
+        @summary: 正常响应，平均耗时未超过目标时增加并发上限
+        """
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+        if not self.adaptive:
+            return
+        if self.latency is not None and self.latency > self.latency_target:
+            self.backoff('耗时 %.2f 秒' % self.latency)
+            return
+        if self.limit < self.ssthresh:
+            self.limit += 1
+        else:
+            self.limit += 1.0 / self.limit
+        self.limit = min(self.limit, float(self.max_limit))
+        self.wake()
+
+    def backoff(self, reason):
+        """
+        @summary: 网站过载，并发上限乘以 decrease；冷却时间内(上一次减少的请求还未全部返回)不重复减少
+        @return: 是否减少
+        """
+        if not self.adaptive:
+            return False
+        now = time.time()
+        if now - self.last_backoff < max(self.cooldown, self.latency or 0):
+            return False
+        self.last_backoff = now
+        self.backoffs += 1
+        self.ssthresh = max(float(self.min_limit), self.limit * self.decrease)
+        logger.info('%s 并发上限 %d -> %d(%s)', self.host, int(self.limit), int(self.ssthresh), reason)
+        self.limit = self.ssthresh
+        return True
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# 入库相关的公共方法(表名、字段)，以及多个进程共同保存的 JSON 文件
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上不加文件锁
+    fcntl = None
+
+# 所有报刊共有的字段
+ITEM_FIELDS = ('title', 'href', 'cType', 'insert_time', 'content', 'send_time')
+
+# BJSpider 新增一个特殊字段
+BJ_FIELDS = ITEM_FIELDS + ('lable',)
+
+# 去重入库时追加的字段: href 的哈希(唯一键)和 content 的哈希(判断内容是否变化)
+HASH_FIELDS = ('href_hash', 'content_hash')
+
+# 近似重复检测时追加的字段: content 的 SimHash 指纹和原文的 href_hash
+SIMHASH_FIELDS = ('simhash', 'dup_of')
+
+
+def get_table_name(spider_name):
+    """
+    获取爬虫对应的数据库表名 {命名规则：epaper_xxx}
+    :param spider_name: 爬虫名称 spider.name
+    :return: 表名
+    """
+    if spider_name == 'BJSpider':
+        return 'epaper_bj'
+    return 'epaper_%s' % spider_name
+
+
+def get_table_fields(spider_name, with_hash=False, with_simhash=False):
+    """
+    获取爬虫对应数据库表的字段
+    :param spider_name: 爬虫名称 spider.name
+    :param with_hash: 是否包含 href_hash、content_hash 字段
+    :param with_simhash: 是否包含 simhash、dup_of 字段
+    :return: 字段元组
+    """
+    fields = BJ_FIELDS if spider_name == 'BJSpider' else ITEM_FIELDS
+    if with_hash:
+        fields = fields + HASH_FIELDS
+    if with_simhash:
+        fields = fields + SIMHASH_FIELDS
+    return fields
+
+
+def format_date(value):
+    """
+    日期统一转为 2019-01-04 格式
+    :param value: date/datetime 或 20190104、2019-01-04、2019/01/04 等字符串(只取前 8 位数字)
+    :return: 字符串，无法识别时为 None
+    """
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    digits = re.sub(r'\D', '', str(value))[:8]
+    try:
+        return datetime.datetime.strptime(digits, '%Y%m%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def get_hash(text):
+    """
+    计算文本的定长哈希(32位 md5，与 MySQL 的 MD5() 结果一致)
+    """
+    if text is None:
+        text = ''
+    return hashlib.md5(str(text).encode('utf-8')).hexdigest()
+
+
+def get_row(item, fields):
+    """
+    按字段顺序取出item中的值(href_hash、content_hash 由 href、content 计算)
+    """
+    row = []
+    for field in fields:
+        if field == 'href_hash':
+            row.append(get_hash(item.get('href')))
+        elif field == 'content_hash':
+            row.append(get_hash(item.get('content')))
+        else:
+            row.append(item.get(field))
+    return tuple(row)
+
+
+def get_row_size(row):
+    """
+    估算一行数据在SQL语句中占用的字节数
+    """
+    size = 8
+    for value in row:
+        if value is None:
+            size += 5
+        else:
+            size += len(str(value).encode('utf-8')) + 4
+    return size
+
+
+# LOAD DATA 默认的转义规则: 反斜杠、制表符、换行、回车、\0 需要转义，NULL 写作 \N
+_TSV_ESCAPE = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'}
+_TSV_UNESCAPE = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+
+
+def escape_tsv(value):
+    """
+    将一个值转为 LOAD DATA 可识别的制表符分隔字段
+    """
+    if value is None:
+        return '\\N'
+    value = str(value)
+    if not any(char in value for char in _TSV_ESCAPE):
+        return value
+    return ''.join(_TSV_ESCAPE.get(char, char) for char in value)
+
+
+def unescape_tsv(value):
+    """
+    escape_tsv 的逆操作
+    """
+    if value == '\\N':
+        return None
+    if '\\' not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '\\')
+            result.append(_TSV_UNESCAPE.get(char, char))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def get_tsv_line(row):
+    """
+    一行数据转为 TSV 文本行(含换行符)
+    """
+    return '\t'.join(escape_tsv(value) for value in row) + '\n'
+
+
+def parse_tsv_line(line):
+    """
+    TSV 文本行转为一行数据
+    """
+    return tuple(unescape_tsv(value) for value in line.rstrip('\n').split('\t'))
+
+
+@contextlib.contextmanager
+def locked_file(path):
+    """
+    多个进程读取、合并再保存同一个文件时加锁(path.lock 上的 flock)，锁定期间其他进程的合并等待
+    :param path: 要保存的文件，所在目录不存在时创建
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(path + '.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_json(path, data, **kwargs):
+    """
+    保存 JSON 文件: 先写入同一目录下唯一的临时文件再替换，读取的进程不会读到一半的文件
+    :param kwargs: json.dump 的参数
+    """
+    f = tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            json.dump(data, f, **kwargs)
+        os.replace(f.name, path)
+    except BaseException:
+        if os.path.exists(f.name):
+            os.remove(f.name)
+        raise
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# WARC 文件读写(WARC/1.0，每条记录一个 gzip 段，可以用 warcio 等通用工具读取)
+# 爬取时保存原始响应(见 extensions.WarcArchive)，网站改版、修改解析规则后用 python -m epaper.replay 离线重新解析
+# 除标准字段外，每条响应记录还保存请求的回调名(X-Epaper-Callback)和可序列化的 meta(X-Epaper-Meta)，
+# 重新解析时按原来的回调和 meta 调用爬虫
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import time
+import uuid
+
+# 文件序号，同一进程中文件名不重复
+_file_seq = itertools.count(1)
+
+# 不保存的 meta(Scrapy 和本项目中间件内部使用)
+SKIP_META = ('depth', 'epaper_host_budget', 'retry_times', 'redirect_times', 'redirect_ttl', 'redirect_urls',
+             'redirect_reasons', 'handle_httpstatus_list', 'handle_httpstatus_all', 'cached')
+
+
+def get_meta(meta):
+    """
+    :return: meta 中可以 JSON 序列化的部分
+    """
+    result = {}
+    for key, value in meta.items():
+        if key in SKIP_META or key.startswith('download_') or key.startswith('_'):
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        result[key] = value
+    return result
+
+
+def get_http_block(response):
+    """
+    :return: 响应的 HTTP 报文(bytes)，Content-Length 为解压后的内容长度
+    """
+    lines = [('HTTP/1.1 %d %s' % (response.status, 'OK' if response.status == 200 else '')).strip().encode('latin1')]
+    for key, values in response.headers.items():
+        if key.lower() in (b'content-length', b'transfer-encoding', b'content-encoding'):
+            continue
+        for value in values:
+            lines.append(key + b': ' + value)
+    lines.append(b'Content-Length: ' + str(len(response.body)).encode('latin1'))
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + response.body
+
+
+class WarcWriter(object):
+    """
+    按大小轮换的 WARC 文件，写入中的文件以 .part 结尾，写满或关闭后去掉
+    """
+
+    def __init__(self, path, prefix, rotate_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.prefix = prefix
+        self.rotate_bytes = rotate_bytes
+        self.file = None
+        self.filename = None
+        self.size = 0
+        self.records = 0
+
+    def open_file(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.filename = os.path.join(self.path, '%s-%s-%d-%d.warc.gz' % (
+            self.prefix, time.strftime('%Y%m%d%H%M%S'), os.getpid(), next(_file_seq)))
+        self.file = open(self.filename + '.part', 'wb')
+        self.size = 0
+        info = ('software: epaper\r\nformat: WARC File Format 1.0\r\n').encode('utf-8')
+        self.write_record('warcinfo', None, 'application/warc-fields', info,
+                          {'WARC-Filename': os.path.basename(self.filename)})
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        os.rename(self.filename + '.part', self.filename)
+        self.file = None
+
+    def write_record(self, warc_type, url, content_type, block, headers=None):
+        lines = ['WARC/1.0',
+                 'WARC-Type: %s' % warc_type,
+                 'WARC-Record-ID: <urn:uuid:%s>' % uuid.uuid4(),
+                 'WARC-Date: %s' % datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')]
+        if url:
+            lines.append('WARC-Target-URI: %s' % url)
+        for key, value in sorted((headers or {}).items()):
+            lines.append('%s: %s' % (key, value))
+        lines.append('Content-Type: %s' % content_type)
+        lines.append('Content-Length: %d' % len(block))
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+        # 每条记录单独压缩，读取时可以按记录定位
+        compressed = gzip.compress(data)
+        self.file.write(compressed)
+        self.size += len(compressed)
+
+    def write_response(self, response, request):
+        if self.file is None:
+            self.open_file()
+        callback = getattr(request.callback, '__name__', None) or 'parse'
+        self.write_record('response', response.url, 'application/http; msgtype=response', get_http_block(response),
+                          {'X-Epaper-Callback': callback,
+                           'X-Epaper-Meta': json.dumps(get_meta(request.meta), sort_keys=True)})
+        self.records += 1
+        if self.size >= self.rotate_bytes:
+            self.close()
+
+
+def read_headers(stream):
+    """
+    :return: {小写的字段名: 值}，到达文件末尾时为 None
+    """
+    line = stream.readline()
+    while line in (b'\r\n', b'\n'):
+        line = stream.readline()
+    if not line:
+        return None
+    headers = {'': line.strip().decode('latin1')}
+    while True:
+        line = stream.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        key, _, value = line.decode('utf-8').partition(':')
+        headers[key.strip().lower()] = value.strip()
+
+
+def iter_records(path):
+    """
+    读取 WARC 文件中的响应记录
+    :return: 迭代 dict {url, status, headers: [(字段, 值)], body, callback, meta}
+    """
+    with gzip.open(path, 'rb') as stream:
+        while True:
+            headers = read_headers(stream)
+            if headers is None:
+                return
+            block = stream.read(int(headers.get('content-length', 0)))
+            if headers.get('warc-type') != 'response':
+                continue
+            http = io.BytesIO(block)
+            status_line = http.readline().decode('latin1').split()
+            http_headers = []
+            while True:
+                line = http.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.partition(b':')
+                http_headers.append((key.strip(), value.strip()))
+            yield {
+                'url': headers.get('warc-target-uri'),
+                'status': int(status_line[1]) if len(status_line) > 1 else 200,
+                'headers': http_headers,
+                'body': http.read(),
+                'callback': headers.get('x-epaper-callback') or 'parse',
+                'meta': json.loads(headers.get('x-epaper-meta') or '{}'),
+            }
@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 if __name__ == '__main__':
-    import os
+    import sys
 
-    os.system('scrapy crawl sjjj')
+    from epaper.runner import main
+
+    # 缺省只运行 sjjj，python start_task.py nfrb cdsb 运行指定爬虫，参数同 python -m epaper.runner
+    sys.exit(main(sys.argv[1:] or ['sjjj']))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+
+from epaper.bloom import HEADER_SIZE, BloomFilter, get_bloom_size
+
+URLS = ['http://paper.people.com.cn/rmrb/html/2019-01/%02d/nw.D110000renmrb_20190104_1-01.htm' % i
+        for i in range(1, 31)]
+
+
+def test_add_and_contains(tmpdir):
+    bloom = BloomFilter(str(tmpdir.join('a.bloom')), capacity=1000)
+    assert not bloom.add(URLS[0])
+    assert bloom.add(URLS[0])
+    assert URLS[0] in bloom
+    assert URLS[1] not in bloom
+    assert len(bloom) == 1
+    bloom.close()
+
+
+def test_reopen(tmpdir):
+    path = str(tmpdir.join('seen', 'a.bloom'))
+    bloom = BloomFilter(path, capacity=1000)
+    for url in URLS:
+        bloom.add(url)
+    bloom.last_id = 42
+    bloom.close()
+    bits, _ = get_bloom_size(1000, 0.0001)
+    assert os.path.getsize(path) == HEADER_SIZE + bits // 8
+    # 较小的容量打开已有的文件时沿用文件的大小
+    bloom = BloomFilter(path, capacity=10)
+    assert len(bloom) == len(URLS)
+    assert bloom.last_id == 42
+    assert bloom.capacity >= 1000
+    assert all(url in bloom for url in URLS)
+    bloom.close()
+
+
+def test_corrupt_header(tmpdir):
+    path = str(tmpdir.join('a.bloom'))
+    bloom = BloomFilter(path, capacity=1000)
+    bloom.add(URLS[0])
+    bloom.close()
+    with open(path, 'r+b') as f:
+        f.write(os.urandom(HEADER_SIZE))
+    bloom = BloomFilter(path, capacity=1000)
+    assert len(bloom) == 0
+    assert bloom.last_id == 0
+    assert (bloom.bits, bloom.hashes) == get_bloom_size(1000, 0.0001)
+    assert URLS[0] not in bloom
+    bloom.add(URLS[1])
+    bloom.close()
+    assert BloomFilter(path, capacity=1000).count == 1
+
+
+def test_truncated_file(tmpdir):
+    path = str(tmpdir.join('a.bloom'))
+    bloom = BloomFilter(path, capacity=1000)
+    bloom.add(URLS[0])
+    bloom.close()
+    with open(path, 'r+b') as f:
+        f.truncate(HEADER_SIZE + 8)
+    bloom = BloomFilter(path, capacity=1000)
+    assert len(bloom) == 0
+    assert URLS[0] not in bloom
+    bloom.close()
+    # 比文件头还短的文件
+    with open(path, 'wb') as f:
+        f.write(b'EPBLOOM1')
+    assert len(BloomFilter(path, capacity=1000)) == 0
+
+
+def test_full_and_clear(tmpdir):
+    bloom = BloomFilter(str(tmpdir.join('a.bloom')), capacity=10)
+    for url in URLS:
+        bloom.add(url)
+    assert bloom.full
+    bloom.capacity = len(bloom) * 2
+    bloom.clear()
+    assert len(bloom) == 0
+    assert not bloom.full
+    assert bloom.capacity >= 60
+    bloom.close()
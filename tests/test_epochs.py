@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from epaper.epochs import EpochStore, bisect_epochs, get_fingerprint, need_detect
+
+EPOCHS = [{'start_url': 'http://a/%Y/col.html'}, {'start_url': 'http://a/%Y/node.html'},
+          {'start_url': 'http://a/%Y/index.html'}]
+
+
+def simulate(start, end, since, issue=lambda day: True):
+    """
+    :param since: 各时期(第一个以外)的开始日期
+    :param issue: 日期是否出版
+    :return: (bisect_epochs 的结果, 请求次数)
+    """
+    search = bisect_epochs(start, end)
+    probes = 0
+    try:
+        day = next(search)
+        while True:
+            probes += 1
+            index = None
+            if issue(day):
+                index = sum(1 for date in since if day >= date)
+            day = search.send(index)
+    except StopIteration as e:
+        return e.value, probes
+
+
+def test_daily():
+    since = [datetime.date(2011, 1, 4), datetime.date(2016, 7, 22)]
+    (first, last, boundaries), probes = simulate(datetime.date(2008, 1, 1), datetime.date(2019, 2, 26), since)
+    assert (first, last) == (0, 2)
+    assert boundaries == {1: '2011-01-04', 2: '2016-07-22'}
+    assert probes < 40
+
+
+def test_weekly():
+    # 只有星期一出版: 改版日期为新时期第一个出版的日期
+    since = [datetime.date(2015, 3, 4)]
+    (first, last, boundaries), _ = simulate(datetime.date(2014, 1, 1), datetime.date(2016, 1, 1), since,
+                                            lambda day: day.weekday() == 0)
+    assert (first, last) == (0, 1)
+    assert boundaries == {1: '2015-03-09'}
+
+
+def test_skipped_epoch():
+    # 范围内没有中间时期的出版日期，两个时期从同一天开始
+    since = [datetime.date(2015, 3, 4), datetime.date(2015, 3, 4)]
+    (first, last, boundaries), _ = simulate(datetime.date(2015, 1, 1), datetime.date(2015, 6, 1), since)
+    assert boundaries == {1: '2015-03-04', 2: '2015-03-04'}
+
+
+def test_single_epoch():
+    since = [datetime.date(2020, 1, 1)]
+    result, _ = simulate(datetime.date(2015, 1, 1), datetime.date(2015, 6, 1), since)
+    assert result == (0, 0, {})
+
+
+def test_no_issue():
+    result, probes = simulate(datetime.date(2015, 1, 1), datetime.date(2015, 1, 10), [], lambda day: False)
+    assert result == (None, None, {})
+    assert probes == 10
+
+
+def test_need_detect():
+    assert not need_detect([EPOCHS[0], dict(EPOCHS[1], since='2011-01-04')], None, '2010-01-01', '2012-01-01')
+    assert need_detect(EPOCHS, None, '2010-01-01', '2012-01-01')
+    detected = {'start_date': '2010-01-01', 'end_date': '2015-01-01', 'first': 0, 'last': 1}
+    assert not need_detect(EPOCHS, detected, '2011-01-01', '2012-01-01')
+    # 之前的日期只能是第一个时期，之后的日期可能还有改版
+    assert not need_detect(EPOCHS, detected, '2005-01-01', '2012-01-01')
+    assert need_detect(EPOCHS, detected, '2011-01-01', '2019-01-01')
+    assert not need_detect(EPOCHS, dict(detected, last=2), '2011-01-01', '2019-01-01')
+
+
+def test_store(tmpdir):
+    store = EpochStore(str(tmpdir.join('epochs.json')))
+    result = {'fingerprint': get_fingerprint(EPOCHS), 'start_date': '2010-01-01', 'end_date': '2015-01-01',
+              'first': 0, 'last': 2, 'boundaries': {'1': '2011-01-04', '2': '2014-01-01'}}
+    store.save('a', result)
+    store.save('b', result)
+    assert store.get('a', EPOCHS) == result
+    # 登记表中的时期改变后检测结果失效
+    assert store.get('a', EPOCHS[:2]) is None
+    store.save('a', None)
+    assert sorted(store.read()) == ['b']
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import datetime
+import time
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+
+from epaper.httpcache import CACHE_TIME_HEADER, IssueCachePolicy, get_issue_date
+
+
+def test_get_issue_date():
+    assert get_issue_date('http://paper.people.com.cn/rmrb/html/2019-01/04/nbs.D110000renmrb_01.htm') == \
+        datetime.date(2019, 1, 4)
+    assert get_issue_date('http://sztqb.sznews.com/PC/layout/201901/04/colA01.html') == datetime.date(2019, 1, 4)
+    assert get_issue_date('http://epaper.jwb.com.cn/jwb/html/2019/01/04/node_1.htm') == datetime.date(2019, 1, 4)
+    assert get_issue_date('http://a/20190104/node_1.htm') == datetime.date(2019, 1, 4)
+    assert get_issue_date('http://a/2019_01_04/node_1.htm') == datetime.date(2019, 1, 4)
+
+
+def test_get_issue_date_invalid():
+    assert get_issue_date('http://a/index.htm') is None
+    # 更长的数字中的一段不是日期
+    assert get_issue_date('http://a/content_120190104.htm') is None
+    # 不存在的日期跳过，继续查找
+    assert get_issue_date('http://a/2019-02/30/content_2019-03-01.htm') == datetime.date(2019, 3, 1)
+
+
+def get_response(url, cache_time=None):
+    headers = {CACHE_TIME_HEADER: str(cache_time)} if cache_time is not None else {}
+    return HtmlResponse(url, body=b'<html>' + b'x' * 300 + b'</html>', headers=headers)
+
+
+def test_fresh():
+    policy = IssueCachePolicy(Settings({'EPAPER_HTTPCACHE_IMMUTABLE_DAYS': 7, 'EPAPER_HTTPCACHE_RECENT_TTL': 3600}))
+    old = Request('http://a/2019-01/04/node_1.htm')
+    assert policy.is_cached_response_fresh(get_response(old.url), old)
+    today = datetime.date.today()
+    recent = Request('http://a/%s/node_1.htm' % (today - datetime.timedelta(days=6)).strftime('%Y-%m/%d'))
+    assert policy.is_cached_response_fresh(get_response(recent.url, time.time() - 60), recent)
+    assert not policy.is_cached_response_fresh(get_response(recent.url, time.time() - 7200), recent)
+    # 没有缓存时间的响应按过期处理
+    assert not policy.is_cached_response_fresh(get_response(recent.url), recent)
+    # 链接中没有日期的页面按较新的页面处理
+    index = Request('http://a/index.htm')
+    assert policy.is_cached_response_fresh(get_response(index.url, time.time()), index)
+    assert not policy.is_cached_response_fresh(get_response(index.url, time.time() - 7200), index)
+    assert not policy.is_cached_response_valid(get_response(old.url), get_response(old.url), old)
+
+
+def test_should_cache():
+    class Spider(object):
+        def parse(self, response):
+            pass
+
+        def parse_content(self, response):
+            pass
+
+    spider = Spider()
+    policy = IssueCachePolicy(Settings({'EPAPER_THROTTLE_EMPTY_BYTES': 200, 'HTTPCACHE_IGNORE_SCHEMES': ['file']}))
+    request = Request('http://a/2019-01/04/node_1.htm', callback=spider.parse)
+    assert policy.should_cache_request(request)
+    assert not policy.should_cache_request(Request('http://a/content_1.htm', callback=spider.parse_content))
+    assert not policy.should_cache_request(Request('file:///tmp/a.htm'))
+    assert policy.should_cache_response(get_response(request.url), request)
+    assert not policy.should_cache_response(HtmlResponse(request.url, body=b'<html></html>'), request)
+    assert not policy.should_cache_response(HtmlResponse(request.url, status=404, body=b'x' * 300), request)
+    policy = IssueCachePolicy(Settings({'EPAPER_HTTPCACHE_ARTICLES': True}))
+    assert policy.should_cache_request(Request('http://a/content_1.htm', callback=spider.parse_content))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from epaper.issues import FETCH, PROBE, SKIP, IssueCalendar
+
+
+def get_calendar(tmpdir, start, days, issue, **kwargs):
+    calendar = IssueCalendar(str(tmpdir.join('cal.json')), **kwargs)
+    for i in range(days):
+        day = start + datetime.timedelta(days=i)
+        calendar.add(day.strftime('%Y-%m-%d'), issue(day))
+    return calendar
+
+
+def plans(calendar, start, days):
+    return dict(((start + datetime.timedelta(days=i)).strftime('%Y-%m-%d'),
+                 calendar.plan((start + datetime.timedelta(days=i)).strftime('%Y-%m-%d'))) for i in range(days))
+
+
+def test_known_dates(tmpdir):
+    calendar = IssueCalendar(str(tmpdir.join('cal.json')))
+    calendar.add('2019-01-07', True)
+    calendar.add('2019-01-08', False)
+    assert calendar.plan('2019-01-07') == FETCH
+    assert calendar.plan('2019-01-08') == SKIP
+    assert calendar.plan('2019-01-09') == PROBE
+    calendar.head = False
+    assert calendar.plan('2019-01-09') == FETCH
+
+
+def test_weekly(tmpdir):
+    # 只有星期一出版的周刊
+    calendar = get_calendar(tmpdir, datetime.date(2018, 1, 1), 56, lambda day: day.weekday() == 0)
+    result = plans(calendar, datetime.date(2019, 1, 1), 28)
+    assert [date for date, plan in result.items() if plan == FETCH] == [
+        '2019-01-07', '2019-01-14', '2019-01-21', '2019-01-28']
+    # 其他星期几每 4 周只探测一周
+    assert list(result.values()).count(PROBE) == 6
+    assert list(result.values()).count(SKIP) == 18
+
+
+def test_no_recheck(tmpdir):
+    calendar = get_calendar(tmpdir, datetime.date(2018, 1, 1), 56, lambda day: day.weekday() == 0, recheck_weeks=0)
+    assert set(plans(calendar, datetime.date(2019, 1, 1), 28).values()) == {FETCH, PROBE}
+
+
+def test_monthly(tmpdir):
+    # 每月 1 日出版的月刊，星期几没有规律，按每月的第几天处理
+    calendar = get_calendar(tmpdir, datetime.date(2018, 1, 1), 365, lambda day: day.day == 1)
+    result = plans(calendar, datetime.date(2019, 1, 1), 365)
+    assert [date for date, plan in result.items() if plan == FETCH] == ['2019-%02d-01' % month
+                                                                       for month in range(1, 13)]
+    assert list(result.values()).count(PROBE) < 100
+
+
+def test_too_few_samples(tmpdir):
+    calendar = get_calendar(tmpdir, datetime.date(2018, 1, 1), 14, lambda day: day.weekday() == 0)
+    assert set(plans(calendar, datetime.date(2019, 1, 1), 7).values()) == {PROBE}
+
+
+def test_filter_dates(tmpdir):
+    calendar = get_calendar(tmpdir, datetime.date(2018, 1, 1), 56, lambda day: day.weekday() == 0, recheck_weeks=0)
+    calendar.add('2019-01-10', False)
+    result, skipped = calendar.filter_dates(['2019-01-07', '2019-01-08', '2019-01-10', '2018-01-02'])
+    assert result == ['2019-01-07', '2019-01-08']
+    assert skipped == 2
+
+
+def test_save_merge(tmpdir):
+    path = str(tmpdir.join('cal.json'))
+    first = IssueCalendar(path)
+    second = IssueCalendar(path)
+    first.add('2019-01-07', True)
+    second.add('2019-01-08', False)
+    second.head = False
+    first.save()
+    second.save()
+    calendar = IssueCalendar(path)
+    assert calendar.get('2019-01-07') is True
+    assert calendar.get('2019-01-08') is False
+    assert calendar.head is False
+    assert not tmpdir.listdir(lambda p: p.ext == '.tmp')
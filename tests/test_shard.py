@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+
+import pytest
+from scrapy.settings import Settings
+
+from epaper.shard import get_shard_settings, split_range
+
+
+def test_split_range():
+    ranges = split_range('2019-01-01', '2019-01-10', 3)
+    assert ranges == [('2019-01-01', '2019-01-04'), ('2019-01-05', '2019-01-07'), ('2019-01-08', '2019-01-10')]
+
+
+def test_split_range_contiguous():
+    ranges = split_range('2008-01-01', '2019-02-26', 7)
+    assert ranges[0][0] == '2008-01-01'
+    assert ranges[-1][1] == '2019-02-26'
+    for (_, last), (first, _) in zip(ranges, ranges[1:]):
+        day = datetime.datetime.strptime(last, '%Y-%m-%d') + datetime.timedelta(days=1)
+        assert day.strftime('%Y-%m-%d') == first
+
+
+def test_split_range_more_shards_than_days():
+    assert split_range('2019-01-01', '2019-01-02', 4) == [('2019-01-01', '2019-01-01'), ('2019-01-02', '2019-01-02')]
+    assert split_range('2019-01-01', '2019-01-01', 0) == [('2019-01-01', '2019-01-01')]
+
+
+def test_split_range_reversed():
+    with pytest.raises(ValueError):
+        split_range('2019-01-02', '2019-01-01', 2)
+
+
+def test_shard_settings():
+    settings = Settings({'EPAPER_SEEN_DIR': 'spool/seen'})
+    overrides = get_shard_settings(settings, 1, 4, 10, 'logs/run')
+    # 各进程的单站并发数之和不超过总数
+    assert overrides['EPAPER_HOST_BUDGET'] * 4 <= 10
+    assert overrides['CONCURRENT_REQUESTS_PER_DOMAIN'] == overrides['EPAPER_HOST_BUDGET'] == 2
+    assert 'CONCURRENT_REQUESTS_PER_IP' not in overrides
+    assert overrides['EPAPER_WRITE_MODE'] == 'batch'
+    assert overrides['LOG_FILE'] == os.path.join('logs/run', 'shard-1.log')
+    assert overrides['EPAPER_SEEN_DIR'] == os.path.join('spool/seen', 'shard-1-of-4')
+
+
+def test_shard_settings_small_budget():
+    settings = Settings({'CONCURRENT_REQUESTS_PER_IP': 8, 'EPAPER_WRITE_MODE': 'load'})
+    overrides = get_shard_settings(settings, 0, 4, 2, 'logs/run')
+    assert overrides['EPAPER_HOST_BUDGET'] == overrides['CONCURRENT_REQUESTS_PER_IP'] == 1
+    assert 'EPAPER_WRITE_MODE' not in overrides
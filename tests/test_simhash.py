@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import random
+
+from epaper.simhash import SimHashIndex, _IGNORE, from_hex, hamming, simhash, to_hex
+
+TEXT = ('本报北京1月4日电 国务院总理李克强主持召开国务院常务会议，部署进一步支持小微企业发展，'
+        '确定加快发展先进制造业与现代服务业深度融合的措施，决定延续实施部分减税政策，'
+        '推动降低实体经济成本，会议指出，小微企业是就业的主渠道，要落实好已出台的各项政策。') * 3
+
+
+def reference(text, width=3):
+    # 逐个分词、逐位计数的原始算法
+    text = _IGNORE.sub('', text)
+    total = max(len(text) - width + 1, 1)
+    bits = [0] * 64
+    for i in range(total):
+        value = int.from_bytes(hashlib.md5(text[i:i + width].encode('utf-8')).digest()[:8], 'little')
+        for bit in range(64):
+            bits[bit] += value >> bit & 1
+    return sum(1 << bit for bit in range(64) if bits[bit] > total / 2.0)
+
+
+def flip(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def test_empty():
+    assert simhash('') is None
+    assert simhash(None) is None
+    assert simhash('，。 \n') is None
+
+
+def test_matches_reference():
+    assert simhash(TEXT) == reference(TEXT)
+    assert simhash('短文') == reference('短文')
+
+
+def test_long_text():
+    # 分词数超过计数位的上限时分段累加
+    rng = random.Random(1)
+    text = ''.join(chr(0x4e00 + rng.randrange(2000)) for _ in range(70000))
+    assert simhash(text) == reference(text)
+
+
+def test_near_duplicate():
+    edited = TEXT.replace('李克强', '李克强同志', 1)
+    other = TEXT[::-1]
+    assert hamming(simhash(TEXT), simhash(edited)) < hamming(simhash(TEXT), simhash(other))
+    assert simhash(TEXT) == simhash(TEXT.replace('，', ','))
+
+
+def test_hex():
+    value = simhash(TEXT)
+    assert len(to_hex(value)) == 16
+    assert from_hex(to_hex(value)) == value
+    assert to_hex(None) is None
+    assert from_hex('') is None
+
+
+def test_index_distance():
+    rng = random.Random(2)
+    for distance in (3, 5):
+        index = SimHashIndex(distance=distance)
+        fingerprints = [rng.getrandbits(64) for _ in range(200)]
+        for key, fingerprint in enumerate(fingerprints):
+            index.add(fingerprint, key)
+        assert len(index) == 200
+        for key, fingerprint in enumerate(fingerprints):
+            # 距离以内的指纹一定能找到
+            for count in range(distance + 1):
+                found = index.find(flip(fingerprint, count, rng))
+                assert found is not None and hamming(found[0], fingerprint) <= count
+
+
+def test_index_nearest():
+    index = SimHashIndex(distance=3)
+    index.add(0, 'far')
+    index.add(0b1, 'near')
+    assert index.find(0b11) == (0b1, 'near')
+    assert index.find(0b11111) is None
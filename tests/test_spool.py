@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from epaper.spool import CircuitBreaker, WriteAheadSpool, get_wal_pid
+
+KEY = ('epaper_test', ('title', 'href'))
+
+
+def get_wal(tmpdir, rows):
+    wal = WriteAheadSpool(str(tmpdir), fsync=False)
+    wal.append(KEY, rows)
+    return wal, wal.next_file()
+
+
+def test_append_and_read(tmpdir):
+    wal, path = get_wal(tmpdir, [('标题1', 'http://a/1'), ('标题2', 'http://a/2')])
+    assert get_wal_pid(path) == os.getpid()
+    assert wal.has_backlog(KEY)
+    table, fields, rows, offset, backends = wal.read_batch(path, 10)
+    assert table == 'epaper_test'
+    assert fields == ('title', 'href')
+    assert rows == [('标题1', 'http://a/1'), ('标题2', 'http://a/2')]
+    assert offset == os.path.getsize(path)
+    assert backends is None
+
+
+def test_append_backends(tmpdir):
+    wal = WriteAheadSpool(str(tmpdir), fsync=False)
+    wal.append(KEY, [('标题1', 'http://a/1')])
+    wal.append(KEY, [('标题2', 'http://a/2')], ['jsonl'])
+    wal.rotate()
+    assert len(wal) == 2
+    assert wal.read_batch(wal.closed[0], 10)[4] is None
+    _, _, rows, _, backends = wal.read_batch(wal.closed[1], 10)
+    assert rows == [('标题2', 'http://a/2')]
+    assert backends == ('jsonl',)
+
+
+def test_torn_last_line(tmpdir):
+    wal, path = get_wal(tmpdir, [('标题1', 'http://a/1')])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('["标题2", "http://a')
+    table, fields, rows, offset, backends = wal.read_batch(path, 10)
+    assert rows == [('标题1', 'http://a/1')]
+    wal.commit(path, offset)
+    # 不完整的行不计入进度，之后也读不到
+    assert wal.read_batch(path, 10)[2] == []
+
+
+def test_commit_and_resume(tmpdir):
+    rows = [('标题%d' % i, 'http://a/%d' % i) for i in range(5)]
+    wal, path = get_wal(tmpdir, rows)
+    batches = []
+    while True:
+        _, _, batch, offset, _ = wal.read_batch(path, 2)
+        if not batch:
+            break
+        batches.append(batch)
+        wal.commit(path, offset)
+        # 中断后新的对象从记录的进度继续
+        wal = WriteAheadSpool(str(tmpdir), fsync=False)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert sum(batches, []) == rows
+    assert wal.get_offset(path) == os.path.getsize(path)
+    wal.remove(path)
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + '.offset')
+
+
+def test_recover(tmpdir):
+    wal, path = get_wal(tmpdir, [('标题1', 'http://a/1')])
+    wal.close()
+    # 仍在运行的进程的文件由该进程自己重放
+    live = os.path.join(str(tmpdir), 'epaper_test.%d.1.1.wal' % os.getppid())
+    with open(live, 'w') as f:
+        f.write(json.dumps({'table': 'epaper_test', 'fields': ['title', 'href']}) + '\n')
+    other = WriteAheadSpool(str(tmpdir), fsync=False)
+    assert other.recover('epaper_test') == 1
+    assert other.next_file() == path
+    assert other.has_backlog(KEY)
+    assert other.read_batch(path, 10)[2] == [('标题1', 'http://a/1')]
+    assert other.recover('epaper_test') == 0
+
+
+def test_dead_letter(tmpdir):
+    wal = WriteAheadSpool(str(tmpdir), fsync=False)
+    path = wal.dead_letter(KEY, [('标题1', 'http://a/1')], ValueError('bad'))
+    with open(path, 'r', encoding='utf-8') as f:
+        record = json.loads(f.readline())
+    assert record['fields'] == ['title', 'href']
+    assert record['row'] == ['标题1', 'http://a/1']
+    assert 'bad' in record['error']
+    # 死信文件不会被当作 WAL 重放
+    assert wal.recover('epaper_test') == 0
+
+
+def test_breaker():
+    breaker = CircuitBreaker(failures=2, reset_timeout=0, latency_budget=1.0)
+    breaker.failure()
+    assert breaker.closed
+    breaker.success(2.0)
+    assert not breaker.closed
+    assert breaker.trips == 1
+    assert breaker.can_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.success(0.1)
+    assert breaker.closed
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from epaper import throttle
+from epaper.throttle import HostSlot
+
+
+def set_time(monkeypatch, now):
+    monkeypatch.setattr(throttle.time, 'time', lambda: now)
+
+
+def test_fixed_limit():
+    slot = HostSlot('a', max_limit=10)
+    assert slot.limit == 10
+    slot.success(100.0)
+    assert not slot.backoff('429')
+    assert slot.limit == 10
+
+
+def test_slow_start_and_max_limit():
+    slot = HostSlot('a', max_limit=6, adaptive=True, start_limit=4)
+    assert slot.limit == 4
+    slot.success()
+    assert slot.limit == 5
+    for _ in range(5):
+        slot.success()
+    assert slot.limit == 6
+
+
+def test_backoff_and_congestion_avoidance(monkeypatch):
+    slot = HostSlot('a', max_limit=100, adaptive=True, start_limit=8, decrease=0.5, cooldown=2.0)
+    set_time(monkeypatch, 1000.0)
+    assert slot.backoff('503')
+    assert slot.limit == slot.ssthresh == 4
+    # 达到慢启动阈值后每轮只加 1
+    slot.success()
+    assert slot.limit == 4.25
+
+
+def test_cooldown(monkeypatch):
+    slot = HostSlot('a', max_limit=100, adaptive=True, start_limit=16, cooldown=2.0)
+    set_time(monkeypatch, 1000.0)
+    assert slot.backoff('timeout')
+    set_time(monkeypatch, 1001.0)
+    assert not slot.backoff('timeout')
+    assert slot.limit == 8
+    set_time(monkeypatch, 1002.5)
+    assert slot.backoff('timeout')
+    assert slot.limit == 4
+    assert slot.backoffs == 2
+
+
+def test_min_limit(monkeypatch):
+    slot = HostSlot('a', max_limit=100, adaptive=True, start_limit=2, min_limit=1, cooldown=0)
+    for now in range(5):
+        set_time(monkeypatch, 1000.0 + now)
+        slot.backoff('429')
+    assert slot.limit == 1
+
+
+def test_slow_response_backs_off(monkeypatch):
+    slot = HostSlot('a', max_limit=100, adaptive=True, start_limit=8, latency_target=1.0, cooldown=0)
+    set_time(monkeypatch, 1000.0)
+    slot.success(3.0)
+    assert slot.limit == 4
+    assert slot.backoffs == 1
+
+
+def test_acquire_waits_for_limit():
+    slot = HostSlot('a', max_limit=1)
+    assert slot.acquire() is None
+    d = slot.acquire()
+    assert not d.called
+    slot.release()
+    assert d.called
+    assert slot.active == 1
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from epaper.utils import escape_tsv, get_tsv_line, parse_tsv_line, unescape_tsv
+
+VALUES = ['标题', '', 'a\tb', '第一段\n第二段\r\n', 'C:\\path\\n', '\\N', 'end\\', 'nul\0', '\\\\t']
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_escape_round_trip(value):
+    escaped = escape_tsv(value)
+    assert '\t' not in escaped and '\n' not in escaped
+    assert unescape_tsv(escaped) == value
+
+
+def test_null():
+    assert escape_tsv(None) == '\\N'
+    assert unescape_tsv('\\N') is None
+    # 内容为 \N 的字符串不是 NULL
+    assert escape_tsv('\\N') == '\\\\N'
+
+
+def test_escape():
+    assert escape_tsv('a\tb\nc') == 'a\\tb\\nc'
+    assert escape_tsv(20190104) == '20190104'
+
+
+def test_line_round_trip():
+    row = ('标题\t1', 'http://a/1', None, '第一段\n第二段', '2019-01-04 00:00:00', '\\N')
+    line = get_tsv_line(row)
+    assert line.endswith('\n') and line.count('\n') == 1
+    assert line.count('\t') == len(row) - 1
+    assert parse_tsv_line(line) == row